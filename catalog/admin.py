@@ -1,40 +1,132 @@
-from django.contrib import admin
-from .models import Author, Genre, Book, BookInstance
+import datetime
 
-admin.site.register(Genre)
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
+
+from . import circulation
+from .forms import STALE_OBJECT_MESSAGE, BookInstanceForm, CheckoutForm, ReservationForm
+from .models import Author, Genre, Book, BookInstance, ConcurrentUpdateError, Reservation, VisitCount
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Changelists of big tables: no COUNT(*) of the whole table per page view.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class LimitedInlineFormSet(BaseInlineFormSet):
+    """Only the first ``inline_limit`` related rows; the rest are edited from their own changelist."""
+    inline_limit = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_limited_queryset'):
+            self._limited_queryset = super().get_queryset()[:self.inline_limit]
+        return self._limited_queryset
+
+
+class ConcurrentUpdateAdminMixin:
+    """
+    A copy changed by someone else between validation and save_model() or
+    save_formset() rolls the whole change back and reopens the form with an
+    error message, instead of a server error.
+    """
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConcurrentUpdateError:
+            self.message_user(request, STALE_OBJECT_MESSAGE, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+
+def changelist_link(model, label, **filters):
+    url = reverse(f'admin:catalog_{model._meta.model_name}_changelist')
+    query = '&'.join(f'{name}={value}' for name, value in filters.items())
+    return format_html('<a href="{}?{}">{}</a>', url, query, label)
+
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
 
 
 class BooksInline(admin.TabularInline):
     model = Book
+    formset = LimitedInlineFormSet
+    fields = ('title', 'isbn')
+    show_change_link = True
     extra = 0
 
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
-    fields = [('first_name', 'last_name'), ('date_of_birth', 'date_of_death')]
+class AuthorAdmin(LargeTableAdmin):
+    fields = [('first_name', 'last_name'), ('date_of_birth', 'date_of_death'), 'books']
+    readonly_fields = ('books',)
     list_display = ('display_author_name', 'date_of_birth', 'date_of_death')
+    search_fields = ('last_name', 'first_name')
     inlines = [BooksInline]
 
+    def books(self, obj):
+        if obj.pk is None:
+            return '-'
+        count = obj.book_set.count()
+        return changelist_link(Book, f'{count} books, view all', author__id__exact=obj.pk)
+
+    books.short_description = 'Книги'
+
 
 class BooksInstanceInline(admin.TabularInline):
     model = BookInstance
-    # fields = ['id', 'status', 'due_back']
+    form = BookInstanceForm
+    formset = LimitedInlineFormSet
+    fields = ['id', 'imprint', 'status', 'due_back', 'borrower', 'loaded_version']
+    readonly_fields = ('borrower',)
+    show_change_link = True
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('borrower')
+
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ConcurrentUpdateAdminMixin, LargeTableAdmin):
     list_display = ('title', 'author', 'display_genre')
-    list_filter = ('author', 'genre')
+    # An author filter would list every author in the sidebar; search by author instead.
+    list_filter = ('genre',)
+    list_select_related = ('author',)
+    search_fields = ('title', 'isbn', 'author__last_name')
+    autocomplete_fields = ('author', 'genre')
+    readonly_fields = ('copies',)
     inlines = [BooksInstanceInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('genre', queryset=Genre.objects.order_by('pk').only('name')))
+
+    def copies(self, obj):
+        if obj.pk is None:
+            return '-'
+        return changelist_link(BookInstance, f'{obj.copies_available} of {obj.copies_total} available, view all',
+                               book__id__exact=obj.pk)
+
+    copies.short_description = 'Экземпляры'
+
 
 @admin.register(BookInstance)
-class BookInstanceAdmin(admin.ModelAdmin):
+class BookInstanceAdmin(ConcurrentUpdateAdminMixin, LargeTableAdmin):
     # fields = ['book', 'imprint', 'borrower, 'status', 'due_back', 'id']
+    form = BookInstanceForm
     fieldsets = (
         (None, {
-            'fields': ('book', 'imprint', 'id')
+            'fields': ('book', 'imprint', 'id', 'loaded_version')
         }),
         ('Доступность', {
             'fields': ('status', 'borrower', 'due_back')
@@ -42,3 +134,116 @@ class BookInstanceAdmin(admin.ModelAdmin):
     )
     list_display = ('book', 'status', 'due_back')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book',)
+    search_fields = ('book__title', 'imprint')
+    autocomplete_fields = ('book', 'borrower')
+    actions = ['check_out', 'mark_returned', 'renew_three_weeks']
+
+    def report(self, request, results, done):
+        # One message for the updated copies and one listing the copies that were skipped.
+        succeeded = sum(1 for result in results if result['ok'])
+        self.message_user(request, f'{succeeded} of {len(results)} copies {done}.', messages.SUCCESS)
+        failed = [f"{result['id']} ({result['error']})" for result in results if not result['ok']]
+        if failed:
+            self.message_user(request, 'Skipped: ' + ', '.join(failed[:20]) + (' ...' if len(failed) > 20 else ''),
+                              messages.WARNING)
+
+    def check_out(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        if 'apply' in request.POST:
+            form = CheckoutForm(request.POST)
+            if form.is_valid():
+                self.report(request, circulation.checkout(ids, form.cleaned_data['borrower'],
+                                                          form.cleaned_data['due_back']), 'checked out')
+                return None
+        else:
+            form = CheckoutForm(initial={'due_back': datetime.date.today() + datetime.timedelta(weeks=3)})
+        return TemplateResponse(request, 'admin/catalog/bookinstance/check_out.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Check out copies',
+            'opts': self.model._meta,
+            'form': form,
+            'ids': ids,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    check_out.short_description = 'Check out selected copies'
+    check_out.allowed_permissions = ('mark_returned',)
+
+    def mark_returned(self, request, queryset):
+        self.report(request, circulation.checkin(queryset.values_list('pk', flat=True)), 'returned')
+
+    mark_returned.short_description = 'Mark selected copies as returned'
+    mark_returned.allowed_permissions = ('mark_returned',)
+
+    def renew_three_weeks(self, request, queryset):
+        self.report(request, circulation.renew(queryset.values_list('pk', flat=True)), 'renewed')
+
+    renew_three_weeks.short_description = 'Renew selected loans for 3 weeks'
+    renew_three_weeks.allowed_permissions = ('mark_returned',)
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalog.can_mark_returned')
+
+
+@admin.register(Reservation)
+class ReservationAdmin(LargeTableAdmin):
+    form = ReservationForm
+    list_display = ('book', 'borrower', 'status', 'copy', 'created')
+    list_filter = ('status',)
+    list_select_related = ('book', 'borrower', 'copy__book')
+    autocomplete_fields = ('book', 'borrower')
+    fields = ('book', 'borrower')
+    actions = ['collect', 'cancel']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Holds and status changes only go through catalog.circulation.
+        return ('book', 'borrower') if obj is not None else ()
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            reservation = circulation.reserve(obj.book, obj.borrower)
+            obj.pk, obj.status, obj.copy_id = reservation.pk, reservation.status, reservation.copy_id
+
+    def cancel(self, request, queryset):
+        cancelled = 0
+        for reservation in queryset.filter(status__in=('w', 'h')):
+            try:
+                circulation.cancel(reservation)
+            except ValidationError:
+                # Collected or cancelled meanwhile.
+                continue
+            cancelled += 1
+        self.message_user(request, f'{cancelled} reservations cancelled.', messages.SUCCESS)
+
+    cancel.short_description = 'Cancel selected reservations'
+
+    def collect(self, request, queryset):
+        collected = 0
+        for reservation in queryset.filter(status='h'):
+            try:
+                circulation.collect(reservation)
+            except ValidationError:
+                # Collected or cancelled meanwhile.
+                continue
+            collected += 1
+        self.message_user(request, f'{collected} reservations lent to their borrowers.', messages.SUCCESS)
+
+    collect.short_description = 'Lend the copies on hold to their borrowers'
+    collect.allowed_permissions = ('mark_returned',)
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalog.can_mark_returned')
+
+
+@admin.register(VisitCount)
+class VisitCountAdmin(admin.ModelAdmin):
+    list_display = ('day', 'page', 'count')
+    list_filter = ('page',)
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,141 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import Author, Book, BookInstance, Genre
+from .pagination import CursorPaginator
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_IDS = 100
+
+
+class ApiError(Exception):
+    pass
+
+
+def genre_names(book_ids):
+    names = defaultdict(list)
+    for book_id, name in Book.genre.through.objects.filter(book_id__in=book_ids).values_list(
+            'book_id', 'genre__name').order_by('book_id', 'genre__name'):
+        names[book_id].append(name)
+    return names
+
+
+def author_books(author_ids):
+    books = defaultdict(list)
+    for author_id, book_id in Book.objects.filter(author_id__in=author_ids).values_list(
+            'author_id', 'pk').order_by('author_id', 'pk'):
+        books[author_id].append(book_id)
+    return books
+
+
+def urls(name):
+    return lambda pks: {pk: reverse(name, args=[pk]) for pk in pks}
+
+
+class Resource:
+    """
+    JSON representation of a model. ``fields`` maps output names to lookups
+    loaded with values(); ``related`` maps output names to functions that load
+    the field for a whole page of primary keys at once.
+    """
+
+    def __init__(self, model, fields, ordering, default_fields=None, related=None):
+        self.model = model
+        self.fields = fields
+        self.ordering = ordering
+        self.related = related or {}
+        self.default_fields = default_fields or list(fields) + list(self.related)
+
+    def parse_fields(self, value):
+        if not value:
+            return list(self.default_fields)
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields and name not in self.related]
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(unknown)}')
+        return names
+
+    def queryset(self, names):
+        lookups = {'pk', *self.ordering, *(self.fields[name] for name in names if name in self.fields)}
+        return self.model.objects.values(*lookups)
+
+    def serialize(self, rows, names):
+        pks = [row['pk'] for row in rows]
+        related = {name: self.related[name](pks) for name in names if name in self.related}
+        return [{name: related[name][row['pk']] if name in related else row[self.fields[name]] for name in names}
+                for row in rows]
+
+    def page(self, names, cursor=None, limit=DEFAULT_LIMIT):
+        page = CursorPaginator(self.queryset(names), limit, self.ordering).page(cursor)
+        return page, self.serialize(page.object_list, names)
+
+    def in_bulk(self, names, ids):
+        """Objects with the given primary keys, in the order asked for; missing ones are left out."""
+        try:
+            pks = list(dict.fromkeys(self.model._meta.pk.to_python(value) for value in ids))
+        except ValidationError:
+            raise ApiError('Invalid id')
+        if len(pks) > MAX_IDS:
+            raise ApiError(f'At most {MAX_IDS} ids per request')
+        rows = {row['pk']: row for row in self.queryset(names).filter(pk__in=pks)}
+        return self.serialize([rows[pk] for pk in pks if pk in rows], names)
+
+
+BOOKS = Resource(
+    Book,
+    {'id': 'pk', 'title': 'title', 'summary': 'summary', 'isbn': 'isbn', 'author': 'author_id',
+     'author_first_name': 'author__first_name', 'author_last_name': 'author__last_name',
+     'copies': 'copies_total', 'copies_available': 'copies_available', 'copies_on_loan': 'copies_on_loan',
+     'copies_reserved': 'copies_reserved', 'copies_maintenance': 'copies_maintenance'},
+    ordering=('title', 'pk'),
+    default_fields=['id', 'title', 'author', 'author_first_name', 'author_last_name', 'copies_available'],
+    related={'genres': genre_names, 'url': urls('book-detail')},
+)
+AUTHORS = Resource(
+    Author,
+    {'id': 'pk', 'first_name': 'first_name', 'last_name': 'last_name', 'date_of_birth': 'date_of_birth',
+     'date_of_death': 'date_of_death'},
+    ordering=('last_name', 'first_name', 'pk'),
+    related={'books': author_books, 'url': urls('author-detail')},
+)
+GENRES = Resource(Genre, {'id': 'pk', 'name': 'name'}, ordering=('name', 'pk'))
+COPIES = Resource(
+    BookInstance,
+    {'id': 'pk', 'book': 'book_id', 'book_title': 'book__title', 'imprint': 'imprint', 'status': 'status',
+     'due_back': 'due_back'},
+    ordering=('pk',),
+)
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        return min(max(int(value), 1), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('limit must be a number')
+
+
+def json_response(request, data, status=200):
+    """
+    Compact JSON with an ETag of the content, answering 304 when the client
+    already has it.
+    """
+    if status != 200:
+        return JsonResponse(data, status=status)
+    content = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    etag = quote_etag(hashlib.md5(content).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
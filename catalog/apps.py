@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class CatalogConfig(AppConfig):
     name = 'catalog'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.checks import register
+        from .checks import check_connection_pools, check_page_cache
+        from .signals import connect_signals
+        connect_signals()
+        register(check_connection_pools)
+        register(check_page_cache)
+        if getattr(settings, 'CATALOG_PRECOMPILE_TEMPLATES', False):
+            from .templating import precompile_templates
+            precompile_templates()
@@ -0,0 +1,38 @@
+import operator
+from functools import reduce
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import COPY_COUNTERS, Book, BookInstance
+
+
+def copy_count(**filters):
+    counts = BookInstance.objects.filter(book=OuterRef('pk'), **filters).order_by().values('book').annotate(
+        count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def counter_expressions():
+    """The Book copy counters, computed from the copies themselves."""
+    expressions = {'copies_total': copy_count()}
+    for status, field in COPY_COUNTERS.items():
+        expressions[field] = copy_count(status=status)
+    return expressions
+
+
+def reconcile_copy_counts(book_ids=None, dry_run=False, batch_size=500):
+    """
+    Recompute the copy counters of ``book_ids`` (all books by default) from
+    BookInstance. Returns the ids of the books whose counters were wrong.
+    """
+    books = Book.objects.all() if book_ids is None else Book.objects.filter(pk__in=book_ids)
+    expressions = counter_expressions()
+    drift = reduce(operator.or_, (~Q(**{field: F(f'actual_{field}')}) for field in expressions))
+    drifted = list(books.annotate(**{f'actual_{field}': expression for field, expression in expressions.items()})
+                   .filter(drift).order_by('pk').values_list('pk', flat=True))
+    if not dry_run:
+        for start in range(0, len(drifted), batch_size):
+            # Recomputed in the UPDATE itself, so copies changed meanwhile are counted too.
+            Book.objects.filter(pk__in=drifted[start:start + batch_size]).update(**expressions)
+    return drifted
@@ -0,0 +1,6 @@
+# Pooled variants of Django's database backends (see catalog.backends.pool).
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'catalog.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'catalog.backends.postgresql',
+    'django.db.backends.sqlite3': 'catalog.backends.sqlite3',
+}
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from django.db import OperationalError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """No connection became free within the pool's TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections, shared by every thread of this
+    process. Idle connections are reused most-recently-released first, checked
+    with ``check`` when they've been idle longer than ``health_check_after``
+    seconds, and closed once older than ``max_lifetime`` or idle longer than
+    ``max_idle``. At most ``max_size`` connections are open; further requests
+    wait up to ``timeout`` seconds for one to be released.
+    """
+
+    def __init__(self, check, max_size=10, max_lifetime=1800, max_idle=600, health_check_after=30, timeout=10):
+        self.check = check
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.idle = []  # (connection, created, released, suspect), most recently released last.
+        self.in_use = {}  # id(connection) -> created
+        self.size = 0
+        self.metrics = Counter()
+
+    def acquire(self, connect):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry, stale = self._reserve(deadline)
+            for connection in stale:
+                self._close(connection)
+            if entry is None:
+                return self._connect(connect)
+            connection, created, released, suspect = entry
+            if suspect or time.monotonic() - released >= self.health_check_after:
+                self._count('health_checks')
+                try:
+                    self.check(connection)
+                except Exception:
+                    self._close(connection)
+                    self._forget('closed_unhealthy')
+                    continue
+            self._count('reused')
+            self.in_use[id(connection)] = created
+            return connection
+
+    def release(self, connection, reusable=True, suspect=False):
+        """Hand back a connection; ``suspect`` ones are health-checked before their next use."""
+        created = self.in_use.pop(id(connection), None)
+        now = time.monotonic()
+        if created is None or not reusable or now - created >= self.max_lifetime:
+            self._close(connection)
+            self._forget('closed_lifetime' if reusable and created is not None else 'closed_errors')
+            return
+        with self.condition:
+            self.idle.append((connection, created, now, suspect))
+            self.condition.notify()
+
+    def close_all(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.condition.notify_all()
+        for connection, *_ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.metrics, size=self.size, idle=len(self.idle), in_use=self.size - len(self.idle),
+                        max_size=self.max_size)
+
+    def _reserve(self, deadline):
+        # Under the lock: take an idle connection, or claim a slot for a new one (entry None).
+        stale = []
+        with self.condition:
+            waited = False
+            while True:
+                now = time.monotonic()
+                while self.idle:
+                    entry = self.idle.pop()
+                    connection, created, released, _ = entry
+                    if now - created >= self.max_lifetime or now - released >= self.max_idle:
+                        self.metrics['closed_lifetime' if now - created >= self.max_lifetime else 'closed_idle'] += 1
+                        self.size -= 1
+                        stale.append(connection)
+                        continue
+                    return entry, stale
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, stale
+                if not waited:
+                    self.metrics['waits'] += 1
+                    waited = True
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection free within {self.timeout}s '
+                                      f'({self.max_size} in use)')
+                started = time.monotonic()
+                self.condition.wait(remaining)
+                self.metrics['wait_ms'] += (time.monotonic() - started) * 1000
+
+    def _connect(self, connect):
+        started = time.monotonic()
+        try:
+            connection = connect()
+        except Exception:
+            self._forget('connect_errors')
+            raise
+        self._count('created')
+        self._count('connect_ms', (time.monotonic() - started) * 1000)
+        self.in_use[id(connection)] = time.monotonic()
+        return connection
+
+    def _count(self, metric, value=1):
+        with self.condition:
+            self.metrics[metric] += value
+
+    def _forget(self, metric):
+        # A slot whose connection was closed.
+        with self.condition:
+            self.metrics[metric] += 1
+            self.size -= 1
+            self.condition.notify()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, options, check):
+    """The process-wide pool of ``alias``; a forked worker gets its own instead of sharing its parent's sockets."""
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    check,
+                    max_size=options.get('MAX_SIZE', 10),
+                    max_lifetime=options.get('MAX_LIFETIME', 1800),
+                    max_idle=options.get('MAX_IDLE', 600),
+                    health_check_after=options.get('HEALTH_CHECK_AFTER', 30),
+                    timeout=options.get('TIMEOUT', 10),
+                )
+    return pool
+
+
+def pool_stats():
+    """Metrics of this process's pools, by alias."""
+    pid = os.getpid()
+    return {alias: pool.stats() for (alias, owner), pool in list(_pools.items()) if owner == pid}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database wrapper whose connections come from, and go back to, a
+    ConnectionPool configured by the database's POOL settings. Use with
+    CONN_MAX_AGE = 0 so the connection is handed back after every request.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}), self.check_pooled_connection)
+
+    def get_new_connection(self, conn_params):
+        parent = super()
+        return self.pool.acquire(lambda: parent.get_new_connection(conn_params))
+
+    def check_pooled_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reusable = True
+        try:
+            # Nothing left open for the next user of the connection.
+            self.connection.rollback()
+        except self.Database.Error:
+            reusable = False
+        self.pool.release(self.connection, reusable, suspect=self.errors_occurred)
@@ -0,0 +1,324 @@
+import json
+import math
+import re
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from copy import copy
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.template.base import Template
+from django.test import Client
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext, instrumented_test_render
+from django.urls import reverse
+
+from . import urls as catalog_urls
+from .models import Author, Book, BookInstance, Genre
+
+
+def percentile(samples, percent):
+    # Nearest-rank percentile.
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def sample_kwargs():
+    """Values for the URL parameters of catalog/urls.py, taken from existing rows."""
+    return {
+        'book': Book.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'author': Author.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'genre': Genre.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'copy': BookInstance.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'renew': BookInstance.objects.filter(status__exact='o').values_list('pk', flat=True).first(),
+        'page': 2,
+    }
+
+
+# API endpoints and the fields that make them equivalent to an HTML page.
+API_EQUIVALENTS = {
+    'api-books': ('books', 'fields=title,author_first_name,author_last_name,url&limit=5'),
+    'api-book[pk]': ('book-detail[pk]', 'fields=title,author_first_name,author_last_name,summary,isbn,genres,'
+                                        'copies,copies_available'),
+    'api-authors': ('authors', 'fields=first_name,last_name,date_of_birth,date_of_death,url&limit=5'),
+    'api-author[pk]': ('author-detail[pk]', 'fields=first_name,last_name,date_of_birth,date_of_death,books'),
+}
+
+
+def catalog_paths():
+    """One path per named pattern in catalog/urls.py, or per (name, parameters) combination."""
+    samples = sample_kwargs()
+    paths = {}
+    for pattern in catalog_urls.urlpatterns:
+        groups = list(pattern.pattern.regex.groupindex)
+        kwargs = {}
+        for group in groups:
+            if group == 'page':
+                kwargs[group] = samples['page']
+            else:
+                sample = next((name for name in ('renew', 'copy', 'genre', 'author') if name in pattern.name), 'book')
+                kwargs[group] = samples[sample]
+        if any(value is None for value in kwargs.values()):
+            continue
+        label = pattern.name + ''.join(f'[{group}]' for group in groups)
+        paths[label] = reverse(pattern.name, kwargs=kwargs)
+        if label in API_EQUIVALENTS:
+            paths[label] += '?' + API_EQUIVALENTS[label][1]
+    return paths
+
+
+def api_comparison_paths(paths):
+    """The API endpoints in ``paths`` whose equivalent page is there too, and those pages."""
+    labels = set()
+    for api_label, (html_label, _) in API_EQUIVALENTS.items():
+        if api_label in paths and html_label in paths:
+            labels.update((api_label, html_label))
+    return {label: path for label, path in paths.items() if label in labels}
+
+
+def compare_api(results):
+    """(api label, html label, html p50, api p50, speedup) for API endpoints benchmarked with their page."""
+    rows = []
+    for api_label, (html_label, _) in API_EQUIVALENTS.items():
+        if api_label in results and html_label in results:
+            html_p50, api_p50 = results[html_label]['p50_ms'], results[api_label]['p50_ms']
+            rows.append((api_label, html_label, html_p50, api_p50, html_p50 / api_p50 if api_p50 else None))
+    return rows
+
+
+class Benchmark:
+    """
+    Drives catalog URLs through the test client and collects per-URL latency
+    percentiles, query counts and allocated memory. With ``cold_cache`` the
+    cache is cleared (untimed) before every request, so no page, fragment or
+    validator is served from it.
+    """
+
+    def __init__(self, paths, iterations=20, warmup=2, username=None, cold_cache=False):
+        self.paths = paths
+        self.iterations = iterations
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+        self.client = Client()
+        if username:
+            self.client.force_login(User.objects.get(username=username))
+
+    def run(self):
+        return {label: self.measure(path) for label, path in self.paths.items()}
+
+    def prepare(self):
+        if self.cold_cache:
+            cache.clear()
+
+    def measure(self, path):
+        for _ in range(self.warmup):
+            self.prepare()
+            self.client.get(path)
+
+        timings = []
+        for _ in range(self.iterations):
+            self.prepare()
+            started = time.perf_counter()
+            response = self.client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.prepare()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(path)
+        # Read now: the next request resets connection.queries.
+        query_count = len(queries)
+
+        self.prepare()
+        tracemalloc.start()
+        try:
+            self.client.get(path)
+            allocated, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'path': path,
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': query_count,
+            'allocated_kb': round(allocated / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+
+def capture_templates(paths, username=None):
+    """
+    {template name: (template, context)} for every template rendered by GETs of
+    ``paths``, with a copy of the context its view built, to re-render it
+    outside of the request.
+    """
+    captured = {}
+
+    def store(sender, template, context, **kwargs):
+        if template.name and template.name not in captured:
+            captured[template.name] = (template, copy(context))
+
+    client = Client()
+    if username:
+        client.force_login(User.objects.get(username=username))
+    # What the test runner does so that rendering sends template_rendered.
+    render, Template._render = Template._render, instrumented_test_render
+    template_rendered.connect(store, dispatch_uid='catalog.benchmark.capture_templates')
+    try:
+        for path in paths.values():
+            # Pages and fragments rendered, not served from the cache.
+            cache.clear()
+            client.get(path)
+    finally:
+        Template._render = render
+        template_rendered.disconnect(dispatch_uid='catalog.benchmark.capture_templates')
+    return captured
+
+
+class TemplateBenchmark:
+    """
+    Renders each captured template with its context and collects render time
+    percentiles, allocations and the queries rendering still runs (lazy
+    context values), plus the time to parse the template from source and to
+    get it from the configured loaders. ``{% cache %}`` fragments are always
+    rendered, never read from the cache.
+    """
+
+    def __init__(self, templates, iterations=50, warmup=3):
+        self.templates = templates
+        self.iterations = iterations
+        self.warmup = warmup
+
+    def run(self):
+        return {name: self.measure(template, context) for name, (template, context) in self.templates.items()}
+
+    def measure(self, template, context):
+        context = copy(context)
+        context.push(fragment_timeout=0)
+        for _ in range(self.warmup):
+            template.render(context)
+
+        timings = []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            template.render(context)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        with CaptureQueriesContext(connection) as queries:
+            template.render(context)
+        query_count = len(queries)
+
+        tracemalloc.start()
+        try:
+            template.render(context)
+            allocated, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        started = time.perf_counter()
+        Template(template.source, template.origin, template.name, template.engine)
+        parse_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        template.engine.get_template(template.name)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'parse_ms': round(parse_ms, 3),
+            'load_ms': round(load_ms, 3),
+            'queries': query_count,
+            'allocated_kb': round(allocated / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+
+def connection_churn(alias, concurrency, total):
+    """
+    ``total`` simulated requests against database ``alias`` on ``concurrency``
+    threads. Each connects (timed separately), runs one query and then closes
+    its connection as the end of a request would, per the alias' CONN_MAX_AGE.
+    """
+    def request(_):
+        db = connections[alias]
+        opened = db.connection is None
+        started = time.perf_counter()
+        db.ensure_connection()
+        connected = time.perf_counter()
+        with db.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        db.close_if_unusable_or_obsolete()
+        return opened, (connected - started) * 1000, (time.perf_counter() - started) * 1000
+
+    def finish():
+        connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        samples = list(pool.map(request, range(total)))
+        elapsed = time.perf_counter() - started
+        # Persistent connections belong to the worker threads; close them there.
+        for future in [pool.submit(finish) for _ in range(concurrency)]:
+            future.result()
+    connect_ms = [connect for _, connect, _ in samples]
+    return {
+        'req_per_s': round(total / elapsed, 1),
+        'p50_ms': round(percentile([duration for _, _, duration in samples], 50), 3),
+        'p95_ms': round(percentile([duration for _, _, duration in samples], 95), 3),
+        'connect_p50_ms': round(percentile(connect_ms, 50), 3),
+        'connect_p95_ms': round(percentile(connect_ms, 95), 3),
+        'connect_total_ms': round(sum(connect_ms), 1),
+        'connects': sum(1 for opened, _, _ in samples if opened),
+    }
+
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+def count_writes(func, *args):
+    """(result of func(*args), INSERT/UPDATE/DELETE statements it ran on any database)."""
+    writes = []
+
+    def record(execute, sql, params, many, context):
+        if WRITE_RE.match(sql):
+            writes.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for db in connections.all():
+            stack.enter_context(db.execute_wrapper(record))
+        result = func(*args)
+    return result, len(writes)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Regressions against a baseline: p95 slower by more than ``tolerance`` or more queries."""
+    regressions = []
+    for label, result in results.items():
+        previous = baseline.get(label)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{label}: {previous['queries']} -> {result['queries']} queries")
+        if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results, **meta):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, ensure_ascii=False, sort_keys=True)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+
+def check_connection_pools(app_configs, **kwargs):
+    """Pool sizes that can't work with the deployment's worker count or connection budget."""
+    warnings = []
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    budget = getattr(settings, 'DATABASE_MAX_CONNECTIONS', None)
+    for alias, database in settings.DATABASES.items():
+        if 'POOL' not in database:
+            continue
+        size = database['POOL'].get('MAX_SIZE', 10)
+        if budget and size * workers > budget:
+            warnings.append(Warning(
+                f'{workers} workers with pools of {size} can open {size * workers} connections to '
+                f'"{alias}", more than DATABASE_MAX_CONNECTIONS ({budget}).',
+                hint='Lower DJANGO_DB_POOL_MAX_SIZE or WEB_CONCURRENCY.', id='catalog.W001'))
+        if database.get('CONN_MAX_AGE'):
+            warnings.append(Warning(
+                f'CONN_MAX_AGE keeps "{alias}" connections in their threads instead of the pool.',
+                hint='Set CONN_MAX_AGE to 0 for pooled databases.', id='catalog.W002'))
+    return warnings
+
+
+def check_page_cache(app_configs, **kwargs):
+    """Cached pages that never expire while invalidations can't reach every worker."""
+    from .page_cache import cache_shared_by_workers
+    if cache_shared_by_workers() or getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', None) is not None:
+        return []
+    return [Warning(
+        f'The cache is per process (LocMemCache) and WEB_CONCURRENCY is {settings.WEB_CONCURRENCY}: a page '
+        f'edited through one worker stays stale in the others, as CATALOG_PAGE_CACHE_TIMEOUT is None.',
+        hint='Use a shared cache (DJANGO_CACHE_BACKEND) or set CATALOG_PAGE_CACHE_TIMEOUT.', id='catalog.W003')]
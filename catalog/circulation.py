@@ -0,0 +1,205 @@
+import datetime
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .conditional import touch
+from .forms import validate_due_back
+from .models import Book, BookInstance, Reservation, move_copy_counts
+from .page_cache import bump
+from .stats import invalidate_library_stats
+
+# Status a copy must have for each operation, and the status it ends in.
+OPERATIONS = {
+    'checkout': ('a', 'o'),
+    'return': ('o', 'a'),
+    'renew': ('o', 'o'),
+}
+STATUS_ERRORS = {
+    'a': 'Not available',
+    'o': 'Not on loan',
+}
+
+
+def parse_copy_ids(values):
+    """(ids, report) where report has an error entry for every value that isn't a UUID."""
+    ids, report = [], {}
+    for value in values:
+        try:
+            ids.append(uuid.UUID(str(value)))
+        except ValueError:
+            report[str(value)] = {'id': str(value), 'ok': False, 'error': 'Invalid id'}
+    return ids, report
+
+
+def apply(operation, copy_ids, borrower=None, due_back=None):
+    """
+    Run a check out, return or renewal for many copies with a single UPDATE.
+    Returns one {'id', 'ok', 'error'} entry per requested id, in request order.
+    """
+    required, status = OPERATIONS[operation]
+    if operation in ('checkout', 'renew'):
+        validate_due_back(due_back)
+    if operation == 'checkout' and borrower is None:
+        raise ValidationError('A borrower is required to check out')
+
+    values = list(dict.fromkeys(str(value) for value in copy_ids))
+    ids, report = parse_copy_ids(values)
+    ids = list(dict.fromkeys(ids))
+    using = router.db_for_write(BookInstance)
+    with transaction.atomic(using=using):
+        # Locked until the UPDATE so concurrent operations can't both pass the status check.
+        current = {pk: (book_id, copy_status) for pk, book_id, copy_status in BookInstance.objects.using(
+            using).select_for_update().filter(pk__in=ids).order_by().values_list('pk', 'book_id', 'status')}
+        eligible = []
+        for pk in ids:
+            if pk not in current:
+                report[str(pk)] = {'id': str(pk), 'ok': False, 'error': 'Not found'}
+            elif current[pk][1] != required:
+                report[str(pk)] = {'id': str(pk), 'ok': False, 'error': STATUS_ERRORS[required]}
+            else:
+                eligible.append(pk)
+
+        updates = {'status': status, 'modified': timezone.now(), 'version': F('version') + 1}
+        if operation == 'checkout':
+            updates.update(borrower=borrower, due_back=due_back)
+        elif operation == 'renew':
+            updates.update(due_back=due_back)
+        else:
+            updates.update(borrower=None, due_back=None)
+        if eligible:
+            BookInstance.objects.using(using).filter(pk__in=eligible, status=required).update(**updates)
+            if status != required:
+                # Queryset updates skip BookInstance.save(), which keeps the counters.
+                move_copy_counts([((current[pk][0], required), (current[pk][0], status)) for pk in eligible], using)
+        for pk in eligible:
+            report[str(pk)] = {'id': str(pk), 'ok': True, 'error': None}
+        book_ids = {current[pk][0] for pk in eligible} - {None}
+        if operation == 'return':
+            # In the same transaction, so a returned copy is never left available with a queue waiting.
+            for book_id in book_ids:
+                allocate(book_id)
+
+    if book_ids:
+        expire_copies(book_ids, status != required)
+    return [report[value] if value in report else report[str(uuid.UUID(value))] for value in values]
+
+
+def expire_copies(book_ids, status_changed=True):
+    # What the post_save signals would have done for each copy.
+    touch(Book, *book_ids)
+    bump('book', *book_ids)
+    if status_changed:
+        bump('book-list')
+        invalidate_library_stats()
+
+
+def checkout(copy_ids, borrower, due_back=None):
+    return apply('checkout', copy_ids, borrower, due_back or datetime.date.today() + datetime.timedelta(weeks=3))
+
+
+def checkin(copy_ids):
+    return apply('return', copy_ids)
+
+
+def renew(copy_ids, due_back=None):
+    return apply('renew', copy_ids, due_back=due_back or datetime.date.today() + datetime.timedelta(weeks=3))
+
+
+# Reservations. Copies are handed out with conditional UPDATEs (status and
+# version must still be what was read) rather than locks, so a librarian
+# whose update matched no row just moves on to the next candidate.
+MAX_CONFLICTS = 10
+
+
+def reserve(book, borrower):
+    """Join the queue for ``book``; the reservation is put on hold at once if a copy is available."""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                reservation = Reservation.objects.create(book=book, borrower=borrower)
+        except IntegrityError:
+            raise ValidationError('Already reserved')
+        allocate(book.pk)
+    reservation.refresh_from_db()
+    return reservation
+
+
+def allocate(book_id):
+    """Put available copies of a book on hold for the head of its queue; returns the reservation ids served."""
+    served, conflicts = [], 0
+    using = router.db_for_write(BookInstance)
+    # On the primary, like the holds: a replica may not have the queue or the copy yet.
+    with transaction.atomic(using=using):
+        while conflicts < MAX_CONFLICTS:
+            head = Reservation.objects.using(using).filter(book_id=book_id, status='w').order_by(
+                'created', 'id').values_list('pk', 'borrower_id').first()
+            if head is None:
+                break
+            copy = BookInstance.objects.using(using).filter(book_id=book_id, status='a').order_by().values_list(
+                'pk', 'version').first()
+            if copy is None:
+                break
+            if hold(book_id, head, copy, using):
+                served.append(head[0])
+            else:
+                conflicts += 1
+    if served:
+        expire_copies([book_id])
+    return served
+
+
+def hold(book_id, reservation, copy, using=None):
+    (reservation_id, borrower_id), (copy_id, version) = reservation, copy
+    now = timezone.now()
+    using = using or router.db_for_write(BookInstance)
+    with transaction.atomic(using=using):
+        if not BookInstance.objects.using(using).filter(pk=copy_id, status='a', version=version).update(
+                status='r', borrower_id=borrower_id, due_back=None, version=F('version') + 1, modified=now):
+            return False
+        if not Reservation.objects.using(using).filter(pk=reservation_id, status='w').update(
+                status='h', copy_id=copy_id, modified=now):
+            # Served by someone else meanwhile; give the copy back.
+            transaction.set_rollback(True, using=using)
+            return False
+        move_copy_counts([((book_id, 'a'), (book_id, 'r'))], using)
+    return True
+
+
+def collect(reservation, due_back=None):
+    """Lend the copy on hold to the borrower who reserved it."""
+    due_back = due_back or datetime.date.today() + datetime.timedelta(weeks=3)
+    validate_due_back(due_back)
+    now = timezone.now()
+    with transaction.atomic():
+        copy_id = Reservation.objects.filter(pk=reservation.pk, status='h').values_list('copy_id', flat=True).first()
+        if copy_id is None or not Reservation.objects.filter(pk=reservation.pk, status='h', copy_id=copy_id).update(
+                status='f', modified=now):
+            raise ValidationError('Not on hold')
+        if not BookInstance.objects.filter(pk=copy_id, status='r', borrower_id=reservation.borrower_id).update(
+                status='o', due_back=due_back, version=F('version') + 1, modified=now):
+            raise ValidationError('The copy is no longer on hold')
+        move_copy_counts([((reservation.book_id, 'r'), (reservation.book_id, 'o'))])
+    expire_copies([reservation.book_id])
+
+
+def cancel(reservation):
+    """Leave the queue; a copy on hold goes to the next reservation."""
+    now = timezone.now()
+    with transaction.atomic():
+        status, copy_id = Reservation.objects.filter(pk=reservation.pk, status__in=('w', 'h')).values_list(
+            'status', 'copy_id').first() or (None, None)
+        if status is None or not Reservation.objects.filter(pk=reservation.pk, status=status).update(
+                status='c', modified=now):
+            raise ValidationError('Not waiting or on hold')
+        released = status == 'h' and BookInstance.objects.filter(
+            pk=copy_id, status='r', borrower_id=reservation.borrower_id).update(
+                status='a', borrower=None, version=F('version') + 1, modified=now)
+        if released:
+            move_copy_counts([((reservation.book_id, 'r'), (reservation.book_id, 'a'))])
+            allocate(reservation.book_id)
+    if released:
+        expire_copies([reservation.book_id])
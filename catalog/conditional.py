@@ -0,0 +1,103 @@
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Author, Book
+from .page_cache import get_versions
+from .routers import routing
+
+VALIDATOR_KEY_PREFIX = 'catalog:validators:'
+
+
+def touch(model, *pks):
+    """Mark rows as modified without loading or saving them (no signals are sent)."""
+    pks = [pk for pk in pks if pk is not None]
+    if pks:
+        model.objects.filter(pk__in=pks).update(modified=timezone.now())
+
+
+def touch_books(book_ids):
+    book_ids = set(book_ids)
+    if book_ids:
+        touch(Book, *book_ids)
+        touch(Author, *set(Book.objects.filter(pk__in=book_ids).values_list('author_id', flat=True)))
+
+
+def cached_validators(version_keys, compute):
+    # Validators only change together with the page cache versions, so they
+    # are cached under the same version and looked up without a query; and
+    # expire like the pages, for workers that don't see other workers' bumps.
+    key = VALIDATOR_KEY_PREFIX + hashlib.md5('|'.join(get_versions(*version_keys)).encode()).hexdigest()
+    validators = cache.get(key)
+    if validators is None:
+        with routing(pinned=True):
+            validators = compute()
+        cache.set(key, validators, getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', None))
+    return validators
+
+
+def object_validators(model, pk):
+    def compute():
+        modified = model.objects.filter(pk=pk).values_list('modified', flat=True).first()
+        return {'modified': modified, 'signature': f'{model._meta.label}:{pk}:{modified}'}
+    return cached_validators([(model._meta.model_name, pk)], compute)
+
+
+def book_list_validators():
+    def compute():
+        stats = Book.objects.aggregate(modified=Max('modified'), author_modified=Max('author__modified'),
+                                       count=Count('pk'))
+        modified = max(filter(None, [stats['modified'], stats['author_modified']]), default=None)
+        return {'modified': modified, 'signature': f'books:{modified}:{stats["count"]}'}
+    return cached_validators(['book-list'], compute)
+
+
+def author_list_validators():
+    def compute():
+        stats = Author.objects.aggregate(modified=Max('modified'), count=Count('pk'))
+        return {'modified': stats['modified'], 'signature': f'authors:{stats["modified"]}:{stats["count"]}'}
+    return cached_validators(['author-list'], compute)
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET requests with 304 Not Modified when the client's ETag or
+    Last-Modified still match ``get_validators()``. The ETag also covers the
+    current user, since the sidebar and staff links differ per user.
+    """
+    cache_vary_on_date = False
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators['modified'] is None and getattr(self, 'pk_url_kwarg', None) in self.kwargs:
+            # Missing object: let the view raise 404.
+            return super().get(request, *args, **kwargs)
+        etag = self.compute_etag(validators)
+        last_modified = int(validators['modified'].timestamp()) if validators['modified'] else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None and not self.cache_vary_on_date:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def compute_etag(self, validators):
+        user = self.request.user
+        # The templates show staff links by permission, so a grant or revoke changes the page.
+        permissions = ','.join(sorted(user.get_all_permissions()))
+        parts = [validators['signature'], str(user.pk), str(user.is_superuser), permissions,
+                 self.request.get_full_path()]
+        if self.cache_vary_on_date:
+            parts.append(datetime.date.today().isoformat())
+        return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
@@ -0,0 +1,122 @@
+import csv
+import json
+import zlib
+
+from .api import genre_names
+from .models import Author, Book, BookInstance
+from .pagination import chunked_queryset, iterate_queryset
+
+DATASETS = ('books', 'authors', 'copies')
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+GENRE_SEPARATOR = ';'
+
+
+def book_rows(queryset, chunk_size):
+    rows = queryset.values('id', 'isbn', 'title', 'summary', 'author__first_name', 'author__last_name',
+                           'copies_total')
+    for chunk in chunked_queryset(rows, chunk_size):
+        book_ids = [row['id'] for row in chunk]
+        genres = genre_names(book_ids)
+        for row in chunk:
+            yield {
+                'id': row['id'],
+                'isbn': row['isbn'],
+                'title': row['title'],
+                'summary': row['summary'],
+                'author_first_name': row['author__first_name'] or '',
+                'author_last_name': row['author__last_name'] or '',
+                'genres': genres[row['id']],
+                'copies': row['copies_total'],
+            }
+
+
+def author_rows(queryset, chunk_size):
+    rows = queryset.values('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death')
+    yield from iterate_queryset(rows, chunk_size)
+
+
+def copy_rows(queryset, chunk_size):
+    rows = queryset.values('id', 'book_id', 'book__isbn', 'book__title', 'imprint', 'status', 'due_back',
+                           'borrower__username')
+    for row in iterate_queryset(rows, chunk_size):
+        yield {
+            'id': str(row['id']),
+            'book_id': row['book_id'],
+            'book_isbn': row['book__isbn'],
+            'book_title': row['book__title'],
+            'imprint': row['imprint'],
+            'status': row['status'],
+            'due_back': row['due_back'],
+            'borrower': row['borrower__username'] or '',
+        }
+
+
+EXPORTERS = {
+    'books': (Book, book_rows,
+              ['id', 'isbn', 'title', 'summary', 'author_first_name', 'author_last_name', 'genres', 'copies']),
+    'authors': (Author, author_rows, ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']),
+    'copies': (BookInstance, copy_rows,
+               ['id', 'book_id', 'book_isbn', 'book_title', 'imprint', 'status', 'due_back', 'borrower']),
+}
+
+
+def export_rows(dataset, after=None, chunk_size=2000):
+    """
+    Rows of ``dataset`` in primary key order, read ``chunk_size`` at a time.
+    ``after`` resumes after the given primary key.
+    """
+    model, rows, _ = EXPORTERS[dataset]
+    queryset = model.objects.order_by('pk')
+    if after not in (None, ''):
+        queryset = queryset.filter(pk__gt=model._meta.pk.to_python(after))
+    return rows(queryset, chunk_size)
+
+
+class _Line:
+    # File-like target for csv.writer that hands back each written line.
+    def write(self, value):
+        return value
+
+
+def encode(rows, fmt, dataset):
+    columns = EXPORTERS[dataset][2]
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns)
+        for row in rows:
+            if isinstance(row.get('genres'), list):
+                row['genres'] = GENRE_SEPARATOR.join(row['genres'])
+            yield writer.writerow([row[column] if row[column] is not None else '' for column in columns])
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        # Sync flush per chunk so clients receive data as it is produced.
+        yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def buffered(lines, size=64 * 1024):
+    # Join lines into larger chunks so the response isn't written line by line.
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_stream(dataset, fmt='csv', compress=False, after=None, chunk_size=2000):
+    """Bytes of the encoded (and optionally gzipped) export, produced lazily."""
+    chunks = buffered(encode(export_rows(dataset, after, chunk_size), fmt, dataset))
+    if compress:
+        return gzip_stream(chunks)
+    return (chunk.encode() for chunk in chunks)
@@ -1,9 +1,24 @@
 from django import forms
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime  # for checking renewal date range.
+import re
 
-from .models import BookInstance
+from .models import BookInstance, Reservation
+
+MAX_BULK_COPIES = 500
+STALE_OBJECT_MESSAGE = _('Someone else changed this copy meanwhile. Reload the page and try again.')
+
+
+def validate_due_back(data):
+    # Проверка того, что дата не выходит за "нижнюю" границу (не в прошлом).
+    if data < datetime.date.today():
+        raise ValidationError(_('Invalid date - renewal in past'))
+
+    # Проверка того, то дата не выходит за "верхнюю" границу (+4 недели).
+    if data > datetime.date.today() + datetime.timedelta(weeks=4):
+        raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
 
 
 class RenewBookForm(forms.Form):
@@ -11,26 +26,38 @@ class RenewBookForm(forms.Form):
 
     def clean_renewal_date(self):
         data = self.cleaned_data['renewal_date']
+        validate_due_back(data)
+        # Помните, что всегда надо возвращать "очищенные" данные.
+        return data
 
-        # Проверка того, что дата не выходит за "нижнюю" границу (не в прошлом).
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
 
-        # Проверка того, то дата не выходит за "верхнюю" границу (+4 недели).
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+class VersionedModelForm(forms.ModelForm):
+    """
+    Submits the version of the object the form was rendered for, so saving
+    over someone else's change fails instead of silently overwriting it.
+    """
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
 
-        # Помните, что всегда надо возвращать "очищенные" данные.
-        return data
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['loaded_version'].initial = self.instance.version
 
+    def clean(self):
+        cleaned_data = super().clean()
+        version = cleaned_data.get('loaded_version')
+        # Primary keys of copies default to a new UUID, so test for an unsaved instance by its state.
+        if version is not None and not self.instance._state.adding:
+            # Checked here for a friendly error; BookInstance.save() enforces it.
+            if not type(self.instance).objects.filter(pk=self.instance.pk, version=version).exists():
+                raise ValidationError(STALE_OBJECT_MESSAGE)
+            self.instance.version = version
+        return cleaned_data
 
-class RenewBookModelForm(forms.ModelForm):
+
+class RenewBookModelForm(VersionedModelForm):
     def clean_due_back(self):
         data = self.cleaned_data['due_back']
-        if data < datetime.date.today():
-            raise ValidationError(_('Invalid date - renewal in past'))
-        if data > datetime.date.today() + datetime.timedelta(weeks=4):
-            raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
+        validate_due_back(data)
         return data
 
     class Meta:
@@ -40,6 +67,73 @@ class RenewBookModelForm(forms.ModelForm):
         help_texts = {'due_back': _('Enter a date between now and 4 weeks (default 3).'), }
 
 
+class BookInstanceForm(VersionedModelForm):
+    class Meta:
+        model = BookInstance
+        fields = '__all__'
+
+
+class ReservationForm(forms.ModelForm):
+    class Meta:
+        model = Reservation
+        fields = ['book', 'borrower']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk is None and Reservation.objects.filter(
+                book=cleaned_data.get('book'), borrower=cleaned_data.get('borrower'), status__in=('w', 'h')).exists():
+            raise ValidationError(_('This borrower has already reserved this book'))
+        return cleaned_data
+
+
+class CheckoutForm(forms.Form):
+    borrower = forms.ModelChoiceField(User.objects.all(), to_field_name='username', widget=forms.TextInput,
+                                      help_text=_('Username'))
+    due_back = forms.DateField(help_text=_('Enter a date between now and 4 weeks (default 3).'))
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        validate_due_back(data)
+        return data
+
+
+class BulkCirculationForm(forms.Form):
+    OPERATIONS = (
+        ('checkout', _('Check out')),
+        ('return', _('Return')),
+        ('renew', _('Renew')),
+    )
+    operation = forms.ChoiceField(choices=OPERATIONS)
+    copies = forms.CharField(widget=forms.Textarea(attrs={'rows': 8}),
+                             help_text=_('Copy ids, separated by spaces, commas or new lines.'))
+    borrower = forms.ModelChoiceField(User.objects.all(), required=False, to_field_name='username',
+                                      widget=forms.TextInput, help_text=_('Username; required to check out.'))
+    due_back = forms.DateField(required=False, help_text=_('Enter a date between now and 4 weeks (default 3).'))
+
+    def clean_copies(self):
+        ids = list(dict.fromkeys(value for value in re.split(r'[\s,;]+', self.cleaned_data['copies']) if value))
+        if not ids:
+            raise ValidationError(_('Enter at least one copy id'))
+        if len(ids) > MAX_BULK_COPIES:
+            raise ValidationError(_('At most %(max)d copies per request') % {'max': MAX_BULK_COPIES})
+        return ids
+
+    def clean_due_back(self):
+        data = self.cleaned_data['due_back']
+        if data is not None:
+            validate_due_back(data)
+        return data
+
+    def clean(self):
+        cleaned_data = super().clean()
+        operation = cleaned_data.get('operation')
+        if operation == 'checkout' and not cleaned_data.get('borrower') and 'borrower' not in self.errors:
+            self.add_error('borrower', _('A borrower is required to check out'))
+        if operation in ('checkout', 'renew') and not cleaned_data.get('due_back') and 'due_back' not in self.errors:
+            self.add_error('due_back', _('A due date is required'))
+        return cleaned_data
+
+
 class MyForm(forms.Form):
     field1 = forms.CharField(max_length=20, label='Field 1', help_text='Must equals "Поле 1"')
     field2 = forms.CharField(max_length=20, label='Field 2')
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalog.benchmark import (Benchmark, api_comparison_paths, catalog_paths, compare, compare_api, load_baseline,
+                               save_baseline)
+from catalog.models import Book, BookInstance
+
+
+class Command(BaseCommand):
+    help = 'Measure latency percentiles, query counts and allocations for every catalog URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--user', help='Username to log in as (needed for the librarian views)')
+        parser.add_argument('--only', action='append', default=[], help='Only benchmark URL labels containing this')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare against a saved JSON baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        paths = catalog_paths()
+        if options['only']:
+            paths = {label: path for label, path in paths.items() if any(part in label for part in options['only'])}
+        results = Benchmark(paths, options['iterations'], options['warmup'], options['user']).run()
+
+        self.stdout.write(f"{'url':40} {'status':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>7} {'alloc kb':>9}")
+        for label, result in results.items():
+            self.stdout.write(f"{label:40} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                              f"{result['p99_ms']:>9.2f} {result['queries']:>7} {result['allocated_kb']:>9.1f}")
+
+        api_paths = api_comparison_paths(paths)
+        if api_paths:
+            # Again with the cache cleared before each request: anonymous pages would otherwise come
+            # from the page cache, while every API response is built.
+            cold = Benchmark(api_paths, options['iterations'], options['warmup'], options['user'], cold_cache=True)
+            comparison = compare_api(cold.run())
+            self.stdout.write(f"\n{'api':20} {'vs page':20} {'page p50':>9} {'api p50':>9} {'speedup':>8}"
+                              "  (cold cache)")
+            for api_label, html_label, html_p50, api_p50, speedup in comparison:
+                self.stdout.write(f"{api_label:20} {html_label:20} {html_p50:>9.2f} {api_p50:>9.2f} "
+                                  f"{speedup or 0:>7.1f}x")
+
+        if options['save']:
+            save_baseline(options['save'], results, created=timezone.now().isoformat(),
+                          books=Book.objects.count(), copies=BookInstance.objects.count(),
+                          iterations=options['iterations'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save']}"))
+
+        if options['baseline']:
+            regressions = compare(results, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from catalog.backends import POOLED_ENGINES
+from catalog.backends.pool import pool_stats
+from catalog.benchmark import connection_churn
+
+MODES = ('connect', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = ('Compare connection setup time per request with a new connection per request, '
+            "Django's persistent connections and the connection pool")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database whose settings are benchmarked')
+        parser.add_argument('--concurrency', type=int, action='append', help='Threads (repeatable; default 1 and 16)')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--only', choices=MODES, action='append', default=[])
+
+    def handle(self, *args, **options):
+        base = dict(connections[options['database']].settings_dict)
+        if base['ENGINE'] not in POOLED_ENGINES and base['ENGINE'] not in POOLED_ENGINES.values():
+            raise CommandError(f"No pooled backend for {base['ENGINE']}")
+        base['ENGINE'] = next((engine for engine, pooled in POOLED_ENGINES.items() if pooled == base['ENGINE']),
+                              base['ENGINE'])
+        base.pop('POOL', None)
+
+        self.stdout.write(f"{'mode':11} {'threads':>7} {'req/s':>9} {'p50':>8} {'p95':>8} "
+                          f"{'connect p50':>11} {'connect p95':>11} {'connect ms':>10} {'connects':>8}")
+        for concurrency in options['concurrency'] or [1, 16]:
+            for mode in options['only'] or MODES:
+                alias = f'benchmark-{mode}-{concurrency}'
+                connections.databases[alias] = self.settings_for(base, mode, concurrency)
+                try:
+                    result = connection_churn(alias, concurrency, options['requests'])
+                    if mode == 'pool':
+                        # Django opens a wrapper connection per request; the pool only some.
+                        result['connects'] = connections[alias].pool.stats()['created']
+                        connections[alias].pool.close_all()
+                finally:
+                    del connections.databases[alias]
+                    if hasattr(connections._connections, alias):
+                        delattr(connections._connections, alias)
+                self.stdout.write(
+                    f"{mode:11} {concurrency:>7} {result['req_per_s']:>9.1f} {result['p50_ms']:>8.3f} "
+                    f"{result['p95_ms']:>8.3f} {result['connect_p50_ms']:>11.3f} {result['connect_p95_ms']:>11.3f} "
+                    f"{result['connect_total_ms']:>10.1f} {result['connects']:>8}")
+        for alias, stats in pool_stats().items():
+            if alias.startswith('benchmark-'):
+                self.stdout.write(f'{alias}: {stats}')
+
+    @staticmethod
+    def settings_for(base, mode, concurrency):
+        settings = dict(base)
+        if mode == 'connect':
+            settings['CONN_MAX_AGE'] = 0
+        elif mode == 'persistent':
+            settings['CONN_MAX_AGE'] = None
+        else:
+            settings.update(ENGINE=POOLED_ENGINES[base['ENGINE']], CONN_MAX_AGE=0,
+                            POOL={'MAX_SIZE': concurrency, 'HEALTH_CHECK_AFTER': 30})
+        return settings
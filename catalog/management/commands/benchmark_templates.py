@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.utils import timezone
+
+from catalog.benchmark import (TemplateBenchmark, capture_templates, catalog_paths, compare, load_baseline,
+                               save_baseline)
+from catalog.models import Book, BookInstance
+from catalog.templating import template_names
+
+
+class Command(BaseCommand):
+    help = ('Measure render time and allocations of each catalog template, with the context its view builds from '
+            'the current data (see seed_catalog)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help='Username to log in as (needed for the librarian templates)')
+        parser.add_argument('--only', action='append', default=[], help='Only benchmark templates containing this')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare against a saved JSON baseline')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        templates = capture_templates(catalog_paths(), options['user'])
+        if options['only']:
+            templates = {name: captured for name, captured in templates.items()
+                         if any(part in name for part in options['only'])}
+        results = TemplateBenchmark(templates, options['iterations'], options['warmup']).run()
+
+        self.stdout.write(f'Template profile: {getattr(settings, "TEMPLATE_PROFILE", "-")}')
+        self.stdout.write(f"{'template':40} {'p50':>8} {'p95':>8} {'parse':>8} {'load':>8} {'queries':>7} "
+                          f"{'alloc kb':>9} {'peak kb':>8}")
+        for name, result in sorted(results.items()):
+            self.stdout.write(f"{name:40} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} "
+                              f"{result['parse_ms']:>8.3f} {result['load_ms']:>8.3f} {result['queries']:>7} "
+                              f"{result['allocated_kb']:>9.1f} {result['peak_kb']:>8.1f}")
+
+        if not options['only']:
+            missing = sorted(set(template_names(engines['django'].engine)) - set(results))
+            if missing:
+                self.stdout.write(f"Not rendered by any catalog GET: {', '.join(missing)}")
+
+        if options['save']:
+            save_baseline(options['save'], results, created=timezone.now().isoformat(),
+                          books=Book.objects.count(), copies=BookInstance.objects.count(),
+                          iterations=options['iterations'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save']}"))
+
+        if options['baseline']:
+            regressions = compare(results, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,67 @@
+from importlib import import_module
+
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from catalog import visits
+from catalog.benchmark import count_writes
+
+SESSION_ENGINES = ('db', 'cached_db', 'cache', 'signed_cookies')
+
+
+def session_counter(request):
+    # The homepage's former visit counter.
+    num_visits = request.session.get('num_visits', 0)
+    request.session['num_visits'] = num_visits + 1
+    return HttpResponse(str(num_visits))
+
+
+class Command(BaseCommand):
+    help = ('Count the database writes caused by homepage visits: the session-based counter with each session '
+            'engine, then the buffered counter and its batched flush. Nothing is kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Visits by one browser')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        self.stdout.write(f"{'counter':32} {'requests':>8} {'writes':>7} {'per request':>11}")
+        with transaction.atomic():
+            for engine in SESSION_ENGINES:
+                _, writes = count_writes(self.session_visits, engine, total)
+                self.row(f'session ({engine})', total, writes)
+
+            buffer, visits.buffer = visits.buffer, visits.VisitBuffer()
+            try:
+                _, writes = count_writes(self.homepage_visits, total)
+                self.row('buffered (homepage requests)', total, writes)
+                flushed, writes = count_writes(visits.buffer.flush)
+                self.row(f'buffered (flush of {flushed} visits)', 1, writes)
+            finally:
+                visits.buffer.stop_flusher()
+                visits.buffer = buffer
+            transaction.set_rollback(True)
+
+    def row(self, label, requests, writes):
+        self.stdout.write(f'{label:32} {requests:>8} {writes:>7} {writes / requests:>11.2f}')
+
+    @staticmethod
+    def session_visits(engine, total):
+        middleware = SessionMiddleware(session_counter)
+        middleware.SessionStore = import_module(f'django.contrib.sessions.backends.{engine}').SessionStore
+        factory, cookies = RequestFactory(), {}
+        for _ in range(total):
+            request = factory.get('/')
+            request.COOKIES.update(cookies)
+            response = middleware(request)
+            cookies.update({name: morsel.value for name, morsel in response.cookies.items()})
+
+    @staticmethod
+    def homepage_visits(total):
+        client = Client()
+        for _ in range(total):
+            client.get(reverse('index'))
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.http import HttpRequest
+
+from catalog.models import Author, Book, BookInstance
+from catalog.views import LoanedBooksByUserListView, LoanedBooksListView
+
+
+def cursor_page_queryset(view_class, user=None):
+    """The first-page query of ``view_class``'s cursor paginator, as the view runs it for ``user``."""
+    request = HttpRequest()
+    request.user = user
+    view = view_class()
+    view.setup(request)
+    paginator = view.get_cursor_paginator(view.get_queryset(), view.paginate_by)
+    return paginator.ordered()[:paginator.per_page + 1]
+
+
+def hot_path_querysets(borrower=None):
+    """The catalog's most frequent queries, keyed by a short description."""
+    return {
+        'loans by due date': cursor_page_queryset(LoanedBooksListView),
+        'loans of a borrower': cursor_page_queryset(LoanedBooksByUserListView, borrower),
+        'available copies': BookInstance.objects.filter(status__exact='a'),
+        'overdue loans by borrower': BookInstance.objects.overdue_notice_pending().order_by('borrower', 'due_back'),
+        'books by title': Book.objects.order_by('title', 'pk'),
+        'authors by name': Author.objects.order_by('last_name', 'first_name', 'pk'),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Print the database query plans of the catalog hot paths'
+
+    def handle(self, *args, **options):
+        borrower = User.objects.order_by('pk').first()
+        for description, queryset in hot_path_querysets(borrower).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(description))
+            self.stdout.write(queryset.explain())
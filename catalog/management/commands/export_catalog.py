@@ -0,0 +1,33 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.export import DATASETS, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream books, authors or copies to CSV or JSON Lines, optionally gzipped, in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help='File to write, or - for standard output')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output (implied by a .gz output)')
+        parser.add_argument('--after', help='Resume after this primary key (the id of the last exported row)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        compress = options['gzip'] or options['output'].endswith('.gz')
+        try:
+            stream = export_stream(options['dataset'], options['format'], compress, options['after'],
+                                   options['chunk_size'])
+        except ValidationError as e:
+            raise CommandError(f"Invalid --after value: {options['after']}") from e
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in stream:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
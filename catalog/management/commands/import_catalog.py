@@ -0,0 +1,191 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.conditional import touch
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.page_cache import bump
+from catalog.search import get_search_backend
+from catalog.snapshot import invalidate_snapshot
+from catalog.stats import invalidate_library_stats
+
+FORMATS = ('csv', 'jsonl')
+GENRE_SEPARATOR = ';'
+
+
+def open_source(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    for extension, fmt in (('.csv', 'csv'), ('.jsonl', 'jsonl'), ('.ndjson', 'jsonl')):
+        if name.endswith(extension):
+            return fmt
+    raise CommandError(f'Cannot tell the format of {path}; pass --format')
+
+
+def read_rows(source, fmt):
+    """Yield row dicts one at a time, never holding more than one line."""
+    if fmt == 'csv':
+        for row in csv.DictReader(source):
+            row['genres'] = [name for name in (row.get('genres') or '').split(GENRE_SEPARATOR) if name.strip()]
+            yield row
+    else:
+        for number, line in enumerate(source, start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise CommandError(f'Line {number}: {e}')
+
+
+def batches(rows, size):
+    batch = []
+    for number, row in enumerate(rows, start=1):
+        batch.append((number, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Stream books from a CSV or JSON Lines file (optionally gzipped) into the catalog. Columns: isbn, '
+            'title, summary, author_first_name, author_last_name, genres (list, or ";"-separated in CSV), '
+            'copies, imprint. Rows whose ISBN is already in the catalog are skipped, so an interrupted import '
+            'can simply be run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for standard input')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--strict', action='store_true', help='Stop at the first invalid row')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        self.strict = options['strict']
+        self.authors = {(first, last): pk for pk, first, last in
+                        Author.objects.values_list('pk', 'first_name', 'last_name').iterator()}
+        self.genres = {name: pk for pk, name in Genre.objects.values_list('pk', 'name').iterator()}
+        self.totals = {'books': 0, 'copies': 0, 'skipped': 0, 'invalid': 0}
+
+        started = time.monotonic()
+        with open_source(options['path']) as source:
+            for batch in batches(read_rows(source, fmt), options['batch_size']):
+                self.import_batch(batch)
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"{self.totals['books']} books, {self.totals['skipped']} skipped, "
+                                  f"{self.totals['invalid']} invalid ({self.totals['books'] / elapsed:.0f} books/s)")
+
+        invalidate_library_stats()
+        invalidate_snapshot()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.totals['books']} books and {self.totals['copies']} copies in {elapsed:.1f}s "
+            f"({self.totals['books'] / elapsed:.0f} books/s); "
+            f"skipped {self.totals['skipped']} existing, {self.totals['invalid']} invalid"))
+
+    def invalid(self, message):
+        if self.strict:
+            raise CommandError(message)
+        self.totals['invalid'] += 1
+        return None
+
+    def clean(self, number, row):
+        if not isinstance(row, dict):
+            return self.invalid(f'Row {number}: not an object')
+        isbn = str(row.get('isbn') or '').strip()
+        title = str(row.get('title') or '').strip()
+        copies = str(row.get('copies') or 0)
+        author = (str(row.get('author_first_name') or '').strip(), str(row.get('author_last_name') or '').strip())
+        genres = row.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(GENRE_SEPARATOR)
+        if not isinstance(genres, list):
+            return self.invalid(f'Row {number}: genres must be a list')
+        genres = [str(name).strip() for name in genres if str(name).strip()]
+        if (not isbn or not title or len(isbn) > 13 or len(title) > 200 or not copies.isdigit()
+                or max(len(name) for name in author) > 100 or any(len(name) > 200 for name in genres)):
+            return self.invalid(f'Row {number}: isbn (at most 13 characters) and title (at most 200) are required, '
+                                f'author names are at most 100 characters and genres 200, copies must be a number')
+        return {
+            'isbn': isbn,
+            'title': title,
+            'summary': str(row.get('summary') or ''),
+            'author': author,
+            'genres': genres,
+            'copies': int(copies),
+            'imprint': str(row.get('imprint') or ''),
+        }
+
+    def import_batch(self, batch):
+        rows = [row for row in (self.clean(number, row) for number, row in batch) if row is not None]
+        with transaction.atomic():
+            existing = set(Book.objects.filter(isbn__in={row['isbn'] for row in rows}).values_list('isbn', flat=True))
+            fresh = []
+            for row in rows:
+                if row['isbn'] in existing:
+                    self.totals['skipped'] += 1
+                else:
+                    existing.add(row['isbn'])
+                    fresh.append(row)
+            if not fresh:
+                return
+            new_authors = self.resolve_authors(fresh)
+            self.resolve_genres(fresh)
+
+            books = Book.objects.bulk_create(
+                Book(isbn=row['isbn'], title=row['title'], summary=row['summary'],
+                     author_id=self.authors.get(row['author']),
+                     copies_total=row['copies'], copies_maintenance=row['copies']) for row in fresh)
+            if books[0].pk is None:
+                # Backends that don't return primary keys from bulk_create.
+                ids = dict(Book.objects.filter(isbn__in=[row['isbn'] for row in fresh]).values_list('isbn', 'pk'))
+                for book in books:
+                    book.pk = ids[book.isbn]
+
+            book_genre = Book.genre.through
+            book_genre.objects.bulk_create(
+                book_genre(book_id=book.pk, genre_id=self.genres[name])
+                for book, row in zip(books, fresh) for name in set(row['genres']))
+            copies = BookInstance.objects.bulk_create(
+                BookInstance(book_id=book.pk, imprint=row['imprint'], status='m')
+                for book, row in zip(books, fresh) for _ in range(row['copies']))
+
+            book_ids = [book.pk for book in books]
+            author_ids = {book.author_id for book in books}
+            get_search_backend().index_books(book_ids)
+            touch(Author, *author_ids)
+        bump('book-list')
+        bump('author', *author_ids)
+        if new_authors:
+            bump('author-list')
+        self.totals['books'] += len(books)
+        self.totals['copies'] += len(copies)
+
+    def resolve_authors(self, rows):
+        missing = {row['author'] for row in rows if any(row['author'])} - set(self.authors)
+        if missing:
+            Author.objects.bulk_create(Author(first_name=first, last_name=last) for first, last in missing)
+            for pk, first, last in Author.objects.filter(
+                    last_name__in={last for _, last in missing}).values_list('pk', 'first_name', 'last_name'):
+                self.authors.setdefault((first, last), pk)
+        return missing
+
+    def resolve_genres(self, rows):
+        missing = {name for row in rows for name in row['genres']} - set(self.genres)
+        if missing:
+            Genre.objects.bulk_create(Genre(name=name) for name in missing)
+            self.genres.update(Genre.objects.filter(name__in=missing).values_list('name', 'pk'))
@@ -0,0 +1,71 @@
+import datetime
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from catalog.models import BookInstance
+from catalog.pagination import iterate_queryset
+
+
+class Command(BaseCommand):
+    help = ('Email each borrower one digest of their overdue loans. Loans are marked with the due date they were '
+            'notified for, so reruns only pick up new or renewed overdue loans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='Treat this date as today (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails sent per mail server connection')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Loans read per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be sent without sending')
+
+    def handle(self, *args, **options):
+        today = options['date'] or datetime.date.today()
+        loans = BookInstance.objects.overdue_notice_pending(today).filter(borrower__isnull=False).values(
+            'pk', 'due_back', 'borrower_id', 'borrower__username', 'borrower__first_name', 'borrower__email',
+            'book__title')
+
+        # Read in chunks and sent batch by batch, so memory doesn't grow with the number of loans.
+        sent = covered = skipped = 0
+        batch = []
+        rows = iterate_queryset(loans, options['chunk_size'], ordering=('borrower_id', 'due_back', 'pk'))
+        for _, group in groupby(rows, key=lambda loan: loan['borrower_id']):
+            group = list(group)
+            if not group[0]['borrower__email']:
+                skipped += 1
+                continue
+            batch.append(group)
+            if len(batch) >= options['batch_size']:
+                self.send(batch, options['dry_run'])
+                sent, covered, batch = sent + len(batch), covered + sum(len(group) for group in batch), []
+        if batch:
+            self.send(batch, options['dry_run'])
+            sent, covered = sent + len(batch), covered + sum(len(group) for group in batch)
+
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {sent} overdue digests covering {covered} loans; '
+            f'{skipped} borrowers without an email address'))
+
+    def send(self, batch, dry_run):
+        if not dry_run:
+            with get_connection() as connection:
+                connection.send_messages([self.message(group) for group in batch])
+            self.mark_notified([loan for group in batch for loan in group])
+
+    def message(self, loans):
+        borrower = {'name': loans[0]['borrower__first_name'] or loans[0]['borrower__username']}
+        body = render_to_string('overdue_digest.txt', {
+            'borrower': borrower,
+            'loans': [{'title': loan['book__title'], 'due_back': loan['due_back']} for loan in loans],
+        })
+        return EmailMessage(f'Overdue books: {len(loans)}', body, settings.DEFAULT_FROM_EMAIL,
+                            [loans[0]['borrower__email']])
+
+    def mark_notified(self, loans):
+        # Marked per due date, so a loan renewed meanwhile stays pending.
+        for due_back, group in groupby(sorted(loans, key=lambda loan: loan['due_back']),
+                                       key=lambda loan: loan['due_back']):
+            BookInstance.objects.filter(pk__in=[loan['pk'] for loan in group], due_back=due_back).update(
+                overdue_notice_due=due_back)
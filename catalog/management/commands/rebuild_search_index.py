@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from catalog.models import Book
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text catalog search index from Book, Author and Genre rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the index in')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            get_search_backend(using).rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Book.objects.using(using).count()} books'))
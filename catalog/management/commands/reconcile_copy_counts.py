@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog.availability import reconcile_copy_counts
+from catalog.page_cache import bump, bump_books
+from catalog.stats import invalidate_library_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-book copy counters from the copies and report books whose counters had drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='Only these books (default: all)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted books')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_copy_counts(options['book_ids'] or None, dry_run=options['dry_run'])
+        if drifted and not options['dry_run']:
+            bump_books(drifted)
+            bump('book-list')
+            invalidate_library_stats()
+        verb = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} books {verb}'))
+        if drifted and options['verbosity'] > 1:
+            self.stdout.write(' '.join(map(str, drifted)))
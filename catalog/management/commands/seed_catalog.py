@@ -0,0 +1,111 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.models import COPY_COUNTERS, Author, Book, BookInstance, Genre
+from catalog.search import get_search_backend
+from catalog.snapshot import invalidate_snapshot
+from catalog.stats import invalidate_library_stats
+
+WORDS = ('дюна', 'mars', 'river', 'night', 'garden', 'empire', 'winter', 'mirror', 'ocean', 'stone', 'glass',
+         'shadow', 'road', 'light', 'storm', 'city', 'forest', 'letters', 'машина', 'время')
+
+
+def batched(iterable_size, batch_size):
+    for start in range(0, iterable_size, batch_size):
+        yield start, min(start + batch_size, iterable_size)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate synthetic authors, genres, books and copies for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--genres', type=int, default=50)
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--genres-per-book', type=int, default=2)
+        parser.add_argument('--borrowers', type=int, default=100)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible datasets')
+        parser.add_argument('--no-index', action='store_true', help='Skip rebuilding the search index')
+
+    def handle(self, *args, **options):
+        if options['books'] and not options['authors']:
+            raise CommandError('--books requires at least one author')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        genre_ids = self.create_genres(options['genres'])
+        author_ids = self.create_authors(options['authors'])
+        borrower_ids = self.create_borrowers(options['borrowers'])
+        self.create_books(options['books'], author_ids, genre_ids, options['genres_per_book'],
+                          options['copies_per_book'], borrower_ids)
+
+        if not options['no_index']:
+            get_search_backend().rebuild()
+        invalidate_library_stats()
+        invalidate_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Seeded catalog in {time.monotonic() - started:.1f}s'))
+
+    def title(self):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(1, 4))).capitalize()
+
+    def create_genres(self, count):
+        offset = Genre.objects.count()
+        for start, stop in batched(count, self.batch_size):
+            Genre.objects.bulk_create(Genre(name=f'Genre {offset + num}') for num in range(start, stop))
+        return list(Genre.objects.values_list('pk', flat=True))
+
+    def create_authors(self, count):
+        for start, stop in batched(count, self.batch_size):
+            Author.objects.bulk_create(
+                Author(first_name=self.random.choice(WORDS).capitalize(), last_name=f'Author {num}',
+                       date_of_birth=datetime.date(1900, 1, 1) + datetime.timedelta(days=self.random.randint(0, 36500)))
+                for num in range(start, stop))
+        return list(Author.objects.values_list('pk', flat=True))
+
+    def create_borrowers(self, count):
+        existing = set(User.objects.filter(username__startswith='borrower').values_list('username', flat=True))
+        User.objects.bulk_create(
+            User(username=f'borrower{num}') for num in range(count) if f'borrower{num}' not in existing)
+        return list(User.objects.filter(username__startswith='borrower').values_list('pk', flat=True))
+
+    def create_books(self, count, author_ids, genre_ids, genres_per_book, copies_per_book, borrower_ids):
+        book_genre = Book.genre.through
+        today = datetime.date.today()
+        offset = Book.objects.count()
+        for start, stop in batched(count, self.batch_size):
+            with transaction.atomic():
+                # Copy statuses are drawn first so the books are created with their counters set.
+                statuses = [[self.random.choice('maor') for _ in range(copies_per_book)] for _ in range(start, stop)]
+                books = Book.objects.bulk_create(
+                    Book(title=self.title(), summary=' '.join(self.random.choices(WORDS, k=20)),
+                         isbn=f'{offset + num:013d}', author_id=self.random.choice(author_ids),
+                         copies_total=copies_per_book,
+                         **{field: book_statuses.count(status) for status, field in COPY_COUNTERS.items()})
+                    for num, book_statuses in zip(range(start, stop), statuses))
+                if books and books[0].pk is None:
+                    # Backends that don't return primary keys from bulk_create.
+                    books = list(Book.objects.order_by('-pk')[:len(books)])[::-1]
+                if genre_ids:
+                    book_genre.objects.bulk_create(
+                        book_genre(book_id=book.pk, genre_id=genre_id)
+                        for book in books
+                        for genre_id in self.random.sample(genre_ids, min(genres_per_book, len(genre_ids))))
+                copies = []
+                for book, book_statuses in zip(books, statuses):
+                    for status in book_statuses:
+                        on_loan = status == 'o' and borrower_ids
+                        copies.append(BookInstance(
+                            book_id=book.pk, imprint=f'Imprint {self.random.randint(1950, 2020)}', status=status,
+                            borrower_id=self.random.choice(borrower_ids) if on_loan else None,
+                            due_back=today + datetime.timedelta(days=self.random.randint(-30, 30)) if on_loan else None))
+                # Several copies per book: let the backend split the insert into statements it accepts.
+                BookInstance.objects.bulk_create(copies)
+            self.stdout.write(f'{stop}/{count} books')
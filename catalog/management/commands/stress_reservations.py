@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from catalog import circulation
+from catalog.availability import reconcile_copy_counts
+from catalog.models import Book, BookInstance, Reservation
+
+
+class Command(BaseCommand):
+    help = ('Reserve, collect and return copies of one book from many threads at once, '
+            'then check that no copy was given to two borrowers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--borrowers', type=int, default=40)
+        parser.add_argument('--copies', type=int, default=5)
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds a borrower waits for a hold')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help="Don't delete the book, copies and borrowers")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.timeout = options['timeout']
+        self.lock = threading.Lock()
+        self.holders = {}
+        self.errors = []
+        self.retries = 0
+
+        book = Book.objects.create(title='Reservation stress test', summary='Created by stress_reservations',
+                                   isbn='0000000000000')
+        for _ in range(options['copies']):
+            BookInstance.objects.create(book=book, imprint='Stress test', status='a')
+        User.objects.bulk_create(User(username=f'stress-{book.pk}-{num}') for num in range(options['borrowers']))
+        borrowers = list(User.objects.filter(username__startswith=f'stress-{book.pk}-'))
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(lambda borrower: self.borrow(book, borrower), borrowers))
+            elapsed = time.monotonic() - started
+            self.verify(book, len(borrowers))
+        finally:
+            if not options['keep']:
+                Reservation.objects.filter(book=book).delete()
+                book.bookinstance_set.all().delete()
+                book.delete()
+                User.objects.filter(pk__in=[borrower.pk for borrower in borrowers]).delete()
+
+        self.stdout.write(f"{len(borrowers)} borrowers, {options['copies']} copies, {options['threads']} threads: "
+                          f"{elapsed:.2f}s, {self.retries} retries on a locked database")
+        if self.errors:
+            raise CommandError('\n'.join(self.errors))
+        self.stdout.write(self.style.SUCCESS('OK: every reservation was served by exactly one copy'))
+
+    def retry(self, func, *args, done=None):
+        """
+        SQLite refuses concurrent writers instead of queueing them; try again
+        like a user would. ``done`` tells whether a failed attempt had in fact
+        committed (e.g. the page cache update after it failed).
+        """
+        for attempt in range(100):
+            try:
+                if attempt and done is not None and done():
+                    return None
+                return func(*args)
+            except OperationalError:
+                with self.lock:
+                    self.retries += 1
+                time.sleep(self.random.uniform(0, 0.01) * (attempt + 1))
+        return func(*args)
+
+    def borrow(self, book, borrower):
+        try:
+            queued = Reservation.objects.filter(book=book, borrower=borrower)
+            self.retry(circulation.reserve, book, borrower, done=queued.exists)
+            reservation = self.retry(queued.get)
+            deadline = time.monotonic() + self.timeout
+            while reservation.status != 'h':
+                # Only reserve() and the returns hand out copies; nobody here calls allocate().
+                if time.monotonic() > deadline:
+                    self.errors.append(f'{borrower}: no copy within {self.timeout}s')
+                    return
+                time.sleep(0.005)
+                self.retry(reservation.refresh_from_db)
+
+            with self.lock:
+                if reservation.copy_id in self.holders:
+                    self.errors.append(f'{reservation.copy_id} held by {self.holders[reservation.copy_id]} '
+                                       f'and {borrower}')
+                self.holders[reservation.copy_id] = borrower.username
+            self.retry(circulation.collect, reservation,
+                       done=lambda: Reservation.objects.filter(pk=reservation.pk, status='f').exists())
+            with self.lock:
+                # Released before the return: nobody else can get the copy until it's back.
+                del self.holders[reservation.copy_id]
+            on_loan = BookInstance.objects.filter(pk=reservation.copy_id, status='o', borrower=borrower)
+            report = self.retry(circulation.checkin, [reservation.copy_id], done=lambda: not on_loan.exists())
+            if report is not None and not report[0]['ok']:
+                self.errors.append(f"{borrower}: return of {reservation.copy_id} failed: {report[0]['error']}")
+        except Exception as e:
+            self.errors.append(f'{borrower}: {e!r}')
+        finally:
+            connection.close()
+
+    def verify(self, book, borrowers):
+        collected = Reservation.objects.filter(book=book, status='f').count()
+        if collected != borrowers:
+            self.errors.append(f'{collected} of {borrowers} reservations collected')
+        if book.bookinstance_set.exclude(status='a').exists():
+            self.errors.append('Copies left on loan or on hold')
+        if reconcile_copy_counts([book.pk], dry_run=True):
+            self.errors.append('Book counters drifted')
@@ -0,0 +1,151 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .backends.pool import pool_stats
+from .routers import PIN_COOKIE, routing
+
+logger = logging.getLogger('catalog.metrics')
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class QueryRecorder:
+    """Database execute wrapper that records every statement and its duration."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, (time.perf_counter() - started) * 1000))
+
+    @property
+    def total_ms(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        # Statements are recorded with placeholders, so the same SQL text is the same query shape.
+        signatures = Counter(WHITESPACE_RE.sub(' ', sql) for _, sql, _ in self.queries)
+        return {sql: count for sql, count in signatures.items() if count > 1}
+
+
+class RequestMetricsMiddleware:
+    """
+    Per-request query count, DB time, view time, template render time and
+    duplicate queries, reported as a Server-Timing header and a log line.
+    Requests are sampled with REQUEST_METRICS_SAMPLE_RATE; requests slower than
+    REQUEST_METRICS_SLOW_MS also log their full query list.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 0):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._metrics = {'view_started': None, 'view_ms': None, 'render_ms': 0.0}
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        metrics = request._metrics
+        if metrics['view_started'] is not None and metrics['view_ms'] is None:
+            metrics['view_ms'] = (time.perf_counter() - metrics['view_started']) * 1000
+        self.report(request, response, recorder, total_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_metrics'):
+            request._metrics['view_name'] = getattr(request.resolver_match, 'view_name', None)
+            request._metrics['view_started'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is None:
+            return response
+        if metrics['view_started'] is not None:
+            metrics['view_ms'] = (time.perf_counter() - metrics['view_started']) * 1000
+        render = response.render
+
+        def timed_render():
+            render_started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                metrics['render_ms'] += (time.perf_counter() - render_started) * 1000
+
+        response.render = timed_render
+        return response
+
+    def report(self, request, response, recorder, total_ms):
+        metrics = request._metrics
+        duplicates = recorder.duplicates()
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.get('view_name'),
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'view_ms': round(metrics['view_ms'] or 0.0, 2),
+            'render_ms': round(metrics['render_ms'], 2),
+            'db_ms': round(recorder.total_ms, 2),
+            'queries': len(recorder.queries),
+            'duplicate_queries': sum(duplicates.values()) - len(duplicates),
+        }
+        pools = pool_stats()
+        if pools:
+            record['pools'] = pools
+
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={record["db_ms"]};desc="{record["queries"]} queries"',
+                f'view;dur={record["view_ms"]}',
+                f'render;dur={record["render_ms"]}',
+                f'total;dur={record["total_ms"]}',
+            ])
+
+        slow_ms = getattr(settings, 'REQUEST_METRICS_SLOW_MS', None)
+        if slow_ms is not None and total_ms >= slow_ms:
+            record['duplicates'] = duplicates
+            record['query_log'] = [{'db': alias, 'sql': sql, 'ms': round(duration, 2)}
+                                   for alias, sql, duration in recorder.queries]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes with catalog.routers.ReplicaRouter: a request that wrote
+    sets a cookie that sends the browser's reads to the primary for
+    CATALOG_REPLICA_PIN_SECONDS (None: the browser session). Requests that may
+    write (anything but GET, HEAD, OPTIONS) read from the primary throughout.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = PIN_COOKIE in request.COOKIES or request.method not in ('GET', 'HEAD', 'OPTIONS')
+        with routing(pinned) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS', 15),
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# The search table's SQL as of this migration, so later changes to
+# catalog.search can't change what it does. Other vendors keep no index.
+DOCUMENT_SQL = (
+    "SELECT b.id, b.title, b.summary, COALESCE(a.first_name || ' ' || a.last_name, ''), "
+    "COALESCE((SELECT {group_concat} FROM catalog_book_genre bg "
+    "INNER JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '') "
+    "FROM catalog_book b LEFT OUTER JOIN catalog_author a ON a.id = b.author_id"
+)
+
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_booksearch "
+        "USING fts5(title, summary, authors, genres, tokenize = 'unicode61')",
+        "INSERT INTO catalog_booksearch (rowid, title, summary, authors, genres) "
+        + DOCUMENT_SQL.format(group_concat="group_concat(g.name, ' ')"),
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS catalog_booksearch ("
+        "book_id integer PRIMARY KEY REFERENCES catalog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS catalog_booksearch_document_gin ON catalog_booksearch USING GIN (document)",
+        "INSERT INTO catalog_booksearch (book_id, document) "
+        "SELECT id, setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', authors), 'B') || "
+        "setweight(to_tsvector('simple', genres), 'C') || setweight(to_tsvector('simple', summary), 'D') "
+        "FROM (" + DOCUMENT_SQL.format(group_concat="string_agg(g.name, ' ')") + ") "
+        "AS doc (id, title, summary, authors, genres)",
+    ],
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_auto_20200708_1502'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run({vendor: ['DROP TABLE IF EXISTS catalog_booksearch']
+                                                   for vendor in CREATE_SQL})),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.0.8 on 2026-10-18 19:50
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_copy_counters(apps, schema_editor):
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+
+    def copy_count(**filters):
+        counts = BookInstance.objects.filter(book=models.OuterRef('pk'), **filters).order_by().values(
+            'book').annotate(count=models.Count('pk')).values('count')
+        return Coalesce(models.Subquery(counts, output_field=models.IntegerField()), 0)
+
+    Book.objects.using(schema_editor.connection.alias).update(
+        copies_total=copy_count(),
+        copies_available=copy_count(status='a'),
+        copies_on_loan=copy_count(status='o'),
+        copies_reserved=copy_count(status='r'),
+        copies_maintenance=copy_count(status='m'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_book_isbn_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Доступно'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_maintenance',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='На обслуживании'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Выдано'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Зарезервировано'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Экземпляров'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-copies_available', 'title', 'id'], name='book_available_title_id_idx'),
+        ),
+        migrations.RunPython(populate_copy_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_copy_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookinstance',
+            name='overdue_notice_due',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Напоминание отправлено для срока'),
+        ),
+    ]
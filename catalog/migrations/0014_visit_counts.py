@@ -0,0 +1,31 @@
+# Generated by Django 3.0.8 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=100, verbose_name='Страница')),
+                ('day', models.DateField(verbose_name='День')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Посещений')),
+            ],
+            options={
+                'verbose_name': 'Посещения',
+                'verbose_name_plural': 'Посещения',
+                'ordering': ['-day', 'page'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='visitcount',
+            constraint=models.UniqueConstraint(fields=('page', 'day'), name='visitcount_page_day'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.8 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0015_cache_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinstance',
+            name='bookinst_borrower_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bookinstance',
+            index=models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='bookinst_borrower_due_idx'),
+        ),
+    ]
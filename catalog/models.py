@@ -1,4 +1,7 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import DatabaseError, models, router, transaction
+from django.db.models import BooleanField, Case, F, Q, Value, When
 from django.urls import reverse
 from django.contrib.auth.models import User
 import uuid
@@ -17,23 +20,49 @@ class Genre(models.Model):
         verbose_name_plural = 'Жанры'
 
 
+# Book counter for each BookInstance.status.
+COPY_COUNTERS = {
+    'a': 'copies_available',
+    'o': 'copies_on_loan',
+    'r': 'copies_reserved',
+    'm': 'copies_maintenance',
+}
+COPY_COUNT_FIELDS = ('copies_total',) + tuple(COPY_COUNTERS.values())
+
+
 class Book(models.Model):
     title = models.CharField('Название', max_length=200)
     author = models.ForeignKey('Author', on_delete=models.SET_NULL, null=True, verbose_name='Автор')
     summary = models.TextField('Описание', max_length=1000, help_text='Enter a brief description of the book')
-    isbn = models.CharField('ISBN', max_length=13,
+    isbn = models.CharField('ISBN', max_length=13, db_index=True,
                             help_text='13 Character <a href="https://www.isbn-international.org/content/what-isbn" '
                                       'target="_blank">ISBN number</a>')
     genre = models.ManyToManyField(Genre, help_text='Select a genre for this book', verbose_name='Жанр')
+    modified = models.DateTimeField('Изменено', auto_now=True)
+    # Maintained by BookInstance.save() and the copy delete signal; see
+    # catalog.availability.reconcile_copy_counts().
+    copies_total = models.PositiveIntegerField('Экземпляров', default=0, editable=False)
+    copies_available = models.PositiveIntegerField('Доступно', default=0, editable=False)
+    copies_on_loan = models.PositiveIntegerField('Выдано', default=0, editable=False)
+    copies_reserved = models.PositiveIntegerField('Зарезервировано', default=0, editable=False)
+    copies_maintenance = models.PositiveIntegerField('На обслуживании', default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The counters only change through F() updates; never write back values loaded earlier.
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in COPY_COUNT_FIELDS]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('book-detail', args=[str(self.id)])
 
     def display_genre(self):
-        return ', '.join([genre.name for genre in self.genre.all()[:3]])
+        # Prefetched by BookAdmin: no query per book in admin lists.
+        return ', '.join(genre.name for genre in list(self.genre.all())[:3])
 
     display_genre.short_description = 'Жанр'
 
@@ -41,6 +70,58 @@ class Book(models.Model):
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            models.Index(fields=['-copies_available', 'title', 'id'], name='book_available_title_id_idx'),
+        ]
+
+
+def adjust_copy_counts(previous, current, using=None):
+    """
+    Move a copy between Book counters. ``previous`` and ``current`` are
+    (book_id, status) pairs, or None for a copy that didn't / doesn't exist.
+    """
+    move_copy_counts([(previous, current)], using)
+
+
+def move_copy_counts(moves, using=None):
+    """adjust_copy_counts() for many (previous, current) pairs, with one UPDATE per book."""
+    changes = defaultdict(lambda: defaultdict(int))
+    for previous, current in moves:
+        for state, delta in ((previous, -1), (current, 1)):
+            if state is not None and state[0] is not None:
+                book_id, status = state
+                changes[book_id]['copies_total'] += delta
+                if status in COPY_COUNTERS:
+                    changes[book_id][COPY_COUNTERS[status]] += delta
+    for book_id, fields in changes.items():
+        updates = {field: F(field) + delta for field, delta in fields.items() if delta}
+        if updates:
+            Book.objects.using(using).filter(pk=book_id).update(**updates)
+
+
+class ConcurrentUpdateError(DatabaseError):
+    """The row was changed by someone else since it was loaded; reload it and try again."""
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    def on_loan(self):
+        return self.filter(status__exact='o')
+
+    def overdue(self, today=None):
+        # Served by the partial (due_back, id) index on loans.
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Annotate ``overdue`` in the query instead of evaluating is_overdue per row."""
+        return self.annotate(overdue=Case(
+            When(due_back__lt=today or date.today(), then=Value(True)),
+            default=Value(False), output_field=BooleanField()))
+
+    def overdue_notice_pending(self, today=None):
+        # Overdue loans not yet notified for their current due date.
+        return self.overdue(today).filter(
+            Q(overdue_notice_due__isnull=True) | ~Q(overdue_notice_due=F('due_back')))
 
 
 class BookInstance(models.Model):
@@ -57,9 +138,51 @@ class BookInstance(models.Model):
     )
     status = models.CharField(max_length=1, choices=LOAN_STATUS, blank=True, default='m', help_text='Book availability', verbose_name='статус')
     borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Заёмщик')
+    modified = models.DateTimeField('Изменено', auto_now=True)
+    # due_back of the loan the borrower was last sent an overdue notice for.
+    overdue_notice_due = models.DateField(null=True, blank=True, editable=False,
+                                          verbose_name='Напоминание отправлено для срока')
+    # Incremented by every change; a save only applies to the version the instance was loaded with.
+    version = models.PositiveIntegerField('Версия', default=0, editable=False)
+
+    objects = BookInstanceQuerySet.as_manager()
 
     def __str__(self):
-        return f'{self.id} ({self.book.title})'
+        # Lists of copies should select_related('book').
+        return f'{self.id} ({self.book.title if self.book_id else "-"})'
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(BookInstance, instance=self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+        adding = self._state.adding
+        if not adding:
+            self.version += 1
+        try:
+            with transaction.atomic(using=using):
+                # Locked so concurrent saves of this copy can't both count the same old status.
+                previous = BookInstance.objects.using(using).select_for_update().filter(pk=self.pk).values_list(
+                    'book_id', 'status').first()
+                super().save(*args, **kwargs)
+                adjust_copy_counts(previous, (self.book_id, self.status), using)
+        except Exception:
+            if not adding:
+                self.version -= 1
+            raise
+
+    def _save_table(self, raw=False, *args, **kwargs):
+        # Raw saves (loaddata) write the fixture's row as it is, version included.
+        self._raw_save = raw
+        return super()._save_table(raw, *args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if self._raw_save:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        updated = super()._do_update(base_qs.filter(version=self.version - 1), using, pk_val, values,
+                                     update_fields, forced_update)
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise ConcurrentUpdateError(f'{self._meta.verbose_name} {pk_val} was changed by someone else')
+        return updated
 
     @property
     def is_overdue(self):
@@ -71,15 +194,56 @@ class BookInstance(models.Model):
         verbose_name = 'Экземпляр книги'
         verbose_name_plural = 'Экземпляры книг'
         ordering = ['due_back']
+        indexes = [
+            models.Index(fields=['status', 'due_back'], name='bookinst_status_due_idx'),
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='bookinst_borrower_due_idx'),
+            models.Index(fields=['due_back', 'id'], condition=models.Q(status='o'), name='bookinst_on_loan_due_idx'),
+        ]
         permissions = (('can_mark_returned', 'Set book as returned'), ('staff_member_required', 'Can view information for '
                                                                                                 'librarians'))
 
 
+class Reservation(models.Model):
+    """A borrower's place in the queue for a Book; see catalog.circulation.allocate()."""
+    RESERVATION_STATUS = (
+        ('w', 'Waiting'),
+        ('h', 'On hold'),
+        ('f', 'Collected'),
+        ('c', 'Cancelled'),
+    )
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='Книга')
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Читатель')
+    copy = models.ForeignKey(BookInstance, on_delete=models.SET_NULL, null=True, blank=True,
+                             verbose_name='Экземпляр')
+    status = models.CharField('Статус', max_length=1, choices=RESERVATION_STATUS, default='w')
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    modified = models.DateTimeField('Изменено', auto_now=True)
+
+    def __str__(self):
+        return f'{self.book} ({self.borrower})'
+
+    class Meta:
+        verbose_name = 'Бронирование'
+        verbose_name_plural = 'Бронирования'
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(fields=['book', 'status', 'created', 'id'], name='reservation_queue_idx'),
+        ]
+        constraints = [
+            # The database backs up the conditional updates: a copy is never on hold twice.
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='h'),
+                                    name='reservation_one_hold_per_copy'),
+            models.UniqueConstraint(fields=['book', 'borrower'], condition=models.Q(status__in=('w', 'h')),
+                                    name='reservation_one_per_borrower'),
+        ]
+
+
 class Author(models.Model):
     first_name = models.CharField(max_length=100, verbose_name='Имя')
     last_name = models.CharField(max_length=100, verbose_name='Фамилия')
     date_of_birth = models.DateField(null=True, blank=True, verbose_name='Дата рождения')
     date_of_death = models.DateField(null=True, blank=True, verbose_name='Дата смерти')
+    modified = models.DateTimeField('Изменено', auto_now=True)
 
     def get_absolute_url(self):
         return reverse('author-detail', args=[str(self.id)])
@@ -96,3 +260,33 @@ class Author(models.Model):
         verbose_name = 'Автор'
         verbose_name_plural = 'Авторы'
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_id_idx'),
+        ]
+
+
+class VisitCount(models.Model):
+    """Visits of a page per day, written in batches by catalog.visits.VisitBuffer."""
+    page = models.CharField('Страница', max_length=100)
+    day = models.DateField('День')
+    count = models.BigIntegerField('Посещений', default=0)
+
+    def __str__(self):
+        return f'{self.page} {self.day}: {self.count}'
+
+    class Meta:
+        verbose_name = 'Посещения'
+        verbose_name_plural = 'Посещения'
+        ordering = ['-day', 'page']
+        constraints = [
+            models.UniqueConstraint(fields=['page', 'day'], name='visitcount_page_day'),
+        ]
+
+
+class CacheVersion(models.Model):
+    """A version counter in the database, for caches that not every worker process shares (LocMemCache)."""
+    name = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
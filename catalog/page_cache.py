@@ -0,0 +1,138 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+
+from .models import Book
+from .routers import routing
+
+VERSION_KEY_PREFIX = 'catalog:version:'
+PAGE_KEY_PREFIX = 'catalog:page:'
+
+
+def cache_shared_by_workers():
+    """Whether every worker process sees the same cache, so versions bumped in one reach the others."""
+    backend = settings.CACHES['default']['BACKEND']
+    return backend != 'django.core.cache.backends.locmem.LocMemCache' or getattr(settings, 'WEB_CONCURRENCY', 1) <= 1
+
+
+def version_key(name, pk=None):
+    return f'{VERSION_KEY_PREFIX}{name}' if pk is None else f'{VERSION_KEY_PREFIX}{name}:{pk}'
+
+
+def get_versions(*keys):
+    """
+    Current version of each key. A missing version starts from the clock, so an
+    evicted counter can never hand out a number that was already used.
+    """
+    keys = [version_key(*key) if isinstance(key, tuple) else version_key(key) for key in keys]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [f'{key}:{versions[key]}' for key in keys]
+
+
+def bump(name, *pks):
+    keys = [version_key(name)] if not pks else [version_key(name, pk) for pk in pks if pk is not None]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_books(book_ids):
+    book_ids = set(book_ids)
+    if not book_ids:
+        return
+    bump('book', *book_ids)
+    bump('author', *set(Book.objects.filter(pk__in=book_ids).values_list('author_id', flat=True)))
+
+
+def render_from_primary(response):
+    """Make the (lazy) rendering of a TemplateResponse read from the primary database."""
+    render = response.render
+
+    def pinned_render():
+        with routing(pinned=True):
+            return render()
+
+    response.render = pinned_render
+    return response
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serves GET requests from anonymous users from a whole-page cache keyed by
+    the request path and the versions returned by ``get_page_versions()``.
+    """
+    cache_vary_on_date = False
+
+    def get_page_versions(self):
+        raise NotImplementedError
+
+    def page_cacheable(self, request):
+        return request.method == 'GET' and not request.user.is_authenticated
+
+    def get(self, request, *args, **kwargs):
+        if not self.page_cacheable(request):
+            return super().get(request, *args, **kwargs)
+        key = self.page_cache_key(request)
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        def store(rendered):
+            if rendered.status_code == 200:
+                cache.set(key, rendered.content, getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', None))
+
+        # From the primary: a lagging replica's page would be cached under the
+        # current versions until the next bump.
+        with routing(pinned=True):
+            response = super().get(request, *args, **kwargs)
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(store)
+            render_from_primary(response)
+        return response
+
+    def page_cache_key(self, request):
+        parts = [request.get_full_path()] + get_versions(*self.get_page_versions())
+        if self.cache_vary_on_date:
+            parts.append(datetime.date.today().isoformat())
+        signature = '|'.join(parts)
+        return PAGE_KEY_PREFIX + hashlib.md5(signature.encode()).hexdigest()
+
+
+class LazyFragmentDetailMixin:
+    """
+    DetailView whose object is only loaded if the template needs it, i.e. when
+    its ``{% cache %}`` fragments keyed by ``fragment_version`` are cold.
+    """
+    cache_vary_on_date = False
+
+    def get(self, request, *args, **kwargs):
+        self.object = SimpleLazyObject(self.get_object)
+        # Only cold fragments query, and they are filled from the primary.
+        return render_from_primary(self.render_to_response(self.get_context_data(object=self.object)))
+
+    def get_fragment_version(self):
+        parts = get_versions((self.model._meta.model_name, self.kwargs[self.pk_url_kwarg]))
+        if self.cache_vary_on_date:
+            parts.append(datetime.date.today().isoformat())
+        return '|'.join(parts)
+
+    def get_context_data(self, **kwargs):
+        # SingleObjectMixin.get_context_data would evaluate the lazy object.
+        kwargs.setdefault('view', self)
+        kwargs[self.context_object_name] = self.object
+        kwargs['fragment_version'] = self.get_fragment_version()
+        kwargs['fragment_timeout'] = getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', None)
+        if self.extra_context is not None:
+            kwargs.update(self.extra_context)
+        return kwargs
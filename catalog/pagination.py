@@ -0,0 +1,323 @@
+import operator
+from functools import reduce
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.utils.functional import cached_property
+from django.http import Http404, HttpResponseRedirect
+from django.urls import reverse
+
+CURSOR_SALT = 'catalog.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of a keyset-paginated queryset, without a COUNT query."""
+    is_cursor = True
+    paginator = None
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator. ``ordering`` is a sequence of field names, prefixed with
+    '-' for descending order, that must end with a unique field (normally
+    ``pk``). NULL values sort last. ``not_null`` names nullable fields the
+    queryset never has NULL in; they order plainly, so an index on them can
+    serve the ORDER BY.
+    """
+
+    def __init__(self, queryset, per_page, ordering, not_null=()):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = [name.lstrip('-') for name in ordering]
+        self.descending = [name.startswith('-') for name in ordering]
+        # Cursors only decode under the ordering they were issued for.
+        self.salt = f"{CURSOR_SALT}:{','.join(ordering)}"
+        opts = queryset.model._meta
+        self.fields = [opts.pk if name == 'pk' else opts.get_field(name) for name in self.ordering]
+        self.nullable = [field.null and name not in not_null for name, field in zip(self.ordering, self.fields)]
+
+    def encode_cursor(self, obj, direction='n'):
+        values = [self._value(obj, name) for name in self.ordering]
+        return self._sign(direction, values)
+
+    def decode_cursor(self, token):
+        try:
+            direction, raw_values = signing.loads(token, salt=self.salt)
+            if direction not in ('n', 'p') or len(raw_values) != len(self.fields):
+                raise InvalidCursor(token)
+            values = [None if raw is None else field.to_python(raw) for field, raw in zip(self.fields, raw_values)]
+        except (signing.BadSignature, ValidationError, ValueError, TypeError) as e:
+            raise InvalidCursor(token) from e
+        return direction, values
+
+    def cursor_for_offset(self, offset):
+        # Position just before the row at ``offset``; used to translate legacy page numbers.
+        row = self.ordered().values_list(*self.ordering)[offset - 1]
+        return self._sign('n', row)
+
+    def page(self, token=None):
+        if not token:
+            return self._page_after(None)
+        direction, values = self.decode_cursor(token)
+        if direction == 'n':
+            return self._page_after(values)
+        return self._page_before(values)
+
+    def ordered(self, reverse=False):
+        """The queryset in the paginator's ordering (reversed with ``reverse``)."""
+        return self.queryset.order_by(*self._order_by(reverse))
+
+    def _page_after(self, values):
+        queryset = self.ordered()
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, after=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if values is not None and rows else None,
+        )
+
+    def _page_before(self, values):
+        queryset = self.ordered(reverse=True)
+        queryset = queryset.filter(self._keyset_filter(values, after=False))
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'n') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if has_previous else None,
+        )
+
+    def chunks(self):
+        """Every row, ``per_page`` at a time; each list is read by its own keyset query."""
+        values = None
+        while True:
+            queryset = self.ordered()
+            if values is not None:
+                queryset = queryset.filter(self._keyset_filter(values, after=True))
+            rows = list(queryset[:self.per_page])
+            if rows:
+                yield rows
+            if len(rows) < self.per_page:
+                return
+            values = [self._value(rows[-1], name) for name in self.ordering]
+
+    def _order_by(self, reverse=False):
+        order_by = []
+        for name, nullable, descending in zip(self.ordering, self.nullable, self.descending):
+            descending = descending != reverse
+            if not nullable:
+                order_by.append(f'-{name}' if descending else name)
+            elif descending:
+                order_by.append(F(name).desc(nulls_first=reverse, nulls_last=not reverse))
+            else:
+                order_by.append(F(name).asc(nulls_first=reverse, nulls_last=not reverse))
+        return order_by
+
+    def _keyset_filter(self, values, after):
+        conditions = []
+        equal = Q()
+        for name, nullable, value, descending in zip(self.ordering, self.nullable, values, self.descending):
+            forward, backward = ('lt', 'gt') if descending else ('gt', 'lt')
+            if after:
+                if value is not None:
+                    step = Q(**{f'{name}__{forward}': value})
+                    if nullable:
+                        step |= Q(**{f'{name}__isnull': True})
+                    conditions.append(equal & step)
+            elif value is None:
+                conditions.append(equal & Q(**{f'{name}__isnull': False}))
+            else:
+                conditions.append(equal & Q(**{f'{name}__{backward}': value}))
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return reduce(operator.or_, conditions)
+
+    def _sign(self, direction, values):
+        return signing.dumps([direction, [self._dump(value) for value in values]], salt=self.salt, compress=True)
+
+    def _value(self, obj, name):
+        # Rows of a values() queryset must include the ordering names (or the primary key for 'pk').
+        if isinstance(obj, dict):
+            if name == 'pk' and 'pk' not in obj:
+                return obj[self.queryset.model._meta.pk.attname]
+            return obj[name]
+        return obj.pk if name == 'pk' else getattr(obj, name)
+
+    @staticmethod
+    def _dump(value):
+        if value is None or isinstance(value, (int, str)):
+            return value
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+
+def chunked_queryset(queryset, chunk_size=1000, ordering=('pk',)):
+    """
+    Lists of at most ``chunk_size`` rows of ``queryset`` in ``ordering`` (see
+    CursorPaginator), each read by its own query. Memory stays bounded by one
+    chunk even where QuerySet.iterator() reads the whole result into memory:
+    on MySQL, and on PostgreSQL without server-side cursors
+    (DJANGO_DB_POOL=pgbouncer). Rows changed behind the current position
+    aren't read again.
+    """
+    return CursorPaginator(queryset, chunk_size, ordering).chunks()
+
+
+def iterate_queryset(queryset, chunk_size=1000, ordering=('pk',)):
+    """The rows of chunked_queryset(), one at a time."""
+    for chunk in chunked_queryset(queryset, chunk_size, ordering):
+        yield from chunk
+
+
+def page_window(page, on_each_side=2, on_ends=1):
+    """
+    Page numbers to link to from the offset-paginated ``page``: the first and
+    last ``on_ends`` pages and ``on_each_side`` around the current one, with
+    None for each gap, so the links stay few however many pages there are.
+    """
+    num_pages, number = page.paginator.num_pages, page.number
+    shown = sorted({*range(1, min(on_ends, num_pages) + 1),
+                    *range(max(1, number - on_each_side), min(num_pages, number + on_each_side) + 1),
+                    *range(max(1, num_pages - on_ends + 1), num_pages + 1)})
+    window = []
+    for page_number in shown:
+        if window and page_number - window[-1] == 2:
+            # A gap of one page: cheaper to show it than an ellipsis.
+            window.append(page_number - 1)
+        elif window and page_number - window[-1] > 2:
+            window.append(None)
+        window.append(page_number)
+    return window
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for ListView. ``?cursor=`` tokens page through
+    ``cursor_ordering`` without counting rows; ``/<page>`` URLs redirect to the
+    matching cursor, and ``?page=`` keeps the classic offset paginator. Views
+    opt in with ``cursor_pagination = True``; without it they page as ListView.
+    """
+    cursor_pagination = False
+    cursor_ordering = ('pk',)
+    cursor_not_null = ()
+    cursor_kwarg = 'cursor'
+
+    def get(self, request, *args, **kwargs):
+        if self.cursor_pagination and self.page_kwarg in kwargs:
+            return self.redirect_to_cursor(kwargs[self.page_kwarg])
+        return super().get(request, *args, **kwargs)
+
+    def use_cursor_pagination(self):
+        return self.cursor_pagination and self.page_kwarg not in self.request.GET
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return CursorPaginator(queryset, page_size, self.get_cursor_ordering(), self.cursor_not_null)
+
+    def redirect_to_cursor(self, page_number):
+        url = reverse(self.request.resolver_match.view_name)
+        page_number = int(page_number)
+        if page_number > 1:
+            paginator = self.get_cursor_paginator(self.get_queryset(), self.get_paginate_by(None))
+            try:
+                cursor = paginator.cursor_for_offset((page_number - 1) * paginator.per_page)
+            except IndexError:
+                raise Http404('Invalid page (%s)' % page_number)
+            query = self.request.GET.copy()
+            query[self.cursor_kwarg] = cursor
+            url = f'{url}?{query.urlencode()}'
+        return HttpResponseRedirect(url)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Other query parameters (e.g. the sort order) carried over to page links.
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        query.pop(self.page_kwarg, None)
+        context['pagination_query'] = query.urlencode()
+        page = context.get('page_obj')
+        if page is not None and not getattr(page, 'is_cursor', False):
+            context['page_window'] = page_window(page)
+        return context
+
+
+def estimated_count(model, using):
+    """Approximate row count of ``model``'s table without scanning it, or None if unknown."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        elif connection.vendor == 'sqlite':
+            # The largest rowid is read off the end of the table's b-tree; deleted rows make it an overestimate.
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of big tables: an unfiltered queryset is
+    counted from the table statistics when they say it has more than
+    ``estimate_threshold`` rows, instead of with COUNT(*).
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where and not queryset.query.distinct:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+        return super().count
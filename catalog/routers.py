@@ -0,0 +1,111 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Set on responses to requests that wrote, so the browser's next requests read
+# from the primary until the replicas have caught up.
+PIN_COOKIE = 'catalog_primary'
+
+_health = {}  # alias -> (healthy, checked at)
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('catalog_routing_state', default=None)
+
+
+def get_state():
+    state = _state.get()
+    if state is None:
+        # Outside a request (commands, shells): pinned from the first write on.
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+@contextmanager
+def routing(pinned=False):
+    """Fresh routing state for a request; reads go to the primary if ``pinned`` or once something was written."""
+    token = _state.set(RoutingState(pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def replica_weights():
+    return getattr(settings, 'CATALOG_READ_REPLICAS', {})
+
+
+def is_healthy(alias):
+    """Whether ``alias`` accepted a query when last checked, rechecked every CATALOG_REPLICA_HEALTH_CHECK_INTERVAL s."""
+    healthy, checked = _health.get(alias, (True, None))
+    now = time.monotonic()
+    if checked is None or now - checked >= getattr(settings, 'CATALOG_REPLICA_HEALTH_CHECK_INTERVAL', 30):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except DatabaseError:
+            connection.close()
+            healthy = False
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+class ReplicaRouter:
+    """
+    Reads of the apps in CATALOG_REPLICA_APPS go to one of the healthy
+    CATALOG_READ_REPLICAS ({alias: weight}), picked at random by weight;
+    writes, and every read after a write in the same request, go to the
+    primary. See ReplicaPinningMiddleware for pinning across requests.
+    """
+
+    def __init__(self):
+        self.random = random.Random()
+
+    def routed(self, model):
+        return model._meta.app_label in getattr(settings, 'CATALOG_REPLICA_APPS', ('catalog',))
+
+    def db_for_read(self, model, **hints):
+        weights = replica_weights()
+        if not weights or not self.routed(model):
+            return None
+        if get_state().pinned:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and (instance._state.db == DEFAULT_DB_ALIAS or instance._state.db in weights):
+            # Related objects come from wherever the instance did.
+            return instance._state.db
+        aliases = [alias for alias in weights if alias == DEFAULT_DB_ALIAS or is_healthy(alias)]
+        if not aliases:
+            return DEFAULT_DB_ALIAS
+        return self.random.choices(aliases, [weights[alias] for alias in aliases])[0]
+
+    def db_for_write(self, model, **hints):
+        if not replica_weights() or not self.routed(model):
+            return None
+        state = get_state()
+        state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_weights()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        if db != DEFAULT_DB_ALIAS and db in replica_weights():
+            return False
+        return None
@@ -0,0 +1,231 @@
+import re
+
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Author, Book, Genre
+
+SEARCH_TABLE = 'catalog_booksearch'
+TOKEN_RE = re.compile(r'[^\W_]+')
+INDEX_BATCH_SIZE = 500
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class SearchResults:
+    """Lazy, sliceable list of ranked books; works with Django's Paginator."""
+
+    def __init__(self, backend, terms):
+        self.backend = backend
+        self.terms = terms
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.terms) if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.terms:
+            return []
+        offset = index.start or 0
+        limit = (index.stop - offset) if index.stop is not None else self.count() - offset
+        book_ids = self.backend.ranked_ids(self.terms, limit, offset)
+        books = Book.objects.select_related('author').only(
+            'title', 'summary', 'author', 'author__first_name', 'author__last_name').in_bulk(book_ids)
+        return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+class BaseSearchBackend:
+    """
+    Keeps no index; used for database vendors without a full-text backend.
+    Searches with icontains over title, summary, author and genre names, every
+    term matching somewhere, title matches first and then by title.
+    """
+    key_column = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def search(self, query):
+        return SearchResults(self, tokenize(query))
+
+    def index_books(self, book_ids):
+        book_ids = list(book_ids)
+        for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+            self._index_batch(book_ids[start:start + INDEX_BATCH_SIZE])
+
+    def remove_books(self, book_ids):
+        if self.key_column is None:
+            return
+        book_ids = list(book_ids)
+        with self.connection.cursor() as cursor:
+            for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+                batch = book_ids[start:start + INDEX_BATCH_SIZE]
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {self.key_column} IN ({self._placeholders(batch)})',
+                               batch)
+
+    def rebuild(self):
+        if self.key_column is None:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.index_books(Book.objects.using(self.connection.alias).values_list('pk', flat=True).iterator())
+
+    def create_table(self):
+        pass
+
+    def drop_table(self):
+        pass
+
+    def _index_batch(self, book_ids):
+        pass
+
+    def count(self, terms):
+        return self._matching(terms).count()
+
+    def ranked_ids(self, terms, limit, offset):
+        title_match = reduce(or_, (Q(title__icontains=term) for term in terms))
+        books = self._matching(terms).annotate(
+            title_rank=Case(When(title_match, then=Value(0)), default=Value(1), output_field=IntegerField()))
+        return list(books.order_by('title_rank', 'title', 'pk').values_list('pk', flat=True)[offset:offset + limit])
+
+    def _matching(self, terms):
+        books = Book.objects.using(self.connection.alias)
+        genre_links = Book.genre.through.objects.using(self.connection.alias)
+        for term in terms:
+            books = books.filter(
+                Q(title__icontains=term) | Q(summary__icontains=term) | Q(author__first_name__icontains=term)
+                | Q(author__last_name__icontains=term)
+                | Q(pk__in=genre_links.filter(genre__name__icontains=term).values('book_id')))
+        return books
+
+    def _document_sql(self):
+        # Columns: id, title, summary, author name, space-separated genre names.
+        genre_through = Book.genre.through._meta.db_table
+        return (
+            f'SELECT b.id, b.title, b.summary, '
+            f"COALESCE(a.first_name || ' ' || a.last_name, ''), "
+            f"COALESCE((SELECT {self.group_concat} FROM {genre_through} bg "
+            f"INNER JOIN {Genre._meta.db_table} g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '') "
+            f'FROM {Book._meta.db_table} b LEFT OUTER JOIN {Author._meta.db_table} a ON a.id = b.author_id '
+        )
+
+    @staticmethod
+    def _placeholders(values):
+        return ', '.join(['%s'] * len(values))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 virtual table; the book id is stored as the rowid."""
+    key_column = 'rowid'
+    group_concat = "group_concat(g.name, ' ')"
+    # bm25 column weights: title, summary, authors, genres.
+    rank_expression = f'bm25({SEARCH_TABLE}, 10.0, 1.0, 5.0, 2.0)'
+
+    def create_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+                           f"USING fts5(title, summary, authors, genres, tokenize = 'unicode61')")
+
+    def drop_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def _index_batch(self, book_ids):
+        placeholders = self._placeholders(book_ids)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+            cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, title, summary, authors, genres) '
+                           f'{self._document_sql()} WHERE b.id IN ({placeholders})', book_ids)
+
+    @staticmethod
+    def _match(terms):
+        return ' AND '.join(f'"{term}"*' for term in terms)
+
+    def count(self, terms):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [self._match(terms)])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, limit, offset):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                           f'ORDER BY {self.rank_expression}, rowid LIMIT %s OFFSET %s',
+                           [self._match(terms), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchBackend(BaseSearchBackend):
+    """Weighted tsvector column with a GIN index."""
+    key_column = 'book_id'
+    group_concat = "string_agg(g.name, ' ')"
+
+    def create_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+                           f'book_id integer PRIMARY KEY REFERENCES {Book._meta.db_table} (id) '
+                           f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                           f'document tsvector NOT NULL)')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin '
+                           f'ON {SEARCH_TABLE} USING GIN (document)')
+
+    def drop_table(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def _index_batch(self, book_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (book_id, document) '
+                f"SELECT id, setweight(to_tsvector('simple', title), 'A') || "
+                f"setweight(to_tsvector('simple', authors), 'B') || "
+                f"setweight(to_tsvector('simple', genres), 'C') || "
+                f"setweight(to_tsvector('simple', summary), 'D') "
+                f'FROM ({self._document_sql()} WHERE b.id IN ({self._placeholders(book_ids)})) '
+                f'AS doc (id, title, summary, authors, genres) '
+                f'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+                book_ids)
+
+    @staticmethod
+    def _tsquery(terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def count(self, terms):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+                           [self._tsquery(terms)])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, limit, offset):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT book_id FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query "
+                           f'WHERE document @@ query ORDER BY ts_rank(document, query) DESC, book_id '
+                           f'LIMIT %s OFFSET %s',
+                           [self._tsquery(terms), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    return SEARCH_BACKENDS.get(connection.vendor, BaseSearchBackend)(connection)
+
+
+def search_books(query, using='default'):
+    return get_search_backend(using).search(query)
@@ -0,0 +1,158 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from .models import Author, Book, BookInstance, Genre, adjust_copy_counts
+from .circulation import allocate
+from .conditional import touch, touch_books
+from .page_cache import bump, bump_books
+from .search import get_search_backend
+from .snapshot import expire_snapshot
+from .stats import invalidate_library_stats
+
+
+def reindex_book(sender, instance, using, **kwargs):
+    get_search_backend(using).index_books([instance.pk])
+
+
+def unindex_book(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_books([instance.pk])
+
+
+def reindex_related_books(sender, instance, using, **kwargs):
+    get_search_backend(using).index_books(instance.book_set.values_list('pk', flat=True))
+
+
+def remember_related_books(sender, instance, **kwargs):
+    instance._related_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+def reindex_remembered_books(sender, instance, using, **kwargs):
+    get_search_backend(using).index_books(getattr(instance, '_related_book_ids', []))
+
+
+def reindex_book_genres(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            get_search_backend(using).index_books([instance.pk])
+    elif action == 'pre_clear':
+        instance._related_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        get_search_backend(using).index_books(getattr(instance, '_related_book_ids', []))
+    else:
+        get_search_backend(using).index_books(pk_set)
+
+
+def remember_previous_parent(sender, instance, **kwargs):
+    # The old author of a book (or old book of a copy) must be invalidated too.
+    field = 'author_id' if sender is Book else 'book_id'
+    instance._page_cache_previous_parent = None
+    if instance.pk is not None:
+        instance._page_cache_previous_parent = sender.objects.filter(pk=instance.pk).values_list(
+            field, flat=True).first()
+
+
+def expire_books(book_ids):
+    # A changed book is also a changed child of its author.
+    book_ids = list(book_ids)
+    touch_books(book_ids)
+    bump_books(book_ids)
+
+
+def expire_book_pages(sender, instance, **kwargs):
+    authors = (instance.author_id, getattr(instance, '_page_cache_previous_parent', None))
+    touch(Author, *authors)
+    bump('book', instance.pk)
+    bump('author', *authors)
+    bump('book-list')
+
+
+def expire_copy_pages(sender, instance, **kwargs):
+    books = (instance.book_id, getattr(instance, '_page_cache_previous_parent', None))
+    touch(Book, *books)
+    bump('book', *books)
+    # The list shows each book's availability.
+    bump('book-list')
+
+
+def uncount_copy(sender, instance, using, **kwargs):
+    # Sent inside the deletion's transaction, for queryset deletes too.
+    adjust_copy_counts((instance.book_id, instance.status), None, using)
+
+
+def allocate_available_copy(sender, instance, using, raw=False, **kwargs):
+    # A copy made available outside catalog.circulation (e.g. in the admin) goes to the book's queue,
+    # once the rest of the change (say, its siblings in an admin inline) is saved.
+    if instance.status == 'a' and instance.book_id is not None and not raw:
+        book_id = instance.book_id
+        transaction.on_commit(lambda: allocate(book_id), using=using)
+
+
+def expire_author_pages(sender, instance, **kwargs):
+    bump('author', instance.pk)
+    bump('author-list')
+    bump('book-list')
+    expire_books(getattr(instance, '_related_book_ids', None) or instance.book_set.values_list('pk', flat=True))
+
+
+def expire_genre_pages(sender, instance, **kwargs):
+    expire_books(getattr(instance, '_related_book_ids', None) or instance.book_set.values_list('pk', flat=True))
+
+
+def expire_book_genre_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        expire_books([instance.pk])
+    elif action == 'post_clear':
+        expire_books(getattr(instance, '_related_book_ids', []))
+    else:
+        expire_books(pk_set)
+
+
+def remember_previous_username(sender, instance, update_fields=None, **kwargs):
+    # Saves that can't change the username (e.g. last_login on every login) skip the lookup.
+    instance._page_cache_previous_username = None
+    if instance.pk is not None and (update_fields is None or 'username' in update_fields):
+        instance._page_cache_previous_username = sender.objects.filter(pk=instance.pk).values_list(
+            'username', flat=True).first()
+
+
+def expire_borrower_pages(sender, instance, created, **kwargs):
+    # Pages show borrowers by username; only a rename changes them.
+    previous = getattr(instance, '_page_cache_previous_username', None)
+    if created or previous is None or previous == instance.username:
+        return
+    expire_books(BookInstance.objects.filter(borrower=instance).values_list('book_id', flat=True))
+
+
+def connect_signals():
+    for model in (Book, BookInstance, Author, Genre):
+        post_save.connect(invalidate_library_stats, sender=model, dispatch_uid=f'stats-save-{model.__name__}')
+        post_delete.connect(invalidate_library_stats, sender=model, dispatch_uid=f'stats-delete-{model.__name__}')
+
+    post_save.connect(reindex_book, sender=Book, dispatch_uid='search-save-Book')
+    post_delete.connect(unindex_book, sender=Book, dispatch_uid='search-delete-Book')
+    m2m_changed.connect(reindex_book_genres, sender=Book.genre.through, dispatch_uid='search-genres-Book')
+    for model in (Author, Genre):
+        post_save.connect(reindex_related_books, sender=model, dispatch_uid=f'search-save-{model.__name__}')
+        pre_delete.connect(remember_related_books, sender=model, dispatch_uid=f'search-pre-delete-{model.__name__}')
+        post_delete.connect(reindex_remembered_books, sender=model, dispatch_uid=f'search-delete-{model.__name__}')
+
+    for model in (Book, BookInstance):
+        pre_save.connect(remember_previous_parent, sender=model, dispatch_uid=f'pages-pre-save-{model.__name__}')
+    for model, handler in ((Book, expire_book_pages), (BookInstance, expire_copy_pages),
+                           (Author, expire_author_pages), (Genre, expire_genre_pages)):
+        post_save.connect(handler, sender=model, dispatch_uid=f'pages-save-{model.__name__}')
+        post_delete.connect(handler, sender=model, dispatch_uid=f'pages-delete-{model.__name__}')
+    m2m_changed.connect(expire_book_genre_pages, sender=Book.genre.through, dispatch_uid='pages-genres-Book')
+    post_delete.connect(uncount_copy, sender=BookInstance, dispatch_uid='counters-delete-BookInstance')
+    post_save.connect(allocate_available_copy, sender=BookInstance, dispatch_uid='reservations-save-BookInstance')
+    pre_save.connect(remember_previous_username, sender=get_user_model(), dispatch_uid='pages-pre-save-borrower')
+    post_save.connect(expire_borrower_pages, sender=get_user_model(), dispatch_uid='pages-save-borrower')
+
+    for model in (Book, Author, Genre):
+        post_save.connect(expire_snapshot, sender=model, dispatch_uid=f'snapshot-save-{model.__name__}')
+        post_delete.connect(expire_snapshot, sender=model, dispatch_uid=f'snapshot-delete-{model.__name__}')
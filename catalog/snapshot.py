@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Author, Book, BookInstance, CacheVersion, Genre, Reservation
+from .page_cache import cache_shared_by_workers
+from .routers import routing
+
+# Token of the current snapshot, shared by every worker through the cache;
+# a worker whose copy has another token rebuilds it on next use.
+SNAPSHOT_VERSION_KEY = 'catalog:snapshot-version'
+# Without a shared cache the version is a CacheVersion row instead, read at
+# most every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds.
+SNAPSHOT_VERSION_NAME = 'snapshot'
+
+# Labels of the status choices, instead of get_status_display() per row.
+LOAN_STATUS_LABELS = dict(BookInstance.LOAN_STATUS)
+RESERVATION_STATUS_LABELS = dict(Reservation.RESERVATION_STATUS)
+
+
+class Table:
+    """Read-only id -> value lookup on a sorted array of ids and a parallel tuple of values."""
+    __slots__ = ('ids', 'values')
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.ids = array('q', [pk for pk, _ in pairs])
+        self.values = tuple(value for _, value in pairs)
+
+    def get(self, pk, default=None):
+        index = bisect_left(self.ids, pk) if pk is not None else len(self.ids)
+        if index < len(self.ids) and self.ids[index] == pk:
+            return self.values[index]
+        return default
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class CatalogSnapshot:
+    """
+    Genre names, author display names and book titles as of one snapshot
+    version. Loans change a book's counters with an update, not a save, so
+    they leave the snapshot alone; genre links stay in the database.
+    """
+    __slots__ = ('version', 'genres', 'authors', 'books')
+
+    def __init__(self, version):
+        self.version = version
+        self.genres = Table(Genre.objects.order_by().values_list('pk', 'name'))
+        self.authors = Table((pk, f'{last_name} {first_name}') for pk, last_name, first_name in
+                             Author.objects.order_by().values_list('pk', 'last_name', 'first_name'))
+        self.books = Table(Book.objects.order_by().values_list('id', 'title'))
+
+    def genre_name(self, genre_id):
+        return self.genres.get(genre_id, '')
+
+    def author_name(self, author_id):
+        return self.authors.get(author_id, '')
+
+    def title(self, book_id):
+        return self.books.get(book_id, '')
+
+    def book_genre_names(self, book_ids):
+        """{book id: genre names} for ``book_ids``; one query for their genre links, names from the snapshot."""
+        names = defaultdict(list)
+        for book_id, genre_id in Book.genre.through.objects.filter(book_id__in=book_ids).order_by(
+                'book_id', 'genre_id').values_list('book_id', 'genre_id'):
+            names[book_id].append(self.genre_name(genre_id))
+        return names
+
+
+_snapshot = None
+_lock = threading.Lock()
+_checked = None  # (version read from the database, when)
+
+
+def database_version():
+    global _checked
+    now = time.monotonic()
+    checked = _checked
+    if checked is None or now - checked[1] >= getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 1):
+        with routing(pinned=True):
+            version = CacheVersion.objects.filter(name=SNAPSHOT_VERSION_NAME).values_list('version', flat=True).first()
+        checked = _checked = (f'db:{version or 0}', now)
+    return checked[0]
+
+
+def current_version():
+    if not cache_shared_by_workers():
+        return database_version()
+    version = cache.get(SNAPSHOT_VERSION_KEY)
+    if version is None:
+        cache.add(SNAPSHOT_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SNAPSHOT_VERSION_KEY)
+    return version
+
+
+def get_snapshot():
+    """
+    This process's snapshot, rebuilt if another worker (or this one)
+    invalidated it; one cache read, or with a per-process cache at most one
+    query every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds.
+    """
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            if _snapshot is None or _snapshot.version != version:
+                with routing(pinned=True):
+                    _snapshot = CatalogSnapshot(version)
+            snapshot = _snapshot
+    return snapshot
+
+
+def bump_database_version():
+    if CacheVersion.objects.filter(name=SNAPSHOT_VERSION_NAME).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CacheVersion.objects.create(name=SNAPSHOT_VERSION_NAME, version=1)
+    except IntegrityError:
+        # Created by another process meanwhile.
+        CacheVersion.objects.filter(name=SNAPSHOT_VERSION_NAME).update(version=F('version') + 1)
+
+
+def invalidate_snapshot(**kwargs):
+    global _snapshot, _checked
+    if cache_shared_by_workers():
+        cache.set(SNAPSHOT_VERSION_KEY, uuid.uuid4().hex, None)
+    else:
+        bump_database_version()
+        _checked = None
+    _snapshot = None
+
+
+def expire_snapshot(sender=None, using=None, **kwargs):
+    invalidate_snapshot()
+    if cache_shared_by_workers():
+        # Again once committed: another worker may have rebuilt from the rows as they were before.
+        # (A database version only changes for the others when the transaction commits.)
+        transaction.on_commit(invalidate_snapshot, using=using)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Author, Book, BookInstance, Genre
+from .routers import routing
+
+STATS_CACHE_KEY = 'catalog:library-stats'
+
+
+class SubqueryCount(Subquery):
+    # Scalar COUNT(*) over another table, usable inside aggregate() so all
+    # counters come back from a single SELECT.
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+    contains_aggregate = True
+
+    def __init__(self, queryset, **extra):
+        super().__init__(queryset.order_by().values('pk'), **extra)
+
+
+def compute_library_stats():
+    return Book.objects.order_by().aggregate(
+        num_books=Count('pk'),
+        num_books_with_dun=Count('pk', filter=Q(title__icontains='дюн')),
+        # Copy counts come from the Book counters rather than scanning BookInstance,
+        # plus the copies whose book was deleted (book set to NULL), which no counter holds.
+        num_instances=Coalesce(Sum('copies_total'), 0) + SubqueryCount(
+            BookInstance.objects.filter(book__isnull=True)),
+        num_instances_available=Coalesce(Sum('copies_available'), 0) + SubqueryCount(
+            BookInstance.objects.filter(book__isnull=True, status__exact='a')),
+        num_authors=SubqueryCount(Author.objects.all()),
+        num_genres=SubqueryCount(Genre.objects.all()),
+    )
+
+
+def get_library_stats():
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        with routing(pinned=True):
+            stats = compute_library_stats()
+        cache.set(STATS_CACHE_KEY, stats, getattr(settings, 'CATALOG_STATS_CACHE_TIMEOUT', 300))
+    return stats
+
+
+def invalidate_library_stats(**kwargs):
+    cache.delete(STATS_CACHE_KEY)
@@ -0,0 +1,16 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheets(bundle):
+    """
+    The <link> of a CATALOG_CSS_BUNDLES bundle, built by collectstatic; while
+    DEBUG, when runserver serves the sources from the apps, one per source.
+    """
+    sources = [bundle] if not settings.DEBUG else settings.CATALOG_CSS_BUNDLES[bundle]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(source),) for source in sources))
@@ -0,0 +1,34 @@
+import os
+
+from django.apps import apps
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(engine):
+    """
+    Names of the project's templates: those in the engine's DIRS and in the
+    catalog app, not the ones shipped with Django's own apps.
+    """
+    directories = list(engine.dirs) + [os.path.join(apps.get_app_config('catalog').path, 'templates')]
+    names = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(TEMPLATE_EXTENSIONS):
+                    names.add(os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def precompile_templates():
+    """Parse every project template into the cached loaders now, instead of on the first request for each."""
+    compiled = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            backend.engine.get_template(name)
+            compiled += 1
+    return compiled
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class CatalogTestRunner(DiscoverRunner):
+    """
+    Runs the tests with plain static files storage, so they don't need a
+    collectstatic manifest; the tests of the asset pipeline opt back in.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
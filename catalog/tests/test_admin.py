@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Reservation
+from catalog.pagination import EstimatedCountPaginator, estimated_count
+from catalog.snapshot import get_snapshot
+
+
+class AdminQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='x', email='a@example.com')
+        genres = [Genre.objects.create(name=f'Genre {num}') for num in range(3)]
+        cls.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.books = []
+        for num in range(30):
+            book = Book.objects.create(title=f'Book {num}', summary='-', isbn=str(num), author=cls.author)
+            book.genre.set(genres)
+            cls.books.append(book)
+        for book in cls.books[:10]:
+            for _ in range(3):
+                BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.admin)
+        for _ in range(30):
+            BookInstance.objects.create(book=cls.books[0], imprint='Ace', status='a')
+        Reservation.objects.create(book=cls.books[0], borrower=cls.admin)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url):
+        # Rebuilt once after the catalog changes, not per row.
+        get_snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_dont_query_per_row(self):
+        urls = [reverse(f'admin:catalog_{model}_changelist') for model in ('book', 'bookinstance', 'author',
+                                                                             'reservation')]
+        before = [self.count_queries(url) for url in urls]
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        for num in range(10):
+            book = Book.objects.create(title=f'More {num}', summary='-', isbn=f'9{num}', author=author)
+            book.genre.set(Genre.objects.all())
+            BookInstance.objects.create(book=book, imprint='Ace', status='a')
+            Reservation.objects.create(book=book, borrower=self.admin)
+        self.assertEqual([self.count_queries(url) for url in urls], before)
+
+    def test_book_changelist(self):
+        # Session, user, genre filter, estimate and count (small table), books joined with authors,
+        # and their genres in one prefetch.
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('admin:catalog_book_changelist'))
+        self.assertContains(response, 'Genre 0, Genre 1, Genre 2')
+
+    def test_bookinstance_changelist(self):
+        # Session, user, estimate and count (small table), copies joined with books.
+        with self.assertNumQueries(5):
+            self.client.get(reverse('admin:catalog_bookinstance_changelist'))
+
+    def test_inlines_are_limited(self):
+        response = self.client.get(reverse('admin:catalog_book_change', args=[self.books[0].pk]))
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.total_form_count(), 20)
+        self.assertContains(response, '30 of 33 available, view all')
+        response = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.total_form_count(), 20)
+        self.assertContains(response, '30 books, view all')
+
+    def test_limited_inline_saves(self):
+        book = self.books[0]
+        response = self.client.get(reverse('admin:catalog_book_change', args=[book.pk]))
+        formset = response.context['inline_admin_formsets'][0].formset
+        data = {'title': 'Dune', 'summary': '-', 'isbn': '0', 'author': self.author.pk,
+                'genre': [genre.pk for genre in book.genre.all()]}
+        for name, value in formset.management_form.initial.items():
+            data[f'{formset.prefix}-{name}'] = value
+        for index, form in enumerate(formset.forms):
+            for name in ('id', 'imprint', 'status', 'due_back'):
+                value = form.initial.get(name)
+                data[f'{formset.prefix}-{index}-{name}'] = '' if value is None else value
+            data[f'{formset.prefix}-{index}-book'] = book.pk
+        response = self.client.post(reverse('admin:catalog_book_change', args=[book.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.get(pk=book.pk).title, 'Dune')
+        self.assertEqual(book.bookinstance_set.count(), 33)
+
+
+class EstimatedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(5):
+            Genre.objects.create(name=f'Genre {num}')
+
+    def test_estimate(self):
+        self.assertEqual(estimated_count(Genre, 'default'), Genre.objects.order_by('-pk').first().pk)
+
+    def test_paginator_uses_estimate_above_threshold(self):
+        Genre.objects.filter(pk=Genre.objects.order_by('pk').first().pk).delete()
+        paginator = EstimatedCountPaginator(Genre.objects.order_by('pk'), 2)
+        paginator.estimate_threshold = 3
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 5)
+        # Filtered querysets, and tables under the threshold, are counted exactly.
+        self.assertEqual(EstimatedCountPaginator(Genre.objects.filter(name__startswith='Genre').order_by('pk'), 2).count, 4)
+        self.assertEqual(EstimatedCountPaginator(Genre.objects.order_by('pk'), 2).count, 4)
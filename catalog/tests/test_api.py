@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        genres = [Genre.objects.create(name='Science Fiction'), Genre.objects.create(name='Classic')]
+        cls.books = []
+        for num in range(7):
+            book = Book.objects.create(title=f'Dune {num}', summary='Spice', isbn=f'97800000000{num}',
+                                       author=cls.author)
+            book.genre.set(genres)
+            BookInstance.objects.create(book=book, imprint='Ace', status='a' if num % 2 else 'o')
+            cls.books.append(book)
+
+    def test_default_fields(self):
+        response = self.client.get(reverse('api-books'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(data['results'][0], {'id': self.books[0].pk, 'title': 'Dune 0', 'author': self.author.pk,
+                                              'author_first_name': 'Frank', 'author_last_name': 'Herbert',
+                                              'copies_available': 0})
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fieldsets_load_only_requested_columns(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api-books'), {'fields': 'title'}).json()
+        self.assertEqual(data['results'][0], {'title': 'Dune 0'})
+        # Related fields cost one query per page, not per row.
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('api-books'), {'fields': 'id,genres,copies_available'}).json()
+        self.assertEqual(data['results'][1], {'id': self.books[1].pk, 'genres': ['Classic', 'Science Fiction'],
+                                              'copies_available': 1})
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('api-books'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_cursor_pagination(self):
+        data = self.client.get(reverse('api-books'), {'fields': 'title', 'limit': 3}).json()
+        titles = [row['title'] for row in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            titles += [row['title'] for row in data['results']]
+        self.assertEqual(titles, [f'Dune {num}' for num in range(7)])
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([row['title'] for row in previous['results']], ['Dune 3', 'Dune 4', 'Dune 5'])
+        self.assertEqual(self.client.get(reverse('api-books'), {'cursor': 'bogus'}).status_code, 400)
+
+    def test_bulk_ids_keep_requested_order(self):
+        ids = [self.books[3].pk, self.books[0].pk, 999999]
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api-books'), {'ids': ','.join(map(str, ids)), 'fields': 'id'}).json()
+        self.assertEqual(data['results'], [{'id': self.books[3].pk}, {'id': self.books[0].pk}])
+        self.assertEqual(self.client.get(reverse('api-books'), {'ids': 'a,b'}).status_code, 400)
+
+    def test_detail(self):
+        data = self.client.get(reverse('api-author', args=[self.author.pk])).json()
+        self.assertEqual(data['books'], [book.pk for book in self.books])
+        self.assertEqual(data['url'], self.author.get_absolute_url())
+        self.assertEqual(self.client.get(reverse('api-author', args=[999999])).status_code, 404)
+        copy = self.books[0].bookinstance_set.get()
+        data = self.client.get(reverse('api-copy', args=[copy.pk])).json()
+        self.assertEqual((data['id'], data['book_title'], data['status']), (str(copy.pk), 'Dune 0', 'o'))
+
+    def test_etag(self):
+        response = self.client.get(reverse('api-genres'))
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Classic', 'Science Fiction'])
+        response = self.client.get(reverse('api-genres'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Genre.objects.create(name='Fantasy')
+        response = self.client.get(reverse('api-genres'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.availability import reconcile_copy_counts
+from catalog.models import Book, BookInstance
+
+
+class CopyCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        cls.other = Book.objects.create(title='Emma', summary='Novel', isbn='2')
+
+    def counters(self, book):
+        return Book.objects.filter(pk=book.pk).values_list(
+            'copies_total', 'copies_available', 'copies_on_loan', 'copies_reserved', 'copies_maintenance').get()
+
+    def test_create_and_change_status(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Ace', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Ace', status='m')
+        self.assertEqual(self.counters(self.book), (2, 1, 0, 0, 1))
+        copy.status = 'o'
+        copy.save()
+        self.assertEqual(self.counters(self.book), (2, 0, 1, 0, 1))
+        copy.save()
+        self.assertEqual(self.counters(self.book), (2, 0, 1, 0, 1))
+
+    def test_move_copy_to_another_book(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Ace', status='r')
+        copy.book = self.other
+        copy.save()
+        self.assertEqual(self.counters(self.book), (0, 0, 0, 0, 0))
+        self.assertEqual(self.counters(self.other), (1, 0, 0, 1, 0))
+
+    def test_delete(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Ace', status='a')
+        BookInstance.objects.create(book=self.book, imprint='Ace', status='a')
+        copy.delete()
+        self.assertEqual(self.counters(self.book), (1, 1, 0, 0, 0))
+        BookInstance.objects.filter(book=self.book).delete()
+        self.assertEqual(self.counters(self.book), (0, 0, 0, 0, 0))
+
+    def test_book_save_keeps_counters(self):
+        book = Book.objects.get(pk=self.book.pk)
+        BookInstance.objects.create(book=self.book, imprint='Ace', status='a')
+        book.title = 'Dune Messiah'
+        book.save()
+        self.assertEqual(self.counters(self.book), (1, 1, 0, 0, 0))
+
+    def test_reconcile(self):
+        BookInstance.objects.create(book=self.book, imprint='Ace', status='a')
+        # Queryset updates bypass BookInstance.save().
+        BookInstance.objects.update(status='o')
+        self.assertEqual(reconcile_copy_counts(dry_run=True), [self.book.pk])
+        self.assertEqual(self.counters(self.book), (1, 1, 0, 0, 0))
+        out = StringIO()
+        call_command('reconcile_copy_counts', stdout=out)
+        self.assertIn('1 books corrected', out.getvalue())
+        self.assertEqual(self.counters(self.book), (1, 0, 1, 0, 0))
+        self.assertEqual(reconcile_copy_counts(), [])
+
+
+class AvailabilitySortTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(7):
+            book = Book.objects.create(title=f'Book {num}', summary='Summary', isbn=str(num))
+            for _ in range(num % 3):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_sorted_by_availability_without_copy_queries(self):
+        titles = []
+        url = reverse('books') + '?sort=available'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url)
+            self.assertNotIn('catalog_bookinstance', ' '.join(query['sql'] for query in queries))
+            titles += [book.title for book in resp.context['book_list']]
+            page = resp.context['page_obj']
+            url = f"{reverse('books')}?{resp.context['pagination_query']}&cursor={page.next_cursor}" \
+                if page.has_next() else None
+        self.assertEqual(titles, ['Book 2', 'Book 5', 'Book 1', 'Book 4', 'Book 0', 'Book 3', 'Book 6'])
+        self.assertContains(resp, '0 of 0 available')
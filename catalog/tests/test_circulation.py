@@ -0,0 +1,335 @@
+import datetime
+import json
+import tempfile
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core import serializers
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog import circulation
+from catalog.forms import BookInstanceForm
+from catalog.models import Author, Book, BookInstance, ConcurrentUpdateError, Genre, Reservation
+
+
+class CirculationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrower = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1', author=author)
+        cls.available = [BookInstance.objects.create(book=cls.book, imprint='Ace', status='a') for _ in range(3)]
+        cls.loaned = BookInstance.objects.create(book=cls.book, imprint='Ace', status='o', borrower=cls.borrower,
+                                                 due_back=datetime.date.today())
+        cls.maintenance = BookInstance.objects.create(book=cls.book, imprint='Ace', status='m')
+
+    def setUp(self):
+        cache.clear()
+
+    def counters(self):
+        return Book.objects.filter(pk=self.book.pk).values_list(
+            'copies_total', 'copies_available', 'copies_on_loan', 'copies_reserved', 'copies_maintenance').get()
+
+    def test_checkout_reports_each_copy(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        missing = uuid.uuid4()
+        ids = [copy.pk for copy in self.available] + [self.loaned.pk, missing, 'nonsense']
+        # Lock, one UPDATE of the copies, one of the counters, touch (plus the savepoint).
+        with self.assertNumQueries(6):
+            report = circulation.checkout(ids, self.borrower, due_back)
+        self.assertEqual([result['ok'] for result in report], [True, True, True, False, False, False])
+        self.assertEqual([result['error'] for result in report[3:]], ['Not available', 'Not found', 'Invalid id'])
+        self.assertEqual(report[0]['id'], str(self.available[0].pk))
+        self.assertEqual(BookInstance.objects.filter(status='o', borrower=self.borrower, due_back=due_back).count(), 3)
+        self.assertEqual(self.counters(), (5, 0, 4, 0, 1))
+
+    def test_checkin_clears_loan(self):
+        report = circulation.checkin([self.loaned.pk, self.maintenance.pk])
+        self.assertEqual([result['error'] for result in report], [None, 'Not on loan'])
+        self.loaned.refresh_from_db()
+        self.assertEqual((self.loaned.status, self.loaned.borrower, self.loaned.due_back), ('a', None, None))
+        self.assertEqual(self.counters(), (5, 4, 0, 0, 1))
+
+    def test_renew_keeps_counters(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=4)
+        report = circulation.renew([self.loaned.pk, self.available[0].pk], due_back)
+        self.assertEqual([result['ok'] for result in report], [True, False])
+        self.loaned.refresh_from_db()
+        self.assertEqual(self.loaned.due_back, due_back)
+        self.assertEqual(self.counters(), (5, 3, 1, 0, 1))
+
+    def test_due_date_is_validated(self):
+        for due_back in (datetime.date.today() - datetime.timedelta(days=1),
+                         datetime.date.today() + datetime.timedelta(weeks=4, days=1)):
+            with self.assertRaises(ValidationError):
+                circulation.renew([self.loaned.pk], due_back)
+        with self.assertRaises(ValidationError):
+            circulation.apply('checkout', [self.available[0].pk], due_back=datetime.date.today())
+
+    def test_duplicate_ids_are_applied_once(self):
+        copy = self.available[0]
+        report = circulation.checkout([copy.pk, str(copy.pk).upper()], self.borrower)
+        self.assertEqual([result['ok'] for result in report], [True, True])
+        self.assertEqual(self.counters(), (5, 2, 2, 0, 1))
+
+    def test_book_page_is_expired(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.assertContains(self.client.get(url), '3 of 5')
+        circulation.checkout([copy.pk for copy in self.available], self.borrower)
+        self.assertContains(self.client.get(url), '0 of 5')
+
+
+class OptimisticLockingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Ace', status='o', borrower=cls.librarian,
+                                               due_back=datetime.date.today())
+
+    def test_stale_save_is_refused(self):
+        first, second = BookInstance.objects.get(pk=self.copy.pk), BookInstance.objects.get(pk=self.copy.pk)
+        first.imprint = 'Gollancz'
+        first.save()
+        second.status = 'm'
+        with self.assertRaises(ConcurrentUpdateError):
+            second.save()
+        self.assertEqual(second.version, first.version - 1)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.imprint, copy.status, copy.version), ('Gollancz', 'o', 1))
+        self.assertEqual(Book.objects.get(pk=self.book.pk).copies_on_loan, 1)
+
+    def test_update_fields_bump_version(self):
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        copy.imprint = 'Gollancz'
+        copy.save(update_fields=['imprint'])
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).version, 1)
+
+    def test_fixtures_load_over_existing_copies(self):
+        circulation.renew([self.copy.pk])
+        rows = json.loads(serializers.serialize('json', [BookInstance.objects.get(pk=self.copy.pk)]))
+        rows[0]['fields'].update(imprint='Gollancz', version=7)
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as fixture:
+            json.dump(rows, fixture)
+            fixture.flush()
+            call_command('loaddata', fixture.name, verbosity=0)
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.imprint, copy.version), ('Gollancz', 7))
+
+    def test_renewal_form_rejects_stale_submit(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        url = reverse('renew-book-librarian', args=[self.copy.pk])
+        self.assertContains(self.client.get(url), 'name="loaded_version" value="0"')
+        circulation.renew([self.copy.pk])
+        due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        response = self.client.post(url, {'due_back': due_back, 'loaded_version': 0})
+        self.assertContains(response, 'Someone else changed this copy meanwhile')
+        self.assertNotEqual(BookInstance.objects.get(pk=self.copy.pk).due_back, due_back)
+        response = self.client.post(url, {'due_back': due_back, 'loaded_version': 1})
+        self.assertRedirects(response, reverse('all-borrowed'), fetch_redirect_response=False)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).due_back, due_back)
+
+
+    def test_admin_rejects_stale_submit(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x', email='a@example.com'))
+        url = reverse('admin:catalog_bookinstance_change', args=[self.copy.pk])
+        data = {'id': self.copy.pk, 'book': self.book.pk, 'imprint': 'Gollancz', 'status': 'o', 'borrower': self.librarian.pk,
+                'due_back': datetime.date.today(), 'loaded_version': 0}
+        circulation.renew([self.copy.pk])
+        self.assertContains(self.client.post(url, data), 'Someone else changed this copy meanwhile')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Ace')
+        data['loaded_version'] = 1
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Gollancz')
+
+    def test_admin_inline_rejects_stale_submit(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x', email='a@example.com'))
+        url = reverse('admin:catalog_book_change', args=[self.book.pk])
+        self.assertContains(self.client.get(url), 'name="bookinstance_set-0-loaded_version" value="0"')
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        genre = Genre.objects.create(name='Science fiction')
+        data = {'title': 'Dune', 'summary': 'Spice', 'isbn': '1', 'author': author.pk, 'genre': [genre.pk],
+                'bookinstance_set-TOTAL_FORMS': 1, 'bookinstance_set-INITIAL_FORMS': 1,
+                'bookinstance_set-0-id': self.copy.pk, 'bookinstance_set-0-book': self.book.pk,
+                'bookinstance_set-0-imprint': 'Gollancz', 'bookinstance_set-0-status': 'o',
+                'bookinstance_set-0-due_back': datetime.date.today(), 'bookinstance_set-0-loaded_version': 0}
+        circulation.renew([self.copy.pk])
+        self.assertContains(self.client.post(url, data), 'Someone else changed this copy meanwhile')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Ace')
+        data['bookinstance_set-0-loaded_version'] = 1
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Gollancz')
+
+    def test_admin_change_lost_after_validation(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x', email='a@example.com'))
+        url = reverse('admin:catalog_bookinstance_change', args=[self.copy.pk])
+        data = {'id': self.copy.pk, 'book': self.book.pk, 'imprint': 'Gollancz', 'status': 'o', 'borrower': self.librarian.pk,
+                'due_back': datetime.date.today(), 'loaded_version': 0}
+        clean = BookInstanceForm.clean
+
+        def clean_then_renew(form):
+            cleaned_data = clean(form)
+            circulation.renew([self.copy.pk])
+            return cleaned_data
+
+        with mock.patch.object(BookInstanceForm, 'clean', clean_then_renew):
+            response = self.client.post(url, data)
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertContains(self.client.get(url), 'Someone else changed this copy meanwhile')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).imprint, 'Ace')
+
+    def test_admin_adds_copy(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x', email='a@example.com'))
+        data = {'id': uuid.uuid4(), 'book': self.book.pk, 'imprint': 'Gollancz', 'status': 'a', 'loaded_version': 0}
+        response = self.client.post(reverse('admin:catalog_bookinstance_add'), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(BookInstance.objects.filter(pk=data['id'], imprint='Gollancz').exists())
+
+
+class ReservationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.readers = [User.objects.create_user(username=f'reader{num}') for num in range(3)]
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Ace', status='o', borrower=cls.readers[2],
+                                               due_back=datetime.date.today())
+
+    def counters(self):
+        return Book.objects.filter(pk=self.book.pk).values_list(
+            'copies_total', 'copies_available', 'copies_on_loan', 'copies_reserved', 'copies_maintenance').get()
+
+    def test_queue_is_served_in_order(self):
+        first = circulation.reserve(self.book, self.readers[0])
+        second = circulation.reserve(self.book, self.readers[1])
+        self.assertEqual((first.status, second.status), ('w', 'w'))
+
+        circulation.checkin([self.copy.pk])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.copy_id), ('h', self.copy.pk))
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower), ('r', self.readers[0]))
+        self.assertEqual(self.counters(), (1, 0, 0, 1, 0))
+
+        circulation.collect(first)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, 'o')
+        self.assertEqual(self.counters(), (1, 0, 1, 0, 0))
+        circulation.checkin([self.copy.pk])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'h')
+
+    def test_cancelled_hold_goes_to_next(self):
+        first = circulation.reserve(self.book, self.readers[0])
+        second = circulation.reserve(self.book, self.readers[1])
+        circulation.checkin([self.copy.pk])
+        circulation.cancel(first)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.copy_id), ('h', self.copy.pk))
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.readers[1])
+        self.assertEqual(self.counters(), (1, 0, 0, 1, 0))
+        with self.assertRaises(ValidationError):
+            circulation.collect(first)
+
+    def test_reserving_twice_is_refused(self):
+        circulation.reserve(self.book, self.readers[0])
+        with self.assertRaises(ValidationError):
+            circulation.reserve(self.book, self.readers[0])
+
+    def test_admin_lends_copy_on_hold(self):
+        admin = User.objects.create_superuser(username='admin', password='x', email='a@example.com')
+        self.client.force_login(admin)
+        first = circulation.reserve(self.book, self.readers[0])
+        circulation.checkin([self.copy.pk])
+        self.client.post(reverse('admin:catalog_reservation_changelist'),
+                         {'action': 'collect', '_selected_action': [first.pk]})
+        self.assertEqual(Reservation.objects.get(pk=first.pk).status, 'f')
+        copy = BookInstance.objects.get(pk=self.copy.pk)
+        self.assertEqual((copy.status, copy.borrower), ('o', self.readers[0]))
+        self.assertEqual(self.counters(), (1, 0, 1, 0, 0))
+
+    def test_stale_hold_is_not_assigned(self):
+        reservation = circulation.reserve(self.book, self.readers[0])
+        BookInstance.objects.filter(pk=self.copy.pk).update(status='a')
+        # Read before another librarian changed the copy.
+        self.assertFalse(circulation.hold(self.book.pk, (reservation.pk, self.readers[0].pk), (self.copy.pk, 5)))
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).status, 'w')
+
+
+class AllocationOnCommitTest(TransactionTestCase):
+    def test_copy_made_available_in_admin_is_held(self):
+        reader = User.objects.create_user(username='reader')
+        book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        copy = BookInstance.objects.create(book=book, imprint='Ace', status='m')
+        reservation = circulation.reserve(book, reader)
+        self.assertEqual(reservation.status, 'w')
+        copy.status = 'a'
+        copy.save()
+        reservation.refresh_from_db()
+        self.assertEqual((reservation.status, reservation.copy_id), ('h', copy.pk))
+        self.assertEqual(Book.objects.get(pk=book.pk).copies_reserved, 1)
+
+
+class BulkCirculationViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        cls.borrower = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='Ace', status='a') for _ in range(2)]
+
+    def test_requires_permission(self):
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get(reverse('bulk-circulation')).status_code, 403)
+
+    def test_checkout(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('bulk-circulation'), {
+            'operation': 'checkout', 'borrower': 'reader',
+            'copies': f'{self.copies[0].pk}, {self.copies[1].pk}\nbad',
+            'due_back': datetime.date.today() + datetime.timedelta(weeks=1),
+        })
+        self.assertContains(response, '2 of 3 copies updated')
+        self.assertContains(response, 'Invalid id')
+        self.assertEqual(BookInstance.objects.filter(borrower=self.borrower, status='o').count(), 2)
+
+    def test_checkout_requires_borrower(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('bulk-circulation'), {
+            'operation': 'checkout', 'copies': str(self.copies[0].pk),
+            'due_back': datetime.date.today() + datetime.timedelta(weeks=1),
+        })
+        self.assertFormError(response, 'form', 'borrower', 'A borrower is required to check out')
+        self.assertFalse(BookInstance.objects.filter(status='o').exists())
+
+
+class BookInstanceAdminActionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='1X<ISRUkw+tuK', email='a@example.com')
+        cls.borrower = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='Ace', status='a') for _ in range(2)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:catalog_bookinstance_changelist')
+
+    def test_check_out_then_return(self):
+        ids = [str(copy.pk) for copy in self.copies]
+        response = self.client.post(self.url, {'action': 'check_out', '_selected_action': ids})
+        self.assertContains(response, 'Check out 2 selected copies')
+        self.client.post(self.url, {
+            'action': 'check_out', '_selected_action': ids, 'apply': '1', 'borrower': 'reader',
+            'due_back': datetime.date.today() + datetime.timedelta(weeks=1),
+        })
+        self.assertEqual(BookInstance.objects.filter(borrower=self.borrower, status='o').count(), 2)
+
+        self.client.post(self.url, {'action': 'mark_returned', '_selected_action': ids[:1]})
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), 1)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).copies_on_loan, 1)
@@ -0,0 +1,255 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog.benchmark import Benchmark
+from catalog.models import Author, Book, BookInstance, Genre, VisitCount
+from catalog.search import search_books
+
+
+class SeedCatalogCommandTest(TestCase):
+    def test_seed_creates_requested_volumes(self):
+        call_command('seed_catalog', authors=5, genres=3, books=12, copies_per_book=2, genres_per_book=2,
+                     borrowers=4, batch_size=5, stdout=StringIO())
+        self.assertEqual(Author.objects.count(), 5)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(Book.objects.count(), 12)
+        self.assertEqual(Book.genre.through.objects.count(), 24)
+        self.assertEqual(BookInstance.objects.count(), 24)
+        self.assertEqual(User.objects.filter(username__startswith='borrower').count(), 4)
+        self.assertFalse(BookInstance.objects.filter(status='o', borrower__isnull=True).exists())
+
+    def test_seed_indexes_books_for_search(self):
+        call_command('seed_catalog', authors=2, genres=1, books=3, stdout=StringIO())
+        self.assertEqual(search_books('author').count(), 3)
+
+
+class BenchmarkCatalogCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_catalog', authors=3, genres=2, books=8, borrowers=2, stdout=StringIO())
+        User.objects.create_superuser(username='admin', password='12345', email='admin@example.com')
+
+    def test_benchmark_writes_and_compares_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_catalog', iterations=2, warmup=0, user='admin', save=path, stdout=StringIO())
+            with open(path) as f:
+                results = json.load(f)['results']
+            self.assertIn('book-detail[pk]', results)
+            self.assertIn('renew-book-librarian[pk]', results)
+            self.assertEqual(results['book-detail[pk]']['status'], 200)
+            for result in results.values():
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+            results['book-detail[pk]']['queries'] = 0
+            with open(path, 'w') as f:
+                json.dump({'results': results}, f)
+            with self.assertRaisesMessage(CommandError, 'book-detail[pk]: 0 ->'):
+                call_command('benchmark_catalog', iterations=1, warmup=0, user='admin', only=['book-detail'],
+                             baseline=path,
+                             tolerance=100, stdout=StringIO())
+
+    def test_benchmark_compares_api_with_pages(self):
+        out = StringIO()
+        call_command('benchmark_catalog', iterations=2, warmup=0, user='admin', only=['book'], stdout=out)
+        self.assertIn('api-book[pk]', out.getvalue())
+        self.assertRegex(out.getvalue(), r'api-books +books +[\d.]+ +[\d.]+ +[\d.]+x')
+
+    def test_cold_cache_renders_anonymous_pages(self):
+        paths = {'books': reverse('books')}
+        warm = Benchmark(paths, iterations=1, warmup=1).run()['books']
+        cold = Benchmark(paths, iterations=1, warmup=1, cold_cache=True).run()['books']
+        self.assertEqual(warm['queries'], 0)
+        self.assertGreater(cold['queries'], 0)
+
+
+class BenchmarkTemplatesCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_catalog', authors=3, genres=2, books=8, borrowers=2, stdout=StringIO())
+        User.objects.create_superuser(username='admin', password='12345', email='admin@example.com')
+
+    def test_benchmark_renders_each_template(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            out = StringIO()
+            call_command('benchmark_templates', iterations=2, warmup=0, user='admin', save=path, stdout=out)
+            with open(path) as f:
+                results = json.load(f)['results']
+        for name in ('book_detail.html', 'book_list.html', 'base_generic.html', 'copy_segment.html',
+                     'bookinstance_list_borrowed.html'):
+            self.assertIn(name, results)
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertGreater(result['peak_kb'], 0)
+        self.assertRegex(out.getvalue(), r'book_detail\.html +[\d.]+ +[\d.]+ +[\d.]+ +[\d.]+ +\d+ ')
+
+    def test_only(self):
+        out = StringIO()
+        call_command('benchmark_templates', iterations=1, warmup=0, only=['book_list'], stdout=out)
+        self.assertIn('book_list.html', out.getvalue())
+        self.assertNotIn('index.html', out.getvalue())
+
+
+class BenchmarkConnectionsCommandTest(SimpleTestCase):
+    def test_compares_connection_modes(self):
+        # A file: Django never closes in-memory SQLite connections.
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        connections.databases['benchmark-source'] = dict(connections['default'].settings_dict, NAME=path)
+        self.addCleanup(connections.databases.pop, 'benchmark-source')
+        out = StringIO()
+        call_command('benchmark_connections', database='benchmark-source', concurrency=[2], requests=20, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:4]], ['connect', 'persistent', 'pool'])
+        # A connection per request without a pool; at most one per thread with one.
+        self.assertEqual(lines[1].split()[-1], '20')
+        self.assertLessEqual(int(lines[3].split()[-1]), 2)
+
+
+class BenchmarkVisitsCommandTest(TestCase):
+    def test_counts_writes_per_visit(self):
+        out = StringIO()
+        call_command('benchmark_visits', requests=5, stdout=out)
+        rows = {line[:32].strip(): line.split()[-2:] for line in out.getvalue().splitlines()[1:]}
+        self.assertEqual(rows['session (db)'], ['5', '1.00'])
+        self.assertEqual(rows['buffered (homepage requests)'], ['0', '0.00'])
+        self.assertFalse(VisitCount.objects.exists())
+
+
+class StressReservationsCommandTest(TransactionTestCase):
+    # Committed rows, so the worker threads' connections can see them.
+    def test_no_copy_is_double_assigned(self):
+        out = StringIO()
+        call_command('stress_reservations', threads=6, borrowers=18, copies=3, stdout=out)
+        self.assertIn('OK', out.getvalue())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content, opener=open):
+        path = os.path.join(self.directory.name, name)
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_import_csv(self):
+        path = self.write('books.csv', 'isbn,title,summary,author_first_name,author_last_name,genres,copies,imprint\n'
+                                       '1,Dune,Spice,Frank,Herbert,Science Fiction;Classic,2,Ace\n'
+                                       '2,Dune Messiah,Sequel,Frank,Herbert,Science Fiction,1,Ace\n'
+                                       ',No ISBN,,,,,,\n')
+        call_command('import_catalog', path, batch_size=1, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(BookInstance.objects.count(), 3)
+        dune = Book.objects.get(isbn='1')
+        self.assertEqual(dune.author.last_name, 'Herbert')
+        self.assertEqual(sorted(genre.name for genre in dune.genre.all()), ['Classic', 'Science Fiction'])
+        self.assertEqual(search_books('messiah').count(), 1)
+
+    def test_import_gzipped_jsonl_reuses_existing_rows(self):
+        import gzip
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        Genre.objects.create(name='Science Fiction')
+        lines = [{'isbn': '1', 'title': 'Dune', 'author_first_name': 'Frank', 'author_last_name': 'Herbert',
+                  'genres': ['Science Fiction'], 'copies': 1}]
+        path = self.write('books.jsonl.gz', '\n'.join(json.dumps(line) for line in lines), opener=gzip.open)
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(Book.objects.get().author, author)
+        self.assertEqual(Genre.objects.count(), 1)
+
+    def test_resume_skips_existing_isbns(self):
+        path = self.write('books.jsonl', '{"isbn": "1", "title": "Dune"}\n{"isbn": "2", "title": "Emma"}\n')
+        call_command('import_catalog', path, stdout=StringIO())
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertIn('skipped 2 existing', out.getvalue())
+
+    def test_invalid_jsonl_rows_are_counted(self):
+        path = self.write('books.jsonl', '["1", "Dune"]\n"Dune"\n'
+                                         f'{{"isbn": "2", "title": "Emma", "author_last_name": "{"A" * 101}"}}\n'
+                                         '{"isbn": "3", "title": "Ulysses"}\n')
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out)
+        self.assertEqual(list(Book.objects.values_list('isbn', flat=True)), ['3'])
+        self.assertIn('3 invalid', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Row 1: not an object'):
+            call_command('import_catalog', path, strict=True, stdout=StringIO())
+
+    def test_strict_mode_rejects_invalid_rows(self):
+        path = self.write('books.csv', 'isbn,title,copies\n1,Dune,many\n')
+        with self.assertRaisesMessage(CommandError, 'Row 1'):
+            call_command('import_catalog', path, strict=True, stdout=StringIO())
+
+
+class ProcessOverdueCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', first_name='Ann')
+        cls.other = User.objects.create_user(username='other', email='other@example.com')
+        cls.no_email = User.objects.create_user(username='nomail')
+        book = Book.objects.create(title='Dune', summary='Spice', isbn='1')
+        today = datetime.date.today()
+        cls.late = BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.reader,
+                                               due_back=today - datetime.timedelta(days=3))
+        BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.reader,
+                                    due_back=today - datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.reader,
+                                    due_back=today + datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.other,
+                                    due_back=today - datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Ace', status='a', due_back=today - datetime.timedelta(days=1))
+        BookInstance.objects.create(book=book, imprint='Ace', status='o', borrower=cls.no_email,
+                                    due_back=today - datetime.timedelta(days=1))
+
+    def test_one_digest_per_borrower(self):
+        out = StringIO()
+        call_command('process_overdue', batch_size=1, stdout=out)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['other@example.com', 'reader@example.com'])
+        digest = next(message for message in mail.outbox if message.to == ['reader@example.com'])
+        self.assertEqual(digest.subject, 'Overdue books: 2')
+        self.assertIn('Hello Ann', digest.body)
+        self.assertIn('Sent 2 overdue digests covering 3 loans; 1 borrowers without an email address', out.getvalue())
+
+    def test_rerun_is_idempotent_until_renewed(self):
+        call_command('process_overdue', stdout=StringIO())
+        mail.outbox = []
+        with self.assertNumQueries(1):
+            call_command('process_overdue', stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+        self.late.due_back = datetime.date.today() - datetime.timedelta(days=2)
+        self.late.save()
+        call_command('process_overdue', stdout=StringIO())
+        self.assertEqual([message.subject for message in mail.outbox], ['Overdue books: 1'])
+
+    def test_dry_run_sends_nothing(self):
+        out = StringIO()
+        call_command('process_overdue', dry_run=True, stdout=out)
+        self.assertEqual(mail.outbox, [])
+        self.assertIn('Would send 2', out.getvalue())
+        self.assertEqual(BookInstance.objects.overdue_notice_pending().count(), 4)
+
+    def test_overdue_annotation(self):
+        overdue = dict(BookInstance.objects.on_loan().with_overdue().values_list('pk', 'overdue'))
+        self.assertTrue(overdue[self.late.pk])
+        self.assertEqual(sum(overdue.values()), 4)
@@ -0,0 +1,108 @@
+import datetime
+import time
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1234567890123', author=cls.author)
+        User.objects.create_user(username='reader', password='12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, **headers):
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'], **headers)
+
+    def test_not_modified_responses(self):
+        for url in (reverse('books'), reverse('authors'), reverse('book-detail', args=[self.book.pk]),
+                    reverse('author-detail', args=[self.author.pk])):
+            with self.subTest(url=url):
+                resp = self.revalidate(url)
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp.content, b'')
+
+    def test_revalidation_is_served_without_queries(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=60)
+    def test_validators_expire_with_pages(self):
+        # Another worker's change, whose version bump this worker's cache never saw.
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        Book.objects.filter(pk=self.book.pk).update(modified=timezone.now() + datetime.timedelta(seconds=1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        later = time.time() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_new_copy_bumps_book(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        modified = Book.objects.get(pk=self.book.pk).modified
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a', due_back=datetime.date.today())
+        self.assertGreater(Book.objects.get(pk=self.book.pk).modified, modified)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_book_change_bumps_author(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        etag = self.client.get(url)['ETag']
+        self.book.genre.add(Genre.objects.create(name='Science Fiction'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_book_changes_list_etag(self):
+        etag = self.client.get(reverse('books'))['ETag']
+        Book.objects.get(pk=self.book.pk).delete()
+        self.assertEqual(self.client.get(reverse('books'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_borrower_rename_changes_book_etag(self):
+        reader = User.objects.get(username='reader')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=reader,
+                                    due_back=datetime.date.today())
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        reader.username = 'renamed'
+        reader.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.login(username='reader', password='12345')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_changes_with_permissions(self):
+        url = reverse('books')
+        self.client.login(username='reader', password='12345')
+        etag = self.client.get(url)['ETag']
+        reader = User.objects.get(username='reader')
+        reader.user_permissions.add(Permission.objects.get(codename='staff_member_required'))
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, reverse('author-create'))
+
+    def test_missing_object(self):
+        resp = self.client.get(reverse('book-detail', args=[self.book.pk + 100]))
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,50 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from unittest import skipUnless
+
+from catalog.management.commands.explain_catalog import hot_path_querysets
+from catalog.models import Author, Book, BookInstance
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan assertions use SQLite EXPLAIN QUERY PLAN output')
+class HotPathIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrower = User.objects.create_user(username='reader', password='12345')
+        Author.objects.bulk_create(Author(first_name=f'First {num}', last_name=f'Last {num}') for num in range(50))
+        Book.objects.bulk_create(Book(title=f'Book {num}', summary='Summary', isbn='1234567890123')
+                                 for num in range(50))
+        book = Book.objects.first()
+        today = datetime.date.today()
+        BookInstance.objects.bulk_create(
+            BookInstance(book=book, imprint='Imprint', status='oamr'[num % 4], borrower=cls.borrower,
+                         due_back=today + datetime.timedelta(days=num % 30))
+            for num in range(400))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, description, index_name):
+        plan = hot_path_querysets(self.borrower)[description].explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_loans_by_due_date(self):
+        self.assertUsesIndex('loans by due date', 'bookinst_on_loan_due_idx')
+
+    def test_loans_of_a_borrower(self):
+        self.assertUsesIndex('loans of a borrower', 'bookinst_borrower_due_idx')
+
+    def test_available_copies(self):
+        self.assertUsesIndex('available copies', 'bookinst_status_due_idx')
+
+    def test_overdue_loans_by_borrower(self):
+        self.assertUsesIndex('overdue loans by borrower', 'bookinst_borrower_due_idx')
+
+    def test_books_by_title(self):
+        self.assertUsesIndex('books by title', 'book_title_id_idx')
+
+    def test_authors_by_name(self):
+        self.assertUsesIndex('authors by name', 'author_name_id_idx')
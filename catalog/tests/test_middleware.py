@@ -0,0 +1,52 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.snapshot import get_snapshot
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SLOW_MS=None)
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_snapshot()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='1234567890123', author=cls.author)
+        cls.book.genre.add(Genre.objects.create(name='Fantasy'))
+
+    def get_record(self, url, level='INFO'):
+        with self.assertLogs('catalog.metrics', level) as logs:
+            resp = self.client.get(url)
+        return resp, json.loads(logs.records[-1].getMessage())
+
+    def test_server_timing_header(self):
+        resp, record = self.get_record(reverse('book-detail', args=[self.book.pk]))
+        self.assertIn('Server-Timing', resp)
+        self.assertIn(f'desc="{record["queries"]} queries"', resp['Server-Timing'])
+        for metric in ('db;dur=', 'view;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(metric, resp['Server-Timing'])
+
+    def test_log_record(self):
+        _, record = self.get_record(reverse('book-detail', args=[self.book.pk]))
+        self.assertEqual(record['view'], 'book-detail')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 4)
+        self.assertEqual(record['duplicate_queries'], 0)
+        self.assertGreater(record['render_ms'], 0)
+
+    @override_settings(REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_request_logs_queries(self):
+        _, record = self.get_record(reverse('author-detail', args=[self.author.pk]), level='WARNING')
+        self.assertEqual(len(record['query_log']), record['queries'])
+        self.assertIn('catalog_author', record['query_log'][0]['sql'])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        resp = self.client.get(reverse('book-detail', args=[self.book.pk]))
+        self.assertNotIn('Server-Timing', resp)
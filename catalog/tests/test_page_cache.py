@@ -0,0 +1,125 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.checks import check_page_cache
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.page_cache import get_versions
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.genre = Genre.objects.create(name='Science Fiction')
+        cls.book = Book.objects.create(title='Dune', summary='Spice', isbn='1234567890123', author=cls.author)
+        cls.book.genre.add(cls.genre)
+        User.objects.create_user(username='reader', password='12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCached(self, url):
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            return self.client.get(url)
+
+    def test_anonymous_pages_served_from_cache(self):
+        for url in (reverse('books'), reverse('authors'), reverse('book-detail', args=[self.book.pk]),
+                    reverse('author-detail', args=[self.author.pk])):
+            with self.subTest(url=url):
+                resp = self.assertCached(url)
+                self.assertEqual(resp.status_code, 200)
+
+    def test_book_save_expires_pages(self):
+        self.assertCached(reverse('book-detail', args=[self.book.pk]))
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = 'Dune Messiah'
+        book.save()
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), 'Dune Messiah')
+        self.assertContains(self.client.get(reverse('books')), 'Dune Messiah')
+        self.assertContains(self.client.get(reverse('author-detail', args=[self.author.pk])), 'Dune Messiah')
+
+    def test_genre_change_expires_pages(self):
+        self.assertCached(reverse('book-detail', args=[self.book.pk]))
+        self.assertCached(reverse('author-detail', args=[self.author.pk]))
+        self.book.genre.add(Genre.objects.create(name='Poetry'))
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), 'Poetry')
+        self.assertContains(self.client.get(reverse('author-detail', args=[self.author.pk])), 'Poetry')
+        self.genre.name = 'Space Opera'
+        self.genre.save()
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), 'Space Opera')
+
+    def test_new_copy_expires_book_page(self):
+        self.assertCached(reverse('book-detail', args=[self.book.pk]))
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a',
+                                    due_back=datetime.date.today())
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), 'Available')
+
+    def test_author_rename_expires_pages(self):
+        self.assertCached(reverse('books'))
+        self.assertCached(reverse('book-detail', args=[self.book.pk]))
+        self.author.last_name = 'Asimov'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('books')), 'Asimov')
+        self.assertContains(self.client.get(reverse('authors')), 'Asimov')
+        self.assertContains(self.client.get(reverse('book-detail', args=[self.book.pk])), 'Asimov')
+
+    def test_moving_book_expires_previous_author(self):
+        self.assertCached(reverse('author-detail', args=[self.author.pk]))
+        self.book.author = Author.objects.create(first_name='Isaac', last_name='Asimov')
+        self.book.save()
+        self.assertNotContains(self.client.get(reverse('author-detail', args=[self.author.pk])), 'Dune')
+
+    def test_logged_in_user_uses_fragments(self):
+        self.client.login(username='reader', password='12345')
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        # Session, user and the sidebar permission checks; the book itself is not loaded.
+        with self.assertNumQueries(4):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Dune')
+        self.assertContains(resp, 'reader')
+
+    def test_login_keeps_borrowed_book_pages(self):
+        reader = User.objects.get(username='reader')
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=reader)
+        versions = get_versions(('book', self.book.pk))
+        # Just the UPDATE: no username lookup, no borrowed books query.
+        with self.assertNumQueries(1):
+            reader.save(update_fields=['last_login'])
+        self.client.login(username='reader', password='12345')
+        self.assertEqual(get_versions(('book', self.book.pk)), versions)
+        reader.first_name = 'Paul'
+        reader.save()
+        self.assertEqual(get_versions(('book', self.book.pk)), versions)
+        reader.username = 'muaddib'
+        reader.save()
+        self.assertNotEqual(get_versions(('book', self.book.pk)), versions)
+
+    def test_missing_book_is_404(self):
+        resp = self.client.get(reverse('book-detail', args=[self.book.pk + 100]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class PageCacheCheckTest(SimpleTestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    SHARED = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+
+    def ids(self):
+        return [warning.id for warning in check_page_cache(None)]
+
+    def test_per_process_cache_without_timeout(self):
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=4, CATALOG_PAGE_CACHE_TIMEOUT=None):
+            self.assertEqual(self.ids(), ['catalog.W003'])
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=4, CATALOG_PAGE_CACHE_TIMEOUT=60):
+            self.assertEqual(self.ids(), [])
+        with override_settings(CACHES=self.LOCMEM, WEB_CONCURRENCY=1, CATALOG_PAGE_CACHE_TIMEOUT=None):
+            self.assertEqual(self.ids(), [])
+
+    def test_shared_cache(self):
+        with override_settings(CACHES=self.SHARED, WEB_CONCURRENCY=4, CATALOG_PAGE_CACHE_TIMEOUT=None):
+            self.assertEqual(self.ids(), [])
@@ -0,0 +1,152 @@
+import datetime
+import re
+
+from django.contrib.auth.models import User
+from django.core.paginator import Page, Paginator
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.views import generic
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor, page_window
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(7):
+            Author.objects.create(first_name=f'First {num}', last_name='Same')
+        user = User.objects.create_user(username='reader', password='12345')
+        book = Book.objects.create(title='Book', summary='Summary', isbn='1234567890123')
+        for num in range(5):
+            due_back = None if num % 2 else datetime.date.today() + datetime.timedelta(days=num)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user, due_back=due_back)
+
+    def walk(self, paginator):
+        rows, page = [], paginator.page()
+        rows.extend(page.object_list)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            rows.extend(page.object_list)
+        return rows, page
+
+    def test_forward_walk_matches_ordering(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ('last_name', 'first_name', 'pk'))
+        rows, _ = self.walk(paginator)
+        self.assertEqual(rows, list(Author.objects.order_by('last_name', 'first_name', 'pk')))
+
+    def test_backward_walk(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ('last_name', 'first_name', 'pk'))
+        _, last_page = self.walk(paginator)
+        previous = paginator.page(last_page.previous_cursor)
+        self.assertEqual(len(previous), 3)
+        self.assertTrue(previous.has_next())
+        first = paginator.page(previous.previous_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertEqual(first.object_list, list(Author.objects.order_by('last_name', 'first_name', 'pk')[:3]))
+
+    def test_nullable_key_sorts_last(self):
+        paginator = CursorPaginator(BookInstance.objects.all(), 2, ('due_back', 'pk'))
+        rows, _ = self.walk(paginator)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([copy.due_back is None for copy in rows], [False, False, False, True, True])
+
+    def test_not_null_key_orders_plainly(self):
+        queryset = BookInstance.objects.filter(due_back__isnull=False)
+        paginator = CursorPaginator(queryset, 2, ('due_back', 'pk'), not_null=('due_back',))
+        self.assertNotIn('IS NULL', str(paginator.ordered().query))
+        rows, _ = self.walk(paginator)
+        self.assertEqual(rows, list(queryset.order_by('due_back', 'pk')))
+
+    def test_descending_keys(self):
+        paginator = CursorPaginator(BookInstance.objects.all(), 2, ('-due_back', 'pk'))
+        rows, last_page = self.walk(paginator)
+        dated = [copy.due_back for copy in rows if copy.due_back is not None]
+        self.assertEqual(dated, sorted(dated, reverse=True))
+        self.assertEqual([copy.due_back is None for copy in rows], [False, False, False, True, True])
+        previous = paginator.page(last_page.previous_cursor)
+        self.assertEqual(previous.object_list, rows[2:4])
+
+    def test_cursor_bound_to_ordering(self):
+        page = CursorPaginator(Author.objects.all(), 3, ('last_name', 'first_name', 'pk')).page()
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(Author.objects.all(), 3, ('-last_name', 'first_name', 'pk')).page(page.next_cursor)
+
+    def test_tampered_cursor_rejected(self):
+        paginator = CursorPaginator(Author.objects.all(), 3, ('last_name', 'first_name', 'pk'))
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-cursor')
+
+
+class PageWindowTest(TestCase):
+    def test_window_is_bounded(self):
+        paginator = Paginator(range(1000), 10)
+        self.assertEqual(page_window(paginator.page(1)), [1, 2, 3, None, 100])
+        self.assertEqual(page_window(paginator.page(50)), [1, None, 48, 49, 50, 51, 52, None, 100])
+        self.assertEqual(page_window(paginator.page(100)), [1, None, 98, 99, 100])
+
+    def test_single_page_gaps_are_shown(self):
+        paginator = Paginator(range(100), 10)
+        self.assertEqual(page_window(paginator.page(4)), [1, 2, 3, 4, 5, 6, None, 10])
+        self.assertEqual(page_window(Paginator(range(3), 10).page(1)), [1])
+
+
+class CursorPaginationViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(12):
+            Book.objects.create(title=f'Book {num:02}', summary='Summary', isbn='1234567890123')
+
+    def test_first_page_has_next_cursor(self):
+        resp = self.client.get(reverse('books'))
+        self.assertTrue(resp.context['is_paginated'])
+        self.assertTrue(resp.context['page_obj'].has_next())
+        self.assertEqual([book.title for book in resp.context['book_list']],
+                         ['Book 00', 'Book 01', 'Book 02', 'Book 03', 'Book 04'])
+
+    def test_legacy_page_url_redirects_to_cursor(self):
+        resp = self.client.get('/catalog/books/3')
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn('?cursor=', resp.url)
+        resp = self.client.get(resp.url)
+        self.assertEqual([book.title for book in resp.context['book_list']], ['Book 10', 'Book 11'])
+
+    def test_legacy_first_page_redirects_to_list(self):
+        resp = self.client.get('/catalog/books/1')
+        self.assertRedirects(resp, reverse('books'))
+
+    def test_legacy_page_out_of_range(self):
+        resp = self.client.get('/catalog/books/9')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_offset_pages_link_a_window(self):
+        for num in range(12, 100):
+            Book.objects.create(title=f'Book {num:02}', summary='Summary', isbn='1234567890123')
+        resp = self.client.get(reverse('books') + '?page=10')
+        self.assertEqual(resp.context['page_window'], [1, None, 8, 9, 10, 11, 12, None, 20])
+        self.assertContains(resp, '<a href="?page=12">12</a>', html=True)
+        self.assertNotContains(resp, '<a href="?page=13">13</a>', html=True)
+        href = re.search(r'href="([^"]*)">12</a>', resp.content.decode()).group(1)
+        resp = self.client.get(reverse('books') + href.replace('&amp;', '&'))
+        self.assertEqual([book.title for book in resp.context['book_list']],
+                         ['Book 55', 'Book 56', 'Book 57', 'Book 58', 'Book 59'])
+
+    def test_window_links_keep_other_parameters(self):
+        for num in range(12, 30):
+            Book.objects.create(title=f'Book {num:02}', summary='Summary', isbn='1234567890123')
+        resp = self.client.get(reverse('books') + '?sort=title&page=2')
+        self.assertContains(resp, 'href="?sort=title&amp;page=3"')
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('books') + '?cursor=bogus')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_views_opt_in(self):
+        class OffsetListView(CursorPaginationMixin, generic.ListView):
+            model = Book
+            ordering = ('title', 'pk')
+            paginate_by = 5
+
+        page = OffsetListView.as_view()(RequestFactory().get('/')).context_data['page_obj']
+        self.assertIsInstance(page, Page)
+        self.assertEqual(page.paginator.count, 12)
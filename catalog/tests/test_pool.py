@@ -0,0 +1,206 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import ignore_warnings
+
+from catalog.backends.pool import ConnectionPool, PoolTimeout, get_pool, pool_stats
+from catalog.checks import check_connection_pools
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        self.checked = []
+        self.pool = ConnectionPool(self.checked.append, max_size=2, timeout=0.05)
+
+    def test_released_connection_is_reused(self):
+        first = self.pool.acquire(FakeConnection)
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(FakeConnection), first)
+        stats = self.pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['size'], stats['in_use']), (1, 1, 1, 1))
+        # Released recently: no health check.
+        self.assertEqual(self.checked, [])
+
+    def test_waits_for_a_free_connection_up_to_timeout(self):
+        self.pool.acquire(FakeConnection)
+        second = self.pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire(FakeConnection)
+        threading.Timer(0.01, self.pool.release, [second]).start()
+        self.pool.timeout = 5
+        self.assertIs(self.pool.acquire(FakeConnection), second)
+        stats = self.pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waits'], stats['created']), (1, 2, 2))
+
+    def test_connections_past_max_lifetime_are_replaced(self):
+        first = self.pool.acquire(FakeConnection)
+        self.pool.max_lifetime = 0
+        self.pool.release(first)
+        self.assertTrue(first.closed)
+        self.assertIsNot(self.pool.acquire(FakeConnection), first)
+        self.assertEqual(self.pool.stats()['closed_lifetime'], 1)
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def test_idle_connections_are_closed(self):
+        first = self.pool.acquire(FakeConnection)
+        self.pool.release(first)
+        self.pool.max_idle = 0
+        self.assertIsNot(self.pool.acquire(FakeConnection), first)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['closed_idle'], 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        def check(connection):
+            raise OSError('server closed the connection')
+
+        self.pool.check = check
+        first = self.pool.acquire(FakeConnection)
+        self.pool.release(first, suspect=True)
+        second = self.pool.acquire(FakeConnection)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        stats = self.pool.stats()
+        self.assertEqual((stats['health_checks'], stats['closed_unhealthy'], stats['size']), (1, 1, 1))
+
+    def test_health_check_after_idle_period(self):
+        first = self.pool.acquire(FakeConnection)
+        self.pool.release(first)
+        self.pool.health_check_after = 0
+        self.assertIs(self.pool.acquire(FakeConnection), first)
+        self.assertEqual(self.checked, [first])
+
+    def test_broken_connection_is_not_pooled(self):
+        first = self.pool.acquire(FakeConnection)
+        self.pool.release(first, reusable=False)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.assertEqual(self.pool.stats()['closed_errors'], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        def connect():
+            raise OSError('connection refused')
+
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                self.pool.acquire(connect)
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.assertEqual(self.pool.stats()['connect_errors'], 3)
+
+    def test_close_all(self):
+        first = self.pool.acquire(FakeConnection)
+        second = self.pool.acquire(FakeConnection)
+        self.pool.release(first)
+        self.pool.close_all()
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def test_concurrent_use_never_exceeds_max_size(self):
+        self.pool.timeout = 5
+        peak, lock, in_use = [0], threading.Lock(), set()
+
+        def work():
+            for _ in range(20):
+                connection = self.pool.acquire(FakeConnection)
+                with lock:
+                    in_use.add(id(connection))
+                    peak[0] = max(peak[0], len(in_use))
+                time.sleep(0.0005)
+                with lock:
+                    in_use.discard(id(connection))
+                self.pool.release(connection)
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(peak[0], 2)
+        self.assertEqual(self.pool.stats()['created'], 2)
+        self.assertEqual(self.pool.stats()['reused'], 118)
+
+
+class PooledBackendTest(SimpleTestCase):
+    alias = 'pool-test'
+
+    def setUp(self):
+        # Django never closes in-memory SQLite connections; use a file.
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        settings_dict = dict(connections['default'].settings_dict, NAME=path, ENGINE='catalog.backends.sqlite3',
+                             CONN_MAX_AGE=0, POOL={'MAX_SIZE': 2})
+        connections.databases[self.alias] = settings_dict
+        self.addCleanup(self.remove_alias)
+
+    def remove_alias(self):
+        connections[self.alias].close()
+        connections[self.alias].pool.close_all()
+        del connections.databases[self.alias]
+        delattr(connections._connections, self.alias)
+
+    def query(self):
+        db = connections[self.alias]
+        with db.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+        raw = db.connection
+        db.close_if_unusable_or_obsolete()
+        self.assertIsNone(db.connection)
+        return raw
+
+    def test_connection_goes_back_to_pool_after_each_request(self):
+        first = self.query()
+        self.assertIs(self.query(), first)
+        stats = pool_stats()[self.alias]
+        self.assertEqual((stats['created'], stats['reused'], stats['idle']), (1, 1, 1))
+
+    def test_pool_is_per_process(self):
+        pool = connections[self.alias].pool
+        self.assertIs(get_pool(self.alias, {}, None), pool)
+        with mock.patch('catalog.backends.pool.os.getpid', return_value=-1):
+            self.assertIsNot(get_pool(self.alias, {}, None), pool)
+
+    def test_connection_with_errors_is_checked_before_reuse(self):
+        db = connections[self.alias]
+        db.ensure_connection()
+        db.errors_occurred = True
+        db.close()
+        self.query()
+        self.assertEqual(pool_stats()[self.alias]['health_checks'], 1)
+
+
+@ignore_warnings(message='Overriding setting DATABASES')
+class ConnectionPoolChecksTest(SimpleTestCase):
+    def databases_with(self, **pool):
+        return {'default': {'ENGINE': 'catalog.backends.sqlite3', 'CONN_MAX_AGE': 0, 'POOL': pool}}
+
+    def ids(self):
+        return [warning.id for warning in check_connection_pools(None)]
+
+    def test_pool_fits_the_connection_budget(self):
+        with override_settings(DATABASES=self.databases_with(MAX_SIZE=5), WEB_CONCURRENCY=4,
+                               DATABASE_MAX_CONNECTIONS=20):
+            self.assertEqual(self.ids(), [])
+        with override_settings(DATABASES=self.databases_with(MAX_SIZE=6), WEB_CONCURRENCY=4,
+                               DATABASE_MAX_CONNECTIONS=20):
+            self.assertEqual(self.ids(), ['catalog.W001'])
+
+    def test_persistent_connections_bypass_pool(self):
+        databases = self.databases_with(MAX_SIZE=2)
+        databases['default']['CONN_MAX_AGE'] = 60
+        with override_settings(DATABASES=databases):
+            self.assertEqual(self.ids(), ['catalog.W002'])
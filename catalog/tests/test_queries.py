@@ -0,0 +1,72 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.snapshot import get_snapshot
+
+
+class ViewQueryCountTest(TestCase):
+    # Query counts must not grow with the number of rows rendered; a template
+    # change that reintroduces an N+1 makes these tests fail.
+    def setUp(self):
+        cache.clear()
+        # Built once per process and catalog change, not per request.
+        get_snapshot()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='12345')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='staff_member_required'))
+        cls.reader = User.objects.create_user(username='reader', password='12345')
+        genres = [Genre.objects.create(name=f'Genre {num}') for num in range(3)]
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_num in range(6):
+            author = Author.objects.create(first_name=f'First {book_num}', last_name=f'Last {book_num}')
+            book = Book.objects.create(title=f'Book {book_num}', summary='Summary', isbn='1234567890123',
+                                       author=cls.author if book_num % 2 else author)
+            book.genre.set(genres)
+            for copy_num in range(4):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='o',
+                                            borrower=cls.reader if copy_num % 2 else cls.librarian,
+                                            due_back=datetime.date.today() + datetime.timedelta(days=copy_num))
+        cls.book = book
+
+    def test_book_list(self):
+        # ETag validators, then books; cursor pagination needs no COUNT, author names come from the snapshot.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('books'))
+
+    def test_book_list_offset_page(self):
+        # ETag validators, COUNT for the paginator, then books.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('books') + '?page=1')
+
+    def test_book_detail(self):
+        # ETag validators, book with author, its genre links, copies with borrowers; genre names from the snapshot.
+        with self.assertNumQueries(4):
+            self.client.get(reverse('book-detail', args=[self.book.pk]))
+
+    def test_author_list(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('authors'))
+
+    def test_author_detail(self):
+        # ETag validators, author, their book count, first window of books and its genre links.
+        with self.assertNumQueries(5):
+            self.client.get(reverse('author-detail', args=[self.author.pk]))
+
+    def test_all_borrowed(self):
+        self.client.login(username='librarian', password='12345')
+        # Session, user, permissions (user and group), copies joined with borrowers; titles from the snapshot.
+        with self.assertNumQueries(5):
+            self.client.get(reverse('all-borrowed'))
+
+    def test_my_borrowed(self):
+        self.client.login(username='reader', password='12345')
+        # Session, user, sidebar permissions (user and group), copies, reservations; titles from the snapshot.
+        with self.assertNumQueries(6):
+            self.client.get(reverse('my-borrowed'))
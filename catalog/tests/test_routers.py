@@ -0,0 +1,155 @@
+import os
+import tempfile
+from collections import Counter
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import circulation, routers
+from catalog.snapshot import get_snapshot, invalidate_snapshot
+from catalog.models import Author, Book, BookInstance, Genre, Reservation
+from catalog.routers import PIN_COOKIE, ReplicaRouter, routing
+
+REPLICAS = ('replica-a', 'replica-b')
+
+
+@override_settings(DATABASE_ROUTERS=['catalog.routers.ReplicaRouter'],
+                   CATALOG_READ_REPLICAS={'replica-a': 3, 'replica-b': 1})
+class ReplicaRouterTest(TestCase):
+    """Separate SQLite files stand in for replicas, each with its own rows so reads show where they went."""
+    databases = {'default', *REPLICAS}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.paths = []
+        for alias in REPLICAS:
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            cls.paths.append(path)
+            connections.databases[alias] = dict(connections['default'].settings_dict, NAME=path)
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Genre)
+                editor.create_model(Author)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias, path in zip(REPLICAS, cls.paths):
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+            os.remove(path)
+
+    @classmethod
+    def setUpTestData(cls):
+        Genre.objects.create(name='Primary genre')
+        for alias in REPLICAS:
+            Genre.objects.using(alias).create(name=f'{alias} genre')
+        cls.librarian = User.objects.create_user('librarian', password='secret')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='staff_member_required'))
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+
+    def genres(self):
+        return set(Genre.objects.values_list('name', flat=True))
+
+    def add_broken_replica(self):
+        connections.databases['replica-broken'] = dict(connections['default'].settings_dict,
+                                                       NAME='/nonexistent/replica.sqlite3')
+        self.addCleanup(connections.databases.pop, 'replica-broken')
+
+    def test_catalog_reads_go_to_a_replica(self):
+        with routing():
+            self.assertIn(self.genres(), [{'replica-a genre'}, {'replica-b genre'}])
+
+    def test_replicas_chosen_by_weight(self):
+        router = ReplicaRouter()
+        router.random.seed(0)
+        with routing():
+            counts = Counter(router.db_for_read(Genre) for _ in range(1000))
+        self.assertEqual(set(counts), set(REPLICAS))
+        self.assertTrue(700 < counts['replica-a'] < 800, counts)
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        with routing():
+            Genre.objects.create(name='New genre')
+            self.assertEqual(self.genres(), {'Primary genre', 'New genre'})
+        with routing():
+            self.assertNotIn('New genre', self.genres())
+
+    def test_pinned_reads_go_to_the_primary(self):
+        with routing(pinned=True):
+            self.assertEqual(self.genres(), {'Primary genre'})
+
+    def test_related_objects_come_from_the_instance_database(self):
+        with routing():
+            genre = Genre.objects.get()
+            self.assertEqual(ReplicaRouter().db_for_read(Author, instance=genre), genre._state.db)
+
+    def test_other_apps_read_from_the_primary(self):
+        with routing():
+            self.assertIsNone(ReplicaRouter().db_for_read(User))
+            self.assertTrue(User.objects.filter(username='librarian').exists())
+
+    def test_unhealthy_replicas_are_skipped(self):
+        self.add_broken_replica()
+        router = ReplicaRouter()
+        with routing(), self.settings(CATALOG_READ_REPLICAS={'replica-a': 1, 'replica-broken': 100}):
+            self.assertEqual({router.db_for_read(Genre) for _ in range(20)}, {'replica-a'})
+            self.assertEqual(routers._health['replica-broken'][0], False)
+
+    def test_primary_when_no_replica_is_healthy(self):
+        self.add_broken_replica()
+        with routing(), self.settings(CATALOG_READ_REPLICAS={'replica-broken': 1}):
+            self.assertEqual(ReplicaRouter().db_for_read(Genre), 'default')
+            self.assertEqual(self.genres(), {'Primary genre'})
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica-a', 'catalog'))
+        self.assertIsNone(router.allow_migrate('default', 'catalog'))
+
+    def test_page_cache_is_filled_from_the_primary(self):
+        Author.objects.create(first_name='Primary', last_name='Author')
+        Author.objects.using('replica-a').create(first_name='Lagging', last_name='Replica')
+        with self.settings(CATALOG_READ_REPLICAS={'replica-a': 1}):
+            for _ in range(2):
+                response = self.client.get(reverse('authors'))
+                self.assertContains(response, 'Primary')
+                self.assertNotContains(response, 'Lagging')
+
+    def test_snapshot_is_built_from_the_primary(self):
+        invalidate_snapshot()
+        with routing():
+            self.assertEqual(get_snapshot().genres.values, ('Primary genre',))
+
+    def test_allocation_reads_the_primary(self):
+        # The replicas have no copies or reservations at all.
+        book = Book.objects.create(title='Dune', summary='Spice', isbn='1234567890123')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        reservation = Reservation.objects.create(book=book, borrower=self.librarian)
+        with routing(), self.settings(CATALOG_READ_REPLICAS={'replica-a': 1}):
+            self.assertEqual(circulation.allocate(book.pk), [reservation.pk])
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'r')
+
+    def test_browser_reads_its_writes(self):
+        self.client.force_login(self.librarian)
+        names = lambda: {genre['name'] for genre in self.client.get(reverse('api-genres')).json()['results']}
+        with self.settings(CATALOG_READ_REPLICAS={'replica-a': 1}):
+            self.assertEqual(names(), {'replica-a genre'})
+            self.assertNotIn(PIN_COOKIE, self.client.cookies)
+
+            resp = self.client.post(reverse('author-create'), {'first_name': 'Jane', 'last_name': 'Doe'})
+            self.assertEqual(resp.status_code, 302)
+            self.assertTrue(Author.objects.using('default').filter(last_name='Doe').exists())
+            self.assertEqual(resp.cookies[PIN_COOKIE]['max-age'], 15)
+            self.assertEqual(names(), {'Primary genre'})
+
+            del self.client.cookies[PIN_COOKIE]
+            self.assertEqual(names(), {'replica-a genre'})
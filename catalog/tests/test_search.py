@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.search import SEARCH_BACKENDS, BaseSearchBackend, search_books
+
+
+class BookSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.genre = Genre.objects.create(name='Science Fiction')
+        cls.dune = Book.objects.create(title='Dune', summary='Spice and sandworms on Arrakis', isbn='1234567890123',
+                                       author=cls.author)
+        cls.dune.genre.add(cls.genre)
+        cls.other = Book.objects.create(title='Children of Dune', summary='A sequel', isbn='1234567890124')
+        Book.objects.create(title='Мастер и Маргарита', summary='Роман', isbn='1234567890125')
+        for num in range(4):
+            Book.objects.create(title=f'Filler {num}', summary='Nothing to see', isbn='1234567890126')
+
+    def titles(self, query):
+        return [book.title for book in search_books(query)[:10]]
+
+    def test_title_match_ranked_above_summary_match(self):
+        Book.objects.create(title='Sand', summary='Fans of dune like it', isbn='1234567890127')
+        Book.objects.create(title='Dune Messiah', summary='Emperor of the known', isbn='1234567890128')
+        titles = self.titles('dune')
+        self.assertLess(titles.index('Dune Messiah'), titles.index('Sand'))
+
+    def test_prefix_and_unicode(self):
+        self.assertEqual(self.titles('марг'), ['Мастер и Маргарита'])
+
+    def test_summary_match(self):
+        self.assertEqual(self.titles('sandworms'), ['Dune'])
+
+    def test_author_rename_reindexes_books(self):
+        self.author.last_name = 'Zweig'
+        self.author.save()
+        self.assertEqual(self.titles('zweig'), ['Dune'])
+        self.assertEqual(self.titles('herbert'), [])
+
+    def test_genre_changes_reindex_books(self):
+        self.assertEqual(self.titles('science'), ['Dune'])
+        Book.objects.get(pk=self.other.pk).genre.add(self.genre)
+        self.assertEqual(len(self.titles('science')), 2)
+        self.genre.delete()
+        self.assertEqual(self.titles('science'), [])
+
+    def test_deleted_book_unindexed(self):
+        Book.objects.get(pk=self.other.pk).delete()
+        self.assertEqual(self.titles('children'), [])
+
+    def test_count_and_empty_query(self):
+        self.assertEqual(search_books('dune').count(), 2)
+        self.assertEqual(search_books('  "*').count(), 0)
+
+    def test_search_view(self):
+        resp = self.client.get(reverse('search'), {'q': 'dune'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'search_results.html')
+        self.assertEqual({book.title for book in resp.context['book_list']}, {'Dune', 'Children of Dune'})
+
+
+@mock.patch.dict(SEARCH_BACKENDS, clear=True)
+class BaseSearchBackendTest(TestCase):
+    """Vendors without a full-text backend (e.g. MySQL) search with icontains."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        genre = Genre.objects.create(name='Science Fiction')
+        dune = Book.objects.create(title='Dune', summary='Spice and sandworms', isbn='1', author=author)
+        dune.genre.add(genre)
+        Book.objects.create(title='Sand', summary='Fans of dune like it', isbn='2')
+        Book.objects.create(title='Children of Dune', summary='A sequel', isbn='3', author=author)
+
+    def titles(self, query):
+        return [book.title for book in search_books(query)[:10]]
+
+    def test_base_backend_is_used(self):
+        self.assertIs(type(search_books('dune').backend), BaseSearchBackend)
+
+    def test_title_matches_ranked_first(self):
+        self.assertEqual(self.titles('dune'), ['Children of Dune', 'Dune', 'Sand'])
+        self.assertEqual(search_books('dune').count(), 3)
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.titles('herbert science'), ['Dune'])
+        self.assertEqual(self.titles('sandworm'), ['Dune'])
+        self.assertEqual(self.titles('herbert nothing'), [])
+
+    def test_search_view(self):
+        resp = self.client.get(reverse('search'), {'q': 'herbert'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Found 2 books')
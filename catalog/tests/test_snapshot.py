@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import snapshot
+from catalog.models import Author, Book, BookInstance, CacheVersion, Genre
+from catalog.snapshot import SNAPSHOT_VERSION_KEY, SNAPSHOT_VERSION_NAME, get_snapshot
+
+
+class CatalogSnapshotTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Poetry')]
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.book = Book.objects.create(title='Earthsea', summary='-', isbn='1', author=cls.author)
+        cls.book.genre.set(cls.genres)
+        cls.orphan = Book.objects.create(title='Anonymous', summary='-', isbn='2')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookups(self):
+        current = get_snapshot()
+        self.assertEqual(current.author_name(self.author.pk), 'Le Guin Ursula')
+        self.assertEqual(current.genre_name(self.genres[0].pk), 'Fantasy')
+        self.assertEqual(current.title(self.book.pk), 'Earthsea')
+        with self.assertNumQueries(1):
+            names = current.book_genre_names([self.book.pk, self.orphan.pk])
+        self.assertEqual(names, {self.book.pk: ['Fantasy', 'Poetry']})
+        self.assertEqual((current.genre_name(0), current.author_name(None), current.title(0)), ('', '', ''))
+        self.assertEqual(self.book.display_genre(), 'Fantasy, Poetry')
+
+    def test_reused_until_invalidated(self):
+        current = get_snapshot()
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), current)
+        self.author.last_name = 'LeGuin'
+        self.author.save()
+        self.assertEqual(get_snapshot().author_name(self.author.pk), 'LeGuin Ursula')
+
+    def test_genre_changes_invalidate(self):
+        current = get_snapshot()
+        self.book.genre.remove(self.genres[1])
+        # Genre links are read from the database; the snapshot only holds the names.
+        self.assertIs(get_snapshot(), current)
+        self.assertEqual(current.book_genre_names([self.book.pk]), {self.book.pk: ['Fantasy']})
+        self.genres[0].name = 'Fantasy & SF'
+        self.genres[0].save()
+        self.assertEqual(get_snapshot().book_genre_names([self.book.pk]), {self.book.pk: ['Fantasy & SF']})
+
+    def test_book_changes_invalidate(self):
+        get_snapshot()
+        self.book.title = 'A Wizard of Earthsea'
+        self.book.save()
+        self.assertEqual(get_snapshot().title(self.book.pk), 'A Wizard of Earthsea')
+        tehanu = Book.objects.create(title='Tehanu', summary='-', isbn='3', author=self.author)
+        self.assertEqual(get_snapshot().title(tehanu.pk), 'Tehanu')
+        tehanu.delete()
+        self.assertEqual(get_snapshot().title(tehanu.pk), '')
+
+    def test_loans_dont_invalidate(self):
+        current = get_snapshot()
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.assertIs(get_snapshot(), current)
+
+    def test_other_worker_invalidation(self):
+        current = get_snapshot()
+        # As another worker's invalidate_snapshot() would, through the shared cache.
+        Author.objects.filter(pk=self.author.pk).update(last_name='LeGuin')
+        cache.set(SNAPSHOT_VERSION_KEY, 'other worker')
+        rebuilt = get_snapshot()
+        self.assertIsNot(rebuilt, current)
+        self.assertEqual(rebuilt.author_name(self.author.pk), 'LeGuin Ursula')
+
+    def test_records_are_compact(self):
+        current = get_snapshot()
+        self.assertFalse(hasattr(current, '__dict__'))
+        self.assertEqual(current.authors.ids.typecode, 'q')
+
+    def test_lists_render_names_from_snapshot(self):
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, 'Earthsea</a> (Le Guin Ursula)')
+        self.assertNotContains(response, 'None')
+
+
+@override_settings(WEB_CONCURRENCY=4, CATALOG_SNAPSHOT_CHECK_INTERVAL=60)
+class DatabaseVersionedSnapshotTest(TestCase):
+    """With a per-process cache and several workers, the version is kept in the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.book = Book.objects.create(title='Earthsea', summary='-', isbn='1', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        snapshot._snapshot = snapshot._checked = None
+
+    def test_local_changes_are_seen_at_once(self):
+        get_snapshot()
+        version = CacheVersion.objects.get(name=SNAPSHOT_VERSION_NAME).version
+        self.author.last_name = 'LeGuin'
+        self.author.save()
+        self.assertEqual(CacheVersion.objects.get(name=SNAPSHOT_VERSION_NAME).version, version + 1)
+        self.assertEqual(get_snapshot().author_name(self.author.pk), 'LeGuin Ursula')
+
+    def test_other_worker_invalidation(self):
+        current = get_snapshot()
+        # As another worker's invalidate_snapshot() would, through the database.
+        Author.objects.filter(pk=self.author.pk).update(last_name='LeGuin')
+        CacheVersion.objects.filter(name=SNAPSHOT_VERSION_NAME).update(version=F('version') + 1)
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), current)
+        with override_settings(CATALOG_SNAPSHOT_CHECK_INTERVAL=0):
+            self.assertEqual(get_snapshot().author_name(self.author.pk), 'LeGuin Ursula')
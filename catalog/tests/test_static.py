@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog.storage import minify_css
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class MinifyCssTest(TestCase):
+    def test_minify(self):
+        css = '/*! Licence */\n/* note */\na:hover ,\n.b > p {\n    color : #fff;\n    margin: 0 auto;\n}\n'
+        self.assertEqual(minify_css(css), '/*! Licence */\na:hover,.b>p{color:#fff;margin:0 auto}')
+
+
+class StaticPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            STATIC_ROOT=cls.static_root, STATICFILES_STORAGE='catalog.storage.BundledManifestStaticFilesStorage')
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root)
+        super().tearDownClass()
+
+    def collected(self, name):
+        with open(os.path.join(self.static_root, name), 'rb') as f:
+            return f.read()
+
+    def test_bundle_is_hashed_minified_and_precompressed(self):
+        paths = json.loads(self.collected('staticfiles.json'))['paths']
+        bundle = paths['css/catalog.min.css']
+        self.assertRegex(bundle, r'^css/catalog\.min\.[0-9a-f]{12}\.css$')
+        self.assertRegex(paths['favicon.ico'], r'^favicon\.[0-9a-f]{12}\.ico$')
+        css = self.collected(bundle).decode()
+        self.assertIn('.btn-secondary{', css)
+        self.assertIn('.sidebar-nav{', css)
+        self.assertNotIn('\n    ', css)
+        self.assertEqual(gzip.decompress(self.collected(bundle + '.gz')).decode(), css)
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_variants(self):
+        bundle = staticfiles_storage.stored_name('css/catalog.min.css')
+        self.assertEqual(brotli.decompress(self.collected(bundle + '.br')), self.collected(bundle))
+
+    def test_pages_use_local_hashed_assets(self):
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertNotIn('https://', content)
+        self.assertNotIn('<script src=', content)
+        self.assertEqual(content.count('rel="stylesheet"'), 1)
+        self.assertIn(staticfiles_storage.url('css/catalog.min.css'), content)
+        self.assertIn(staticfiles_storage.url('favicon.ico'), content)
+
+    @override_settings(DEBUG=True)
+    def test_sources_linked_one_by_one_while_debugging(self):
+        content = self.client.get(reverse('index')).content.decode()
+        self.assertIn('href="/static/css/vendor/bootstrap-subset.css"', content)
+        self.assertIn('href="/static/css/styles.css"', content)
+
+    def test_hashed_files_are_served_immutable_and_compressed(self):
+        response = self.client.get(staticfiles_storage.url('css/catalog.min.css'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'max-age=315360000, public, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response.close()
+        response = self.client.get('/static/css/catalog.min.css')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.stats import compute_library_stats, get_library_stats
+
+
+class LibraryStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        Genre.objects.create(name='Fantasy')
+        book = Book.objects.create(title='Хроники дюны', summary='Desert planet', isbn='1234567890123', author=author)
+        Book.objects.create(title='Other', summary='Other book', isbn='1234567890124', author=author)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_computed_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_library_stats()
+        self.assertEqual(stats, {
+            'num_books': 2,
+            'num_books_with_dun': 1,
+            'num_instances': 2,
+            'num_instances_available': 1,
+            'num_authors': 1,
+            'num_genres': 1,
+        })
+
+    def test_counters_on_empty_catalog(self):
+        BookInstance.objects.all().delete()
+        Book.objects.all().delete()
+        stats = compute_library_stats()
+        self.assertEqual(stats['num_books'], 0)
+        self.assertEqual(stats['num_authors'], 1)
+
+    def test_copies_of_deleted_books_still_counted(self):
+        Book.objects.get(title='Хроники дюны').delete()
+        with self.assertNumQueries(1):
+            stats = compute_library_stats()
+        self.assertEqual((stats['num_books'], stats['num_instances'], stats['num_instances_available']), (1, 2, 1))
+
+    def test_stats_are_cached(self):
+        get_library_stats()
+        with self.assertNumQueries(0):
+            get_library_stats()
+
+    def test_save_invalidates_cache(self):
+        get_library_stats()
+        Genre.objects.create(name='Poetry')
+        self.assertEqual(get_library_stats()['num_genres'], 2)
+
+    def test_delete_invalidates_cache(self):
+        get_library_stats()
+        BookInstance.objects.filter(status='a').first().delete()
+        self.assertEqual(get_library_stats()['num_instances_available'], 0)
+
+    def test_index_page_uses_cached_stats(self):
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('index'))
+        self.assertEqual(resp.context['num_books'], 2)
+        self.assertEqual(resp.context['num_books_with_dun'], 1)
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from catalog.templating import precompile_templates, template_names
+
+CACHED_TEMPLATES = [dict(settings.TEMPLATES[0], OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'], loaders=[
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]))]
+
+
+class TemplateNamesTest(SimpleTestCase):
+    def test_project_templates_only(self):
+        names = template_names(engines['django'].engine)
+        self.assertIn('book_detail.html', names)
+        self.assertIn('registration/login.html', names)
+        self.assertIn('admin/catalog/bookinstance/check_out.html', names)
+        self.assertNotIn('admin/base.html', names)
+
+
+@override_settings(TEMPLATES=CACHED_TEMPLATES)
+class PrecompileTemplatesTest(SimpleTestCase):
+    def test_templates_are_parsed_into_the_cached_loader(self):
+        engine = engines['django'].engine
+        loader = engine.template_loaders[0]
+        self.assertEqual(loader.get_template_cache, {})
+        self.assertEqual(precompile_templates(), len(template_names(engine)))
+        self.assertIn('book_detail.html', loader.get_template_cache)
+        self.assertIs(engine.get_template('book_detail.html'), loader.get_template_cache['book_detail.html'])
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 
 from django.urls import reverse
@@ -12,6 +13,9 @@ class AuthorListViewTest(TestCase):
         for author_num in range(number_of_authors):
             Author.objects.create(first_name=f'Big {author_num}', last_name=f'Bob {author_num}')
 
+    def setUp(self):
+        cache.clear()
+
     def test_view_url_exists_at_desired_location(self):
         resp = self.client.get('/catalog/authors/')
         self.assertEqual(resp.status_code, 200)
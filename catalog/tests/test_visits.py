@@ -0,0 +1,66 @@
+import datetime
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import visits
+from catalog.benchmark import count_writes
+from catalog.models import VisitCount
+
+
+@override_settings(CATALOG_VISITS_FLUSH_INTERVAL=None)
+class HomepageVisitsTest(TestCase):
+    def setUp(self):
+        self.buffer = visits.VisitBuffer()
+        patcher = mock.patch.object(visits, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_homepage_writes_nothing(self):
+        self.client.get(reverse('index'))
+        resp, writes = count_writes(self.client.get, reverse('index'))
+        self.assertEqual(writes, 0)
+        self.assertNotIn('sessionid', resp.cookies)
+        self.assertEqual(resp.context['num_visits'], 1)
+        self.assertEqual(self.buffer.pending, {('index', datetime.date.today()): 2})
+
+    def test_visits_counted_per_browser(self):
+        for num in range(3):
+            self.assertEqual(self.client.get(reverse('index')).context['num_visits'], num)
+        self.client.cookies[visits.VISITS_COOKIE] = '41'
+        self.assertEqual(self.client.get(reverse('index')).context['num_visits'], 0)
+
+    def test_flush_writes_one_row_per_page_and_day(self):
+        for _ in range(3):
+            self.buffer.record('index')
+        self.buffer.record('books')
+        _, writes = count_writes(self.buffer.flush)
+        self.assertEqual(writes, 4)  # An UPDATE and, for new rows, an INSERT.
+        self.buffer.record('index', 2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(dict(VisitCount.objects.values_list('page', 'count')), {'index': 5, 'books': 1})
+
+    def test_failed_flush_keeps_visits(self):
+        self.buffer.record('index')
+        with mock.patch.object(visits, 'write_counts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.buffer.record('index')
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(VisitCount.objects.get().count, 2)
+
+    @override_settings(CATALOG_VISITS_FLUSH_INTERVAL=0.01)
+    def test_background_flush(self):
+        # The flusher's connection can't see this test's transaction; check the batch it takes instead.
+        with mock.patch.object(visits, 'write_counts') as write_counts:
+            self.buffer.record('index')
+            self.addCleanup(self.buffer.stop_flusher)
+            for _ in range(200):
+                if write_counts.called:
+                    break
+                time.sleep(0.01)
+        write_counts.assert_called_with({('index', datetime.date.today()): 1})
+
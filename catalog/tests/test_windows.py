@@ -0,0 +1,143 @@
+import datetime
+import re
+import tracemalloc
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre
+from catalog.pagination import chunked_queryset, iterate_queryset
+
+MORE_RE = re.compile(r'data-more="([^"]+)"')
+
+
+def add_copies(book, count):
+    today = datetime.date.today()
+    BookInstance.objects.bulk_create(
+        BookInstance(book=book, imprint='Imprint', status='o' if num % 2 else 'a',
+                     due_back=today + datetime.timedelta(days=num % 50) if num % 2 else None)
+        for num in range(count))
+
+
+class DetailWindowTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        genre = Genre.objects.create(name='Fantasy')
+        cls.books = []
+        for num in range(25):
+            book = Book.objects.create(title=f'Earthsea {num:02}', summary='-', isbn='1', author=cls.author)
+            book.genre.add(genre)
+            cls.books.append(book)
+        add_copies(cls.books[0], 45)
+
+    def setUp(self):
+        cache.clear()
+
+    def follow_more(self, content):
+        # What the "more" links load, segment after segment.
+        segments = []
+        match = MORE_RE.search(content)
+        while match:
+            segment = self.client.get(match.group(1).replace('&amp;', '&')).content.decode()
+            segments.append(segment)
+            match = MORE_RE.search(segment)
+        return segments
+
+    def test_book_detail_shows_a_window_of_copies(self):
+        content = self.client.get(reverse('book-detail', args=[self.books[0].pk])).content.decode()
+        self.assertEqual(content.count('<strong>Id:</strong>'), 20)
+        segments = self.follow_more(content)
+        self.assertEqual([segment.count('<strong>Id:</strong>') for segment in segments], [20, 5])
+        ids = re.findall(r'<strong>Id:</strong> ([-\w]+)', content + ''.join(segments))
+        self.assertEqual(sorted(ids), sorted(str(pk) for pk in BookInstance.objects.values_list('pk', flat=True)))
+        self.assertNotIn('<html', segments[0])
+
+    def test_author_detail_shows_count_and_a_window_of_books(self):
+        content = self.client.get(reverse('author-detail', args=[self.author.pk])).content.decode()
+        self.assertIn('Books (25)', content)
+        self.assertEqual(content.count('<h5>'), 10)
+        self.assertIn('Fantasy', content)
+        segments = self.follow_more(content)
+        self.assertEqual([segment.count('<h5>') for segment in segments], [10, 5])
+        self.assertIn('Earthsea 24', segments[-1])
+
+    def test_segment_page_without_javascript(self):
+        response = self.client.get(reverse('book-copies', args=[self.books[0].pk]))
+        self.assertContains(response, '<html')
+        self.assertContains(response, '<strong>Id:</strong>', count=20)
+        self.assertContains(response, 'More copies')
+
+    def test_segment_errors(self):
+        self.assertEqual(self.client.get(reverse('book-copies', args=[self.books[0].pk]) + '?cursor=x').status_code,
+                         404)
+        self.assertEqual(self.client.get(reverse('author-books', args=[9999])).status_code, 404)
+        # A book without copies has an empty list, not a 404.
+        self.assertEqual(self.client.get(reverse('book-copies', args=[self.books[1].pk])).status_code, 200)
+
+
+class ChunkedQuerysetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Dune', summary='-', isbn='1')
+        add_copies(cls.book, 25)
+
+    def test_chunks_cover_every_row_once(self):
+        chunks = list(chunked_queryset(BookInstance.objects.all(), 10, ordering=('due_back', 'pk')))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        copies = [copy for chunk in chunks for copy in chunk]
+        self.assertEqual(len({copy.pk for copy in copies}), 25)
+        # NULL due dates sort last.
+        self.assertEqual([copy.due_back is None for copy in copies], [False] * 12 + [True] * 13)
+
+    def test_values_rows(self):
+        rows = list(iterate_queryset(BookInstance.objects.values('id', 'status'), 7))
+        self.assertEqual([row['id'] for row in rows], sorted(BookInstance.objects.values_list('pk', flat=True)))
+
+    def test_one_query_per_chunk(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(len(list(iterate_queryset(BookInstance.objects.all(), 10))), 25)
+
+
+class MemoryBoundTest(TestCase):
+    """Peak memory of a detail page, or of a scan, doesn't grow with the number of related rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Frank', last_name='Herbert')
+        cls.small = Book.objects.create(title='Small', summary='-', isbn='1', author=author)
+        cls.large = Book.objects.create(title='Large', summary='-', isbn='2', author=author)
+        add_copies(cls.small, 100)
+        add_copies(cls.large, 2000)
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def peak(func):
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def render(self, book):
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('book-detail', args=[book.pk])).status_code, 200)
+
+    def test_book_detail(self):
+        # Warm up imports, template loading and the snapshot first.
+        self.render(self.small)
+        small, large = self.peak(lambda: self.render(self.small)), self.peak(lambda: self.render(self.large))
+        self.assertLess(large, small * 1.5, (small, large))
+
+    def test_chunked_scan(self):
+        def scan(rows):
+            for copy in rows:
+                copy.status
+
+        everything = self.peak(lambda: scan(list(BookInstance.objects.all())))
+        chunked = self.peak(lambda: scan(iterate_queryset(BookInstance.objects.all(), 100)))
+        self.assertLess(chunked, everything / 5, (chunked, everything))
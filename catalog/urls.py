@@ -1,6 +1,6 @@
 # from django.urls import path
 from django.conf.urls import url
-from . import views
+from . import api, views
 
 urlpatterns = [
     url(r'^$', views.MainPage.as_view(), name='index'),
@@ -10,9 +10,24 @@ urlpatterns = [
     url(r'^authors/(?P<page>\d+)$', views.AuthorListView.as_view(), name='authors'),
     url(r'^book/(?P<pk>\d+)$', views.BookDetailView.as_view(), name='book-detail'),
     url(r'^author/(?P<pk>\d+)$', views.AuthorDetailView.as_view(), name='author-detail'),
+    url(r'^book/(?P<pk>\d+)/copies/$', views.BookCopiesView.as_view(), name='book-copies'),
+    url(r'^author/(?P<pk>\d+)/books/$', views.AuthorBooksView.as_view(), name='author-books'),
+    url(r'^api/books/$', views.ApiListView.as_view(resource=api.BOOKS), name='api-books'),
+    url(r'^api/books/(?P<pk>\d+)$', views.ApiDetailView.as_view(resource=api.BOOKS), name='api-book'),
+    url(r'^api/authors/$', views.ApiListView.as_view(resource=api.AUTHORS), name='api-authors'),
+    url(r'^api/authors/(?P<pk>\d+)$', views.ApiDetailView.as_view(resource=api.AUTHORS), name='api-author'),
+    url(r'^api/genres/$', views.ApiListView.as_view(resource=api.GENRES), name='api-genres'),
+    url(r'^api/genres/(?P<pk>\d+)$', views.ApiDetailView.as_view(resource=api.GENRES), name='api-genre'),
+    url(r'^api/copies/$', views.ApiListView.as_view(resource=api.COPIES), name='api-copies'),
+    url(r'^api/copies/(?P<pk>[-\w]+)$', views.ApiDetailView.as_view(resource=api.COPIES), name='api-copy'),
+    url(r'^export/$', views.CatalogExportView.as_view(), name='export'),
+    url(r'^search/$', views.BookSearchView.as_view(), name='search'),
     url(r'^mybooks/$', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
+    url(r'^mybooks/(?P<page>\d+)$', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
     url(r'^allborrowedbooks/$', views.LoanedBooksListView.as_view(), name='all-borrowed'),
+    url(r'^allborrowedbooks/(?P<page>\d+)$', views.LoanedBooksListView.as_view(), name='all-borrowed'),
     url(r'^book/(?P<pk>[-\w]+)/renew/$', views.RenewBookLibrarian.as_view(), name='renew-book-librarian'),
+    url(r'^circulation/$', views.BulkCirculationView.as_view(), name='bulk-circulation'),
     url(r'^author/create/$', views.AuthorCreate.as_view(), name='author-create'),
     url(r'^author/(?P<pk>\d+)/update/$', views.AuthorUpdate.as_view(), name='author-update'),
     url(r'^author/(?P<pk>\d+)/delete/$', views.AuthorDelete.as_view(), name='author-delete'),
@@ -2,13 +2,22 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.decorators import permission_required
-from django.http import HttpResponseRedirect
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse_lazy, reverse
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 import datetime
 
-from .models import Author, Book, BookInstance, Genre
-from .forms import RenewBookForm, RenewBookModelForm, MyForm
+from . import api, circulation, export
+from .models import Author, Book, BookInstance, ConcurrentUpdateError, Reservation
+from .forms import STALE_OBJECT_MESSAGE, BulkCirculationForm, RenewBookForm, RenewBookModelForm, MyForm
+from .conditional import ConditionalGetMixin, author_list_validators, book_list_validators, object_validators
+from .page_cache import AnonymousPageCacheMixin, LazyFragmentDetailMixin
+from .pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+from .search import search_books
+from .snapshot import LOAN_STATUS_LABELS, RESERVATION_STATUS_LABELS, get_snapshot
+from .stats import get_library_stats
+from .visits import record_visit, set_visits_cookie, visits_so_far
 
 
 # Create your views here.
@@ -17,17 +26,17 @@ class MainPage(generic.TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['num_books'] = Book.objects.all().count()
-        context['num_instances'] = BookInstance.objects.all().count()
-        context['num_instances_available'] = BookInstance.objects.filter(status__exact='a').count()
-        context['num_authors'] = Author.objects.all().count()
-        context['num_genres'] = Genre.objects.all().count()
-        context['num_books_with_dun'] = Book.objects.filter(title__icontains="дюн").count()
-        num_visits = self.request.session.get('num_visits', 0)
-        context['num_visits'] = num_visits
-        self.request.session['num_visits'] = num_visits + 1
+        context.update(get_library_stats())
+        context['num_visits'] = visits_so_far(self.request)
         return context
 
+    def get(self, request, *args, **kwargs):
+        # Counted in memory and in a cookie: viewing the homepage writes nothing.
+        response = super().get(request, *args, **kwargs)
+        set_visits_cookie(response, visits_so_far(request) + 1)
+        record_visit('index')
+        return response
+
 
 # def index(request):
 #     num_books = Book.objects.all().count()
@@ -47,51 +56,327 @@ class MainPage(generic.TemplateView):
 #     )
 
 
-class BookListView(generic.ListView):
+class BookListView(ConditionalGetMixin, AnonymousPageCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Book
     paginate_by = 5
     context_object_name = 'book_list'
     template_name = 'book_list.html'
-    # queryset = Book.objects.all()
+    cursor_pagination = True
+    cursor_ordering = ('title', 'pk')
+    sort_orderings = {'available': ('-copies_available', 'title', 'pk')}
+    # Author names come from the catalog snapshot rather than a join.
+    queryset = Book.objects.only('title', 'author', 'copies_total', 'copies_available')
+
+    def get_cursor_ordering(self):
+        return self.sort_orderings.get(self.request.GET.get('sort'), self.cursor_ordering)
+
+    def get_ordering(self):
+        return self.get_cursor_ordering()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['sort'] = self.request.GET.get('sort') if self.request.GET.get('sort') in self.sort_orderings else ''
+        snapshot = get_snapshot()
+        for book in context['book_list']:
+            book.author_name = snapshot.author_name(book.author_id)
+        return context
+
+    def get_page_versions(self):
+        return ['book-list']
+
+    def get_validators(self):
+        return book_list_validators()
 
     # def get_context_data(self, *, object_list=None, **kwargs):
     #     context = super(BookListView, self).get_context_data(**kwargs)
     #     return context
 
 
-class BookDetailView(generic.DetailView):
+# Related lists of the detail pages are shown a window at a time; "more" links
+# load the following segments (RelatedSegmentView).
+COPIES_ORDERING = ('due_back', 'pk')
+BOOKS_ORDERING = ('title', 'pk')
+
+
+def copies_of(book_id):
+    return BookInstance.objects.filter(book_id=book_id).with_overdue().select_related('borrower').only(
+        'book', 'status', 'due_back', 'borrower', 'borrower__username')
+
+
+def books_by(author_id):
+    return Book.objects.filter(author_id=author_id).only('title', 'summary', 'author')
+
+
+def related_window(queryset, size, ordering, cursor=None):
+    return CursorPaginator(queryset, size, ordering).page(cursor)
+
+
+def label_copies(copies):
+    for copy in copies:
+        copy.status_label = LOAN_STATUS_LABELS.get(copy.status, copy.status)
+
+
+def add_genre_names(books):
+    names = get_snapshot().book_genre_names([book.pk for book in books])
+    for book in books:
+        book.genre_names = names.get(book.pk, [])
+
+
+class BookDetailView(ConditionalGetMixin, AnonymousPageCacheMixin, LazyFragmentDetailMixin, generic.DetailView):
     model = Book
     template_name = 'book_detail.html'
+    context_object_name = 'book'
+    # Overdue copies are highlighted relative to today.
+    cache_vary_on_date = True
+    queryset = Book.objects.select_related('author')
+    copies_window = 20
+
+    def get_object(self, queryset=None):
+        book = super().get_object(queryset)
+        # Counts come from the book's counters; genre names from the catalog snapshot.
+        add_genre_names([book])
+        book.copies = related_window(copies_of(book.pk), self.copies_window, COPIES_ORDERING)
+        label_copies(book.copies)
+        return book
+
+    def get_page_versions(self):
+        return [('book', self.kwargs['pk'])]
 
+    def get_validators(self):
+        return object_validators(Book, self.kwargs['pk'])
 
-class AuthorListView(generic.ListView):
+
+class AuthorListView(ConditionalGetMixin, AnonymousPageCacheMixin, CursorPaginationMixin, generic.ListView):
     model = Author
     paginate_by = 5
     template_name = 'author_list.html'
     context_object_name = 'author_list'
+    cursor_pagination = True
+    cursor_ordering = ('last_name', 'first_name', 'pk')
     # queryset = Author.objects.all()
 
+    def get_page_versions(self):
+        return ['author-list']
+
+    def get_validators(self):
+        return author_list_validators()
 
-class AuthorDetailView(generic.DetailView):
+
+class AuthorDetailView(ConditionalGetMixin, AnonymousPageCacheMixin, LazyFragmentDetailMixin, generic.DetailView):
     model = Author
     template_name = 'author_detail.html'
+    context_object_name = 'author'
+    books_window = 10
+
+    def get_object(self, queryset=None):
+        author = super().get_object(queryset)
+        author.book_count = books_by(author.pk).count()
+        author.books = related_window(books_by(author.pk), self.books_window, BOOKS_ORDERING)
+        add_genre_names(author.books)
+        return author
+
+    def get_page_versions(self):
+        return [('author', self.kwargs['pk'])]
+
+    def get_validators(self):
+        return object_validators(Author, self.kwargs['pk'])
+
+
+class RelatedSegmentView(AnonymousPageCacheMixin, generic.TemplateView):
+    """
+    The ``window`` related rows of a detail page after ``?cursor=``: only the
+    segment for the page's "more" links (``?partial``), or a page of its own.
+    """
+    parent_model = None
+    window = None
+    ordering = None
+    segment_template_name = None
+
+    def get_segment_queryset(self):
+        raise NotImplementedError
+
+    def prepare(self, rows):
+        pass
+
+    def get_template_names(self):
+        return [self.segment_template_name if 'partial' in self.request.GET else self.template_name]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            page = related_window(self.get_segment_queryset(), self.window, self.ordering,
+                                  self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        if not page.object_list and not self.parent_model.objects.filter(pk=self.kwargs['pk']).exists():
+            raise Http404(f'No {self.parent_model._meta.verbose_name} {self.kwargs["pk"]}')
+        self.prepare(page.object_list)
+        context['page'] = page
+        return context
+
 
+class BookCopiesView(RelatedSegmentView):
+    parent_model = Book
+    window = BookDetailView.copies_window
+    ordering = COPIES_ORDERING
+    template_name = 'book_copies.html'
+    segment_template_name = 'copy_segment.html'
+    cache_vary_on_date = True
 
-class LoanedBooksListView(LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
+    def get_segment_queryset(self):
+        return copies_of(self.kwargs['pk'])
+
+    def prepare(self, rows):
+        label_copies(rows)
+
+    def get_page_versions(self):
+        return [('book', self.kwargs['pk'])]
+
+
+class AuthorBooksView(RelatedSegmentView):
+    parent_model = Author
+    window = AuthorDetailView.books_window
+    ordering = BOOKS_ORDERING
+    template_name = 'author_books.html'
+    segment_template_name = 'author_book_segment.html'
+
+    def get_segment_queryset(self):
+        return books_by(self.kwargs['pk'])
+
+    def prepare(self, rows):
+        add_genre_names(rows)
+
+    def get_page_versions(self):
+        return [('author', self.kwargs['pk'])]
+
+
+class BookSearchView(generic.ListView):
+    template_name = 'search_results.html'
+    context_object_name = 'book_list'
+    paginate_by = 10
+
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        return search_books(self.get_query())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.get_query()
+        return context
+
+
+class CatalogExportView(PermissionRequiredMixin, generic.View):
+    permission_required = 'catalog.staff_member_required'
+
+    def get(self, request, *args, **kwargs):
+        dataset = request.GET.get('dataset', 'books')
+        fmt = request.GET.get('format', 'csv')
+        compress = request.GET.get('compress') == 'gzip'
+        if dataset not in export.DATASETS or fmt not in export.FORMATS:
+            return HttpResponseBadRequest('Unknown dataset or format')
+        try:
+            stream = export.export_stream(dataset, fmt, compress, after=request.GET.get('after'))
+        except ValidationError:
+            return HttpResponseBadRequest('Invalid resume position')
+        filename = f'{dataset}.{fmt}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(stream, content_type=export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ApiListView(generic.View):
+    resource = None
+
+    def get(self, request, *args, **kwargs):
+        try:
+            names = self.resource.parse_fields(request.GET.get('fields'))
+            if 'ids' in request.GET:
+                ids = [value for value in request.GET['ids'].split(',') if value]
+                return api.json_response(request, {'results': self.resource.in_bulk(names, ids)})
+            page, results = self.resource.page(names, request.GET.get('cursor'),
+                                               api.parse_limit(request.GET.get('limit')))
+        except api.ApiError as e:
+            return api.json_response(request, {'error': str(e)}, status=400)
+        except InvalidCursor:
+            return api.json_response(request, {'error': 'Invalid cursor'}, status=400)
+        return api.json_response(request, {
+            'results': results,
+            'next': self.page_url(page.next_cursor),
+            'previous': self.page_url(page.previous_cursor),
+        })
+
+    def page_url(self, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return f'{self.request.path}?{query.urlencode()}'
+
+
+class ApiDetailView(generic.View):
+    resource = None
+
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            results = self.resource.in_bulk(self.resource.parse_fields(request.GET.get('fields')), [pk])
+        except api.ApiError as e:
+            return api.json_response(request, {'error': str(e)}, status=400)
+        if not results:
+            return api.json_response(request, {'error': 'Not found'}, status=404)
+        return api.json_response(request, results[0])
+
+
+def add_book_titles(*object_lists):
+    # Titles from the catalog snapshot instead of joining the books.
+    snapshot = get_snapshot()
+    for objects in object_lists:
+        for obj in objects:
+            obj.book_title = snapshot.title(obj.book_id)
+
+
+class LoanedBooksListView(LoginRequiredMixin, PermissionRequiredMixin, CursorPaginationMixin, generic.ListView):
     # model = BookInstance
     template_name = 'bookinstance_list_borrowed.html'
     paginate_by = 5
     permission_required = 'catalog.staff_member_required'
-    queryset = BookInstance.objects.filter(status__exact='o').order_by('due_back')
+    cursor_pagination = True
+    cursor_ordering = ('due_back', 'pk')
+    # Copies on loan always have a due date; plain ordering lets the on-loan index serve it.
+    cursor_not_null = ('due_back',)
+
+    def get_queryset(self):
+        return BookInstance.objects.on_loan().with_overdue().select_related('borrower').only(
+            'due_back', 'book', 'borrower', 'borrower__username').order_by('due_back')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        add_book_titles(context['bookinstance_list'])
+        return context
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+
+class LoanedBooksByUserListView(LoginRequiredMixin, CursorPaginationMixin, generic.ListView):
     # model = BookInstance
     template_name = 'bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    cursor_pagination = True
+    cursor_ordering = ('due_back', 'pk')
+    # Copies on loan always have a due date; plain ordering lets the on-loan index serve it.
+    cursor_not_null = ('due_back',)
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').filter(borrower=self.request.user).order_by('due_back')
+        return BookInstance.objects.on_loan().filter(borrower=self.request.user).with_overdue().only(
+            'due_back', 'status', 'borrower', 'book').order_by('due_back')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['reservations'] = list(Reservation.objects.filter(
+            borrower=self.request.user, status__in=('w', 'h')).only('status', 'created', 'book'))
+        add_book_titles(context['bookinstance_list'], context['reservations'])
+        for reservation in context['reservations']:
+            reservation.status_label = RESERVATION_STATUS_LABELS[reservation.status]
+        return context
 
 
 # @permission_required('catalog.can_mark_returned')
@@ -125,7 +410,11 @@ class RenewBookLibrarian(PermissionRequiredMixin, UpdateView):
         return super(RenewBookLibrarian, self).dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
-        form.save()
+        try:
+            form.save()
+        except ConcurrentUpdateError:
+            form.add_error(None, STALE_OBJECT_MESSAGE)
+            return self.form_invalid(form)
         return HttpResponseRedirect(reverse('all-borrowed'))
 
     # def dispatch(self, request, *args, **kwargs):
@@ -135,6 +424,22 @@ class RenewBookLibrarian(PermissionRequiredMixin, UpdateView):
     #     super(RenewBookLibrarian, self).dispatch(request, *args, **kwargs)
 
 
+class BulkCirculationView(PermissionRequiredMixin, FormView):
+    """Check out, return or renew many copies at once, with a result per copy."""
+    form_class = BulkCirculationForm
+    template_name = 'bulk_circulation.html'
+    permission_required = 'catalog.can_mark_returned'
+
+    def get_initial(self):
+        return {'due_back': datetime.date.today() + datetime.timedelta(weeks=3)}
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+        report = circulation.apply(data['operation'], data['copies'], data['borrower'], data['due_back'])
+        return self.render_to_response(self.get_context_data(
+            form=form, report=report, succeeded=sum(1 for result in report if result['ok'])))
+
+
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     model = Author
     fields = '__all__'
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+
+from .models import VisitCount
+
+logger = logging.getLogger(__name__)
+
+# Per-visitor count, kept by the browser in a signed cookie instead of the session.
+VISITS_COOKIE = 'num_visits'
+VISITS_COOKIE_SALT = 'catalog.visits'
+
+
+def visits_so_far(request):
+    try:
+        return int(request.get_signed_cookie(VISITS_COOKIE, default=0, salt=VISITS_COOKIE_SALT))
+    except ValueError:
+        return 0
+
+
+def set_visits_cookie(response, visits):
+    response.set_signed_cookie(VISITS_COOKIE, visits, salt=VISITS_COOKIE_SALT, max_age=365 * 24 * 60 * 60,
+                               httponly=True, samesite='Lax')
+
+
+def write_counts(counts):
+    """Add {(page, day): visits} to VisitCount, one UPDATE (or INSERT) per page and day."""
+    with transaction.atomic():
+        for (page, day), visits in sorted(counts.items()):
+            if VisitCount.objects.filter(page=page, day=day).update(count=F('count') + visits):
+                continue
+            try:
+                with transaction.atomic():
+                    VisitCount.objects.create(page=page, day=day, count=visits)
+            except IntegrityError:
+                # Created by another process meanwhile.
+                VisitCount.objects.filter(page=page, day=day).update(count=F('count') + visits)
+
+
+class VisitBuffer:
+    """
+    Page visits counted in memory and written to VisitCount in one batch every
+    CATALOG_VISITS_FLUSH_INTERVAL seconds by a background thread, so requests
+    themselves never write. Visits not yet flushed are lost if the process dies.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.flusher = None
+
+    def record(self, page, visits=1):
+        with self.lock:
+            self.pending[page, date.today()] += visits
+            self.start_flusher()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        return pending
+
+    def flush(self):
+        """Write the pending visits; returns how many were written."""
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            write_counts(pending)
+        except Exception:
+            with self.lock:
+                self.pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    def start_flusher(self):
+        # Lazily, so a forked worker starts its own thread.
+        interval = getattr(settings, 'CATALOG_VISITS_FLUSH_INTERVAL', 60)
+        if interval is None or (self.flusher is not None and self.flusher[0] == os.getpid()):
+            return
+        stop = threading.Event()
+        thread = threading.Thread(target=self.run_flusher, args=(interval, stop), name='catalog-visits', daemon=True)
+        self.flusher = (os.getpid(), stop)
+        thread.start()
+
+    def run_flusher(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write page visits; retrying in %ss', interval)
+            finally:
+                close_old_connections()
+        connection.close()
+
+    def stop_flusher(self):
+        if self.flusher is not None:
+            self.flusher[1].set()
+            self.flusher = None
+
+
+buffer = VisitBuffer()
+
+
+def record_visit(page):
+    buffer.record(page)
+
@@ -25,7 +25,9 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'k##6k(d4u5kot&#9c5qoz9l#ef7ic0
 
 # SECURITY WARNING: don't run with debug turned on in production!
 # DEBUG = True
-DEBUG = bool(os.environ.get('DJANGO_DEBUG', True))
+# On for development, so runserver serves static files without collectstatic;
+# deployments turn it off with DJANGO_DEBUG=False ('0', 'no' and 'off' work too).
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True').lower() not in ('false', '0', 'no', 'off')
 ALLOWED_HOSTS = ['*']
 
 # Application definition
@@ -41,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.middleware.RequestMetricsMiddleware',
+    'catalog.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,12 +57,25 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'locallibrary.urls'
 
+# Template profiles. 'production' (the default without DEBUG) keeps every
+# template parsed once per process by the cached loader, and compiles them all
+# when the process starts (CATALOG_PRECOMPILE_TEMPLATES); 'development' re-reads
+# templates from disk on every render so edits show up without a restart.
+TEMPLATE_PROFILE = os.environ.get('DJANGO_TEMPLATE_PROFILE', 'development' if DEBUG else 'production')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_PROFILE == 'production':
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+CATALOG_PRECOMPILE_TEMPLATES = TEMPLATE_PROFILE == 'production'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -88,6 +105,122 @@ import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas: DJANGO_DB_REPLICAS is a whitespace-separated list of database
+# URLs, each optionally followed by |weight (default 1). Catalog reads are
+# spread over the healthy ones by weight; see catalog.routers.ReplicaRouter.
+CATALOG_READ_REPLICAS = {}
+for num, entry in enumerate(os.environ.get('DJANGO_DB_REPLICAS', '').split(), 1):
+    replica_url, _, weight = entry.partition('|')
+    DATABASES[f'replica{num}'] = dict(dj_database_url.parse(replica_url, conn_max_age=500),
+                                      TEST={'MIRROR': 'default'})
+    CATALOG_READ_REPLICAS[f'replica{num}'] = int(weight or 1)
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+# Apps whose reads may go to a replica.
+CATALOG_REPLICA_APPS = ('catalog',)
+# Seconds a browser reads from the primary after a request that wrote; at
+# least the replicas' usual lag.
+CATALOG_REPLICA_PIN_SECONDS = int(os.environ.get('DJANGO_DB_REPLICA_PIN_SECONDS', 15))
+# Seconds between checks that a replica answers; failing ones get no reads until they do.
+CATALOG_REPLICA_HEALTH_CHECK_INTERVAL = 30
+
+# Connection pooling. DJANGO_DB_POOL is one of:
+#   ''          - Django's own persistent connections, one per thread (CONN_MAX_AGE);
+#   'process'   - a pool per worker process (catalog.backends.pool); connections go
+#                 back to it at the end of every request;
+#   'pgbouncer' - an external pooler in transaction mode: no server-side cursors,
+#                 which don't survive a transaction there.
+DATABASE_POOL = os.environ.get('DJANGO_DB_POOL', '')
+# Connections the database server allows this deployment, shared by the
+# WEB_CONCURRENCY worker processes gunicorn runs.
+DATABASE_MAX_CONNECTIONS = int(os.environ.get('DJANGO_DB_MAX_CONNECTIONS', 20))
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+for database in DATABASES.values():
+    if DATABASE_POOL == 'process':
+        from catalog.backends import POOLED_ENGINES
+        database['ENGINE'] = POOLED_ENGINES.get(database['ENGINE'], database['ENGINE'])
+        database['CONN_MAX_AGE'] = 0
+        database['POOL'] = {
+            'MAX_SIZE': int(os.environ.get('DJANGO_DB_POOL_MAX_SIZE',
+                                           max(1, DATABASE_MAX_CONNECTIONS // WEB_CONCURRENCY))),
+            # Seconds before a connection is replaced, is closed for being idle, and
+            # is checked with SELECT 1 before reuse; and seconds to wait for a free one.
+            'MAX_LIFETIME': int(os.environ.get('DJANGO_DB_POOL_MAX_LIFETIME', 1800)),
+            'MAX_IDLE': int(os.environ.get('DJANGO_DB_POOL_MAX_IDLE', 600)),
+            'HEALTH_CHECK_AFTER': int(os.environ.get('DJANGO_DB_POOL_HEALTH_CHECK_AFTER', 30)),
+            'TIMEOUT': int(os.environ.get('DJANGO_DB_POOL_TIMEOUT', 10)),
+        }
+    elif DATABASE_POOL == 'pgbouncer':
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Use a shared backend (memcached, database) in production so that every
+# worker sees the same cached catalog statistics and invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'locallibrary'),
+    }
+}
+
+# The catalog snapshot (catalog.snapshot) is versioned in the cache when every
+# worker shares it, else in the database, where each worker checks the version
+# at most every this many seconds.
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 1
+
+# Seconds the homepage statistics stay cached. Saves and deletes of catalog
+# models clear them, but only in the cache of the worker that handled them, so
+# a missed invalidation heals itself after this long.
+CATALOG_STATS_CACHE_TIMEOUT = 300
+
+# LocMemCache lives in one process: with several workers, the versions another
+# worker bumps are never seen here, so what is cached has to expire by itself.
+LOCAL_CACHE = CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
+# Seconds anonymous catalog pages and per-object fragments stay cached; entries
+# are keyed by object version, so None is safe with a shared cache and stale
+# keys simply age out. With a per-process cache and several workers, a minute.
+CATALOG_PAGE_CACHE_TIMEOUT = 60 if LOCAL_CACHE and WEB_CONCURRENCY > 1 else None
+
+# Sessions
+# https://docs.djangoproject.com/en/3.0/topics/http/sessions/#configuring-the-session-engine
+# DJANGO_SESSION_ENGINE is 'db', 'cache' (needs a shared cache), 'cached_db' or
+# 'signed_cookies' (no server-side storage; keep what is stored small).
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('DJANGO_SESSION_ENGINE', 'db')
+
+# Seconds between the batched writes of the page visit counts buffered by each
+# process (catalog.visits); None (DJANGO_VISITS_FLUSH_INTERVAL set to 'none' or
+# empty) never writes them.
+CATALOG_VISITS_FLUSH_INTERVAL = os.environ.get('DJANGO_VISITS_FLUSH_INTERVAL', '60')
+CATALOG_VISITS_FLUSH_INTERVAL = (None if CATALOG_VISITS_FLUSH_INTERVAL.strip().lower() in ('', 'none')
+                                 else int(CATALOG_VISITS_FLUSH_INTERVAL))
+
+# Request metrics (catalog.middleware.RequestMetricsMiddleware)
+# Fraction of requests that are measured; 0 disables the middleware.
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('DJANGO_METRICS_SAMPLE_RATE', 0))
+# Requests slower than this many milliseconds log their full query list.
+REQUEST_METRICS_SLOW_MS = float(os.environ.get('DJANGO_METRICS_SLOW_MS', 500))
+REQUEST_METRICS_SERVER_TIMING = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'catalog.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('DJANGO_METRICS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -124,7 +257,17 @@ USE_TZ = True
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# Everything is served locally. collectstatic joins and minifies each CSS
+# bundle, names every file after its content hash and writes gzip variants of
+# them (and Brotli ones, with the brotli package installed); whitenoise serves
+# the hashed names with Cache-Control: max-age=315360000, public, immutable.
+STATICFILES_STORAGE = 'catalog.storage.BundledManifestStaticFilesStorage'
+# The tests link static files without a collectstatic manifest.
+TEST_RUNNER = 'catalog.test_runner.CatalogTestRunner'
+CATALOG_CSS_BUNDLES = {
+    'css/catalog.min.css': ['css/vendor/bootstrap-subset.css', 'css/styles.css'],
+}
 
 LOGIN_REDIRECT_URL = '/'
 